@@ -5,8 +5,10 @@ from flask_migrate import Migrate
 from app.db import db
 from app.image_data import image_blueprint
 from app.media_server import media_server
+from app.media_storage import release_pending_references
 from app.tabular_data import tabular_blueprint
 from app.text_data import text_blueprint
+from app.uploads import UploadRequest
 
 # from app.text_data import text_blueprint
 
@@ -15,6 +17,8 @@ migrate = Migrate()
 
 def create_app():
     app = Flask(__name__)
+    # the uploaded files are streamed to the media storage while the request body is parsed
+    app.request_class = UploadRequest
     # allow all originsx
     CORS(app, resources={r"/*": {"origins": "*"}}, supports_credentials=True, expose_headers=["Content-Disposition"])
     # allow content-disposition header
@@ -22,6 +26,8 @@ def create_app():
     app.config.from_object("config.Config")
 
     db.init_app(app)
+    # before the session is removed, the teardown functions run in the reverse order
+    app.teardown_appcontext(release_pending_references)
 
     migrate.init_app(app, db)
 
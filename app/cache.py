@@ -0,0 +1,217 @@
+import hashlib
+import json
+import logging
+import os
+import sqlite3
+import threading
+import time
+from collections import OrderedDict
+from typing import Callable, Optional
+
+"""
+    This is the cache.py file of the app.
+    it contains the TieredCache used to keep computed results between requests:
+    - an in-process LRU tier bounded by a memory budget.
+    - an optional SQLite tier in a local file, shared by all the workers of the host and bounded by a disk budget.
+
+    the values must be JSON serializable, the serialized size is what is counted against the budgets.
+    the entries of a cache with a ttl expire that many seconds after they were set, in both tiers.
+"""
+
+logger = logging.getLogger(__name__)
+
+# the default of get telling a miss from a cached None
+MISSING = object()
+
+
+class TieredCache:
+    """
+    LRU cache with an in-process tier and a shared on-disk tier.
+
+        every entry has a tag (eg. the id of the file it was computed from) so all the entries of the tag can be
+        invalidated at once. a miss of the memory tier is looked up in the disk tier and promoted.
+        the disk tier is best effort, an SQLite error is logged and handled as a miss.
+        the hits of each tier and the misses of the process are counted (see stats).
+        a disk hit only records its access when the last one recorded is ACCESS_INTERVAL seconds old, the readers
+        of the workers do not wait for each other on the write lock of the file for every hit.
+    """
+
+    ACCESS_INTERVAL = 60
+
+    def __init__(self, name: str, max_bytes: int, disk_max_bytes: int = 0, directory: str = None, ttl: float = None):
+        self.name = name
+        self.max_bytes = max_bytes
+        self.disk_max_bytes = disk_max_bytes if directory else 0
+        self.path = os.path.join(directory, f"{name}.sqlite3") if directory else None
+        self.ttl = ttl
+        self._entries = OrderedDict()
+        self._size = 0
+        self._lock = threading.Lock()
+        self._disk_ready = False
+        self.memory_hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+
+    @staticmethod
+    def make_key(key) -> str:
+        """
+        Hash a JSON serializable key, dict keys are sorted so equal keys always hash the same
+        """
+        return hashlib.sha256(json.dumps(key, sort_keys=True, default=str).encode()).hexdigest()
+
+    def get(self, key, default=None) -> Optional[any]:
+        """
+        Return the cached value of the key or the default
+        """
+        key = self.make_key(key)
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[2] is not None and entry[2] <= time.time():
+                # expired
+                self._size -= len(self._entries.pop(key)[1])
+                entry = None
+            if entry is not None:
+                self._entries.move_to_end(key)
+                self.memory_hits += 1
+                return json.loads(entry[1])
+
+        entry = self._disk_get(key)
+        with self._lock:
+            if entry is None:
+                self.misses += 1
+            else:
+                self.disk_hits += 1
+        if entry is None:
+            return default
+        self._memory_set(key, *entry)
+        return json.loads(entry[1])
+
+    def set(self, key, value, tag: str = None):
+        """
+        Cache the value of the key in both tiers
+        """
+        key = self.make_key(key)
+        payload = json.dumps(value)
+        tag = str(tag) if tag is not None else None
+        expires_at = time.time() + self.ttl if self.ttl else None
+        self._memory_set(key, tag, payload, expires_at)
+        self._disk_set(key, tag, payload, expires_at)
+
+    def get_or_set(self, key, compute: Callable[[], any], tag: str = None) -> any:
+        """
+        Return the cached value of the key, computing and caching it on a miss
+        """
+        value = self.get(key, MISSING)
+        if value is MISSING:
+            value = compute()
+            self.set(key, value, tag=tag)
+        return value
+
+    def invalidate(self, tag):
+        """
+        Remove all the entries of the tag from both tiers
+        """
+        tag = str(tag)
+        with self._lock:
+            for key in [key for key, entry in self._entries.items() if entry[0] == tag]:
+                self._size -= len(self._entries.pop(key)[1])
+        self._disk_execute("DELETE FROM entries WHERE tag = ?", (tag,))
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._size = 0
+        self._disk_execute("DELETE FROM entries")
+
+    def stats(self) -> dict:
+        """
+        The hits and misses of the cache in this process, and the size of its memory tier
+        """
+        with self._lock:
+            lookups = self.memory_hits + self.disk_hits + self.misses
+            return {
+                "name": self.name,
+                "memory_hits": self.memory_hits,
+                "disk_hits": self.disk_hits,
+                "misses": self.misses,
+                "hit_rate": round((self.memory_hits + self.disk_hits) / lookups, 4) if lookups else None,
+                "memory_entries": len(self._entries),
+                "memory_bytes": self._size,
+            }
+
+    def _memory_set(self, key: str, tag: str, payload: str, expires_at: float = None):
+        size = len(payload)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            previous = self._entries.pop(key, None)
+            if previous is not None:
+                self._size -= len(previous[1])
+            self._entries[key] = (tag, payload, expires_at)
+            self._size += size
+            # evict the least recently used entries
+            while self._size > self.max_bytes:
+                _, (_, evicted, _) = self._entries.popitem(last=False)
+                self._size -= len(evicted)
+
+    def _connect(self) -> sqlite3.Connection:
+        if not self._disk_ready:
+            os.makedirs(os.path.dirname(self.path), exist_ok=True)
+        connection = sqlite3.connect(self.path, timeout=5)
+        if not self._disk_ready:
+            connection.execute("PRAGMA journal_mode=WAL")
+            connection.execute(
+                "CREATE TABLE IF NOT EXISTS entries "
+                "(key TEXT PRIMARY KEY, tag TEXT, value TEXT NOT NULL, size INTEGER NOT NULL, accessed_at REAL, "
+                "expires_at REAL)"
+            )
+            if "expires_at" not in [column[1] for column in connection.execute("PRAGMA table_info(entries)")]:
+                # a cache file created before the entries could expire
+                connection.execute("ALTER TABLE entries ADD COLUMN expires_at REAL")
+            connection.execute("CREATE INDEX IF NOT EXISTS entries_tag ON entries (tag)")
+            connection.execute("CREATE INDEX IF NOT EXISTS entries_accessed_at ON entries (accessed_at)")
+            self._disk_ready = True
+        return connection
+
+    def _disk_execute(self, statement: str, parameters: tuple = ()):
+        if not self.disk_max_bytes:
+            return None
+        try:
+            connection = self._connect()
+            try:
+                with connection:
+                    return connection.execute(statement, parameters).fetchone()
+            finally:
+                connection.close()
+        except (sqlite3.Error, OSError) as e:
+            logger.warning("The %s cache disk tier failed: %s", self.name, e)
+            return None
+
+    def _disk_get(self, key: str):
+        now = time.time()
+        entry = self._disk_execute(
+            "SELECT tag, value, expires_at, accessed_at FROM entries "
+            "WHERE key = ? AND (expires_at IS NULL OR expires_at > ?)",
+            (key, now),
+        )
+        if entry is None:
+            return None
+        if entry[3] is None or entry[3] <= now - self.ACCESS_INTERVAL:
+            self._disk_execute("UPDATE entries SET accessed_at = ? WHERE key = ?", (now, key))
+        return entry[:3]
+
+    def _disk_set(self, key: str, tag: str, payload: str, expires_at: float = None):
+        if len(payload) > self.disk_max_bytes:
+            return
+        self._disk_execute(
+            "INSERT OR REPLACE INTO entries (key, tag, value, size, accessed_at, expires_at) VALUES (?, ?, ?, ?, ?, ?)",
+            (key, tag, payload, len(payload), time.time(), expires_at),
+        )
+        if expires_at is not None:
+            self._disk_execute("DELETE FROM entries WHERE expires_at <= ?", (time.time(),))
+        # evict the least recently used entries beyond the disk budget
+        self._disk_execute(
+            "DELETE FROM entries WHERE key IN (SELECT key FROM "
+            "(SELECT key, SUM(size) OVER (ORDER BY accessed_at DESC, key) AS total FROM entries) WHERE total > ?)",
+            (self.disk_max_bytes,),
+        )
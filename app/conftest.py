@@ -0,0 +1,51 @@
+import io
+
+import pytest
+
+from app import create_app
+from app.db import db
+from app.tabular_data.service import view_cache
+from config import Config
+
+"""
+    This is the conftest.py file of the app.
+    it contains the fixtures of the tests: an app on a new SQLite database whose media, artifacts and cache are kept
+    under the temporary directory of the test.
+"""
+
+
+@pytest.fixture
+def app(tmp_path, monkeypatch):
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(Config, "SQLALCHEMY_DATABASE_URI", f"sqlite:///{tmp_path / 'test.db'}")
+    monkeypatch.setattr(Config, "MEDIA_FOLDER", str(tmp_path / "uploads"))
+    monkeypatch.setattr(Config, "MEDIA_ARTIFACTS_FOLDER", str(tmp_path / "artifacts"))
+    # the views cache is created on import, its disk tier is the one of the working directory
+    monkeypatch.setattr(view_cache, "disk_max_bytes", 0)
+    view_cache.clear()
+
+    app = create_app()
+    app.config["TESTING"] = True
+    with app.app_context():
+        db.create_all()
+        yield app
+        db.session.remove()
+        db.drop_all()
+
+
+@pytest.fixture
+def client(app):
+    return app.test_client()
+
+
+@pytest.fixture
+def upload(client):
+    """
+    Upload a CSV text as a new tabular data file, returns the response
+    """
+
+    def upload(csv: str, name: str = "data.csv", **data):
+        data["file"] = (io.BytesIO(csv.encode()), name)
+        return client.post("/tabular/files/new", data=data, content_type="multipart/form-data")
+
+    return upload
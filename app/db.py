@@ -1,5 +1,63 @@
+import logging
+from typing import Callable
+
 from flask_sqlalchemy import SQLAlchemy
+from sqlalchemy import event
+from sqlalchemy.orm import Session
 
 # read the database configuration from the config.py ConfigClass
 
 db = SQLAlchemy()
+
+logger = logging.getLogger(__name__)
+
+
+def on_commit(
+    before_commit: Callable[[], None] = None,
+    after_commit: Callable[[], None] = None,
+    after_rollback: Callable[[], None] = None,
+    session: Session = None,
+):
+    """
+    Run the callbacks with the end of the current transaction of the session, so the files kept next to the rows
+    change with them: before_commit right before the commit, after_commit once it is committed and after_rollback
+    when the transaction ends without a commit (it undoes what before_commit did, when it ran).
+    """
+    session = session or db.session()
+    if session.get_transaction() is None:
+        # the callbacks belong to the transaction, not to the next one
+        session.begin()
+    session.info.setdefault("on_commit", []).append((before_commit, after_commit, after_rollback))
+
+
+@event.listens_for(Session, "before_commit")
+def run_before_commit(session):
+    if session.in_nested_transaction():
+        return
+    for before_commit, _, _ in session.info.get("on_commit", []):
+        if before_commit is not None:
+            before_commit()
+
+
+@event.listens_for(Session, "after_commit")
+def run_after_commit(session):
+    if session.in_nested_transaction():
+        return
+    for _, after_commit, _ in session.info.pop("on_commit", []):
+        if after_commit is None:
+            continue
+        try:
+            after_commit()
+        except Exception:
+            # the transaction is committed already
+            logger.exception("A callback of a committed transaction failed")
+
+
+@event.listens_for(Session, "after_transaction_end")
+def run_after_rollback(session, transaction):
+    if transaction.parent is not None:
+        return
+    # the callbacks left are the ones of a transaction that was not committed
+    for _, _, after_rollback in reversed(session.info.pop("on_commit", [])):
+        if after_rollback is not None:
+            after_rollback()
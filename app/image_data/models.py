@@ -1,17 +1,18 @@
-import os
-
-from sqlalchemy.event import listens_for
-
 from app.base_abstracts import ParentAbstract
 from app.db import db
+from app.media_storage import track_references
 
 """
     This is the models.py file for the image_data blueprint.
     it contains the following tables:
     - ImageDataFile: This table stores the information about the image data files uploaded by the user.
+
+    the files of the images and of the thumbnails are media blobs shared by the records of the same content,
+    the reference counts are kept by track_references (see media_storage.py).
 """
 
 
+@track_references
 class ImageDataFile(ParentAbstract):
     """
     This table stores the information about the image data files uploaded by the user.
@@ -34,6 +35,7 @@ class ImageDataFile(ParentAbstract):
         return f"<ImageDataFile {self.id} {self.name}>"
 
 
+@track_references
 class ImageDataFileThumbnail(ParentAbstract):
     """
     This table stores the information about the thumbnails of the image data files uploaded by the user.
@@ -60,12 +62,3 @@ class ImageMask(ParentAbstract):
     mask_data = db.Column(db.LargeBinary)
     # mask_type should be one of the following: 'gray' or 'rgb'
     mask_type = db.Column(db.String(10), default="gray")
-
-
-@listens_for(ImageDataFile, "after_delete")
-def delete_image_data_file_and_thumbnail(mapper, connection, target):
-
-    if os.path.exists(target.path):
-        os.remove(target.path)
-    if target.thumbnail and os.path.exists(target.thumbnail.path):
-        os.remove(target.thumbnail.path)
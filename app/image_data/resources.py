@@ -1,5 +1,3 @@
-import os
-
 from flask import request, send_file
 from flask_restful import Resource, fields, reqparse
 from marshmallow import ValidationError
@@ -7,7 +5,7 @@ from werkzeug.datastructures import FileStorage
 from werkzeug.exceptions import BadRequest
 
 from app import db
-from app.helpers import generate_random_filename, secure_filename
+from app.helpers import secure_filename
 from app.image_data.models import ImageDataFile, ImageDataFileThumbnail, ImageMask
 from app.image_data.schemas import (
     ImageConvertRequestSchema,
@@ -17,6 +15,8 @@ from app.image_data.schemas import (
     ImageMaskSchema,
 )
 from app.image_data.service import ImageService
+from app.media_storage import media_store
+from app.uploads import UploadRejected
 from config import Config
 
 image_data_fields = {
@@ -50,6 +50,8 @@ class ImageDataResource(Resource):
             args = parser.parse_args()
         except BadRequest as e:
             return e.data, e.code
+        except UploadRejected as e:
+            return {"message": e.description}, e.code
         except Exception as e:
             return {"message": str(e)}, 400
 
@@ -57,36 +59,25 @@ class ImageDataResource(Resource):
         if not image_data:
             return {"message": "Image not found"}, 404
 
-        old_path = None
         if args["image"]:
-            old_path = image_data.path
             if not ImageDataResource.allowed_file(args["image"].filename):
                 return {"message": "Invalid file type"}, 400
-            file_name = secure_filename(
-                args["image"].filename.split(".")[0] + generate_random_filename(args["image"].filename)
-            )
-            path = f"{Config.MEDIA_DIR}/{file_name}"
-            args["image"].save(path)
-            image_data.path = path
-            image_data.name = file_name
-        db.session.commit()
-        if old_path:
-            if os.path.exists(old_path):
-                os.remove(old_path)
             try:
-                thumbnail_old_path = image_data.thumbnail.path
-                thumbnail_path = f"{Config.MEDIA_DIR}/thumbnail_{image_data.name}"
-                image_service = ImageService(image=image_data.path)
-                image_service.generate_thumbnail(save_path=thumbnail_path)
-                image_data.thumbnail.path = thumbnail_path
-                db.session.commit()
-                if os.path.exists(thumbnail_old_path):
-                    os.remove(thumbnail_old_path)
+                blob, thumbnail = ImageService.store_image(args["image"])
+            except UploadRejected as e:
+                return {"message": e.description}, e.code
+            except AssertionError as e:
+                return {"message": str(e)}, 400
             except Exception as e:
-                db.session.rollback()
-                if os.path.exists(image_data.path):
-                    os.remove(image_data.path)
                 return {"message": str(e)}, 500
+            # the blobs of the previous image and thumbnail are released by the update
+            image_data.path = blob.path
+            image_data.name = secure_filename(args["image"].filename)
+            if image_data.thumbnail:
+                image_data.thumbnail.path = thumbnail.path
+            else:
+                image_data.thumbnail = ImageDataFileThumbnail(path=thumbnail.path)
+        db.session.commit()
 
         return ImageDataSchema().dump(image_data)
 
@@ -136,31 +127,27 @@ class ImageDataResources(Resource):
             args = parser.parse_args()
         except BadRequest as e:
             return e.data, e.code
+        except UploadRejected as e:
+            return {"message": e.description}, e.code
         except Exception as e:
             return {"message": str(e)}, 400
 
         if not ImageDataResource.allowed_file(args["image"].filename):
             return {"message": "Invalid file type"}, 400
 
-        file_name = secure_filename(
-            args["image"].filename.split(".")[0] + generate_random_filename(args["image"].filename)
-        )
-        path = f"{Config.MEDIA_DIR}/{file_name}"
-        args["image"].save(path)
-        image_service = ImageService(image=args["image"])
-        image_data = ImageDataFile(name=file_name, path=path)
-        db.session.add(image_data)
-        db.session.commit()
+        # an image already stored is not written nor thumbnailed again
         try:
-            thumbnail_path = f"{Config.MEDIA_DIR}/thumbnail_{image_data.name}"
-            image_service.generate_thumbnail(save_path=thumbnail_path)
-            image_data.thumbnail = ImageDataFileThumbnail(path=thumbnail_path)
-            db.session.commit()
+            blob, thumbnail = ImageService.store_image(args["image"])
+        except UploadRejected as e:
+            return {"message": e.description}, e.code
+        except AssertionError as e:
+            return {"message": str(e)}, 400
         except Exception as e:
-            db.session.rollback()
-            if os.path.exists(image_data.path):
-                os.remove(image_data.path)
             return {"message": str(e)}, 500
+        image_data = ImageDataFile(name=secure_filename(args["image"].filename), path=blob.path)
+        image_data.thumbnail = ImageDataFileThumbnail(path=thumbnail.path)
+        db.session.add(image_data)
+        db.session.commit()
         return ImageDataSchema().dump(image_data), 201
 
 
@@ -173,33 +160,32 @@ class ImageMultipleUploadResource(Resource):
             args = parser.parse_args()
         except BadRequest as e:
             return e.data, e.code
+        except UploadRejected as e:
+            return {"message": e.description}, e.code
         except Exception as e:
             return {"message": str(e)}, 400
 
-        images = []
         for image in args["images"]:
             if not ImageDataResource.allowed_file(image.filename):
                 return {"message": "Invalid file type"}, 400
-            file_name = secure_filename(image.filename.split(".")[0] + generate_random_filename(image.filename))
-            path = f"{Config.MEDIA_DIR}/{file_name}"
-            image.save(path)
-            image_data = ImageDataFile(name=file_name, path=path)
-            images.append(image_data)
-        db.session.add_all(images)
-        db.session.commit()
+        images = []
+        blobs = []
         try:
-            for image in images:
-                thumbnail_path = f"{Config.MEDIA_DIR}/thumbnail_{image.name}"
-                image_service = ImageService(image=image.path)
-                image_service.generate_thumbnail(save_path=thumbnail_path)
-                image.thumbnail = ImageDataFileThumbnail(path=thumbnail_path)
-            db.session.commit()
+            for image in args["images"]:
+                blob, thumbnail = ImageService.store_image(image)
+                blobs.extend((blob, thumbnail))
+                image_data = ImageDataFile(name=secure_filename(image.filename), path=blob.path)
+                image_data.thumbnail = ImageDataFileThumbnail(path=thumbnail.path)
+                images.append(image_data)
         except Exception as e:
-            db.session.rollback()
-            for image in images:
-                if os.path.exists(image.path):
-                    os.remove(image.path)
-            return {"message": str(e)}, 500
+            # the blobs stored for the images before the failing one are only kept when already referenced
+            for blob in blobs:
+                media_store.discard(blob)
+            if isinstance(e, UploadRejected):
+                return {"message": e.description}, e.code
+            return {"message": str(e)}, 400 if isinstance(e, AssertionError) else 500
+        db.session.add_all(images)
+        db.session.commit()
         return ImageDataSchema().dump(images, many=True), 201
 
 
@@ -1,17 +1,50 @@
 from io import BytesIO
+from typing import Tuple
 
 import numpy as np
 from PIL import Image
+from werkzeug.datastructures import FileStorage
 
 from app.image_data.models import ImageMask
+from app.media_storage import MediaBlob, media_store
+from app.uploads import save_upload
 
 
 class ImageService:
 
     def __init__(self, image):
-        assert self.is_valid_image(image), "Invalid image file"
         self.image = image
-        self.pil_image = Image.open(image)
+        # the image is opened and decoded once, a file that can not be decoded is not a valid image
+        self.pil_image = self.open_image(image)
+        assert self.pil_image is not None, "Invalid image file"
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        self.close()
+
+    def close(self):
+        """
+        Release the decoded image and its file
+        """
+        self.pil_image.close()
+
+    @staticmethod
+    def open_image(image):
+        """
+        Open and decode the image
+
+        Args:
+            image (str or file): The image file, a memory-mapped view of it or the path to the image file
+            return (Image): The decoded image, None if the file is not a valid image
+        """
+        try:
+            pil_image = Image.open(image)
+            pil_image.load()
+            return pil_image
+        except Exception:
+            return None
 
     @staticmethod
     def is_valid_image(image):
@@ -80,6 +113,29 @@ class ImageService:
             thumbnail.save(save_path)
         return thumbnail
 
+    @staticmethod
+    def store_image(image: FileStorage) -> Tuple[MediaBlob, MediaBlob]:
+        """
+        Store the uploaded image and its thumbnail, the thumbnail of an image already stored is reused
+
+        Args:
+            image (FileStorage): The uploaded image file
+            return (tuple): The blobs of the image and of its thumbnail, the image is not stored when invalid
+        """
+        blob = save_upload(image)
+        thumbnail = media_store.get_artifact(blob, "thumbnail")
+        if thumbnail is None:
+            try:
+                # the saved file is decoded from its memory-mapped view, it is not read into a buffer first
+                with media_store.open_view(blob) as view, ImageService(image=view) as image_service:
+                    thumbnail_io = image_service.convert_to_io(image_service.generate_thumbnail())
+            except Exception:
+                media_store.discard(blob)
+                raise
+            thumbnail = media_store.save(thumbnail_io, blob.path.rsplit(".", 1)[1])
+            media_store.set_artifact(blob, "thumbnail", thumbnail)
+        return blob, thumbnail
+
     def convert_to_rgb(self, image: Image):
         return image.convert("RGB")
 
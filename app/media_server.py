@@ -1,5 +1,7 @@
+import click
 from flask import Blueprint, send_from_directory
 
+from app.media_storage import media_store
 from config import Config
 
 media_server = Blueprint("uploads", __name__)
@@ -13,5 +15,17 @@ def get_file(filename):
         return {"message": "File not found"}, 404
 
 
+@media_server.cli.command("gc")
+@click.option("--grace", type=int, default=None, help="Keep the unreferenced blobs saved in the last seconds.")
+def collect_garbage_command(grace):
+    """
+    Remove the stored uploads no record references, eg. the uploads that failed before their record was created.
+
+        eg. flask uploads gc --grace 600
+    """
+    removed = media_store.collect_garbage(grace)
+    click.echo(f"{removed} unreferenced media blobs removed")
+
+
 #
 # Compare this snippet from app/image_data/service.py:
@@ -0,0 +1,341 @@
+import hashlib
+import io
+import mmap
+import os
+import shutil
+import tempfile
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import BinaryIO, Callable, Iterator, List, Optional
+
+from sqlalchemy import delete, inspect, select, update
+from sqlalchemy.event import listens_for
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session, object_session
+
+from app.base_abstracts import ParentAbstract
+from app.db import db, on_commit
+from config import Config
+
+"""
+    This is the media_storage.py file of the app.
+    it contains the content-addressed storage of the uploaded files:
+    - MediaBlob: This table stores one row per distinct uploaded content, its path and the number of records
+        (tabular data files, images, thumbnails) referencing it.
+    - MediaStore: hashes the uploads while they are written to disk, stores every content once and keeps the
+        artifacts derived from a content (eg. its thumbnail or its parsed columns) for the next upload of it.
+    - track_references: the listeners keeping the reference counts of a model with a path column up to date,
+        a blob and its artifacts are removed when its last record is deleted (or its path changed), once the
+        transaction is committed.
+"""
+
+
+class MediaBlob(ParentAbstract):
+    """
+    This table stores the information about the distinct contents of the uploaded files.
+    """
+
+    __tablename__ = "media_blobs"
+
+    # '<algorithm>:<hex digest>' of the content
+    digest = db.Column(db.String(80), unique=True, nullable=False)
+    path = db.Column(db.String(255), unique=True, nullable=False)
+    byte_size = db.Column(db.BigInteger)
+    # number of records with this path, the blob is removed when it drops to 0
+    ref_count = db.Column(db.Integer, default=0, server_default="0", nullable=False)
+    # the derived artifacts reused by the uploads of the same content, eg. {"thumbnail": <path of its blob>}
+    artifacts = db.Column(db.JSON)
+
+    @property
+    def hexdigest(self) -> str:
+        return self.digest.split(":", 1)[1]
+
+    def __repr__(self):
+        return f"<MediaBlob {self.id} {self.digest}>"
+
+
+class MediaStore:
+    """
+    Store the uploaded files by the hash of their content.
+
+        the blobs are written to MEDIA_DIR as '<hex digest>.<extension>', an upload of a content already stored
+        is not written again. the files artifacts of a blob (see artifact_path) live in MEDIA_ARTIFACTS_FOLDER,
+        outside of the served media folder.
+    """
+
+    def __init__(self, algorithm: str = None, chunk_size: int = None):
+        self.algorithm = algorithm or Config.MEDIA_HASH_ALGORITHM
+        self.chunk_size = chunk_size or Config.MEDIA_CHUNK_SIZE
+
+    def hasher(self):
+        if self.algorithm != "blake3":
+            return hashlib.new(self.algorithm)
+        try:
+            from blake3 import blake3
+        except ImportError:
+            raise RuntimeError("The blake3 media hash is not available, install the blake3 package or use sha256.")
+        return blake3()
+
+    def save(self, stream: BinaryIO, extension: str) -> MediaBlob:
+        """
+        Write the stream to the storage in chunks while hashing it and return its blob (committed), with the
+        reference of the upload the first record created with its path takes over. an unused blob is dropped with
+        discard.
+        """
+        os.makedirs(Config.MEDIA_DIR, exist_ok=True)
+        hasher = self.hasher()
+        byte_size = 0
+        fd, temp_path = tempfile.mkstemp(dir=Config.MEDIA_DIR, prefix=".upload-")
+        try:
+            with os.fdopen(fd, "wb") as file:
+                while chunk := stream.read(self.chunk_size):
+                    hasher.update(chunk)
+                    file.write(chunk)
+                    byte_size += len(chunk)
+        except BaseException:
+            os.remove(temp_path)
+            raise
+        return self.store_file(temp_path, hasher.hexdigest(), byte_size, extension)
+
+    def store_file(self, temp_path: str, hexdigest: str, byte_size: int, extension: str) -> MediaBlob:
+        """
+        Move a file already hashed (in MEDIA_DIR) to its blob, the file is dropped when the content is stored.
+        the blob comes with the reference of the upload (see reference).
+        """
+        try:
+            digest = f"{self.algorithm}:{hexdigest}"
+            while True:
+                blob = MediaBlob.query.filter_by(digest=digest).first()
+                if blob is not None:
+                    if not self.reference(blob):
+                        # removed with its last record meanwhile, stored again
+                        continue
+                    if os.path.exists(blob.path):
+                        os.remove(temp_path)
+                    else:
+                        # the file of the blob was removed by hand, restored from the upload
+                        os.replace(temp_path, blob.path)
+                    return blob
+
+                blob = MediaBlob(
+                    digest=digest,
+                    path=f"{Config.MEDIA_DIR}/{hexdigest}.{extension.lower()}",
+                    byte_size=byte_size,
+                    ref_count=1,
+                )
+                try:
+                    with db.session.begin_nested():
+                        db.session.add(blob)
+                except IntegrityError:
+                    # the same content uploaded concurrently
+                    continue
+                os.replace(temp_path, blob.path)
+                db.session.commit()
+                pending_references().append(blob.path)
+                return blob
+        except BaseException:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+            raise
+
+    @staticmethod
+    def reference(blob: MediaBlob) -> bool:
+        """
+        Take the reference of the upload of the blob, so a concurrent delete of its last record does not remove it
+        before the record of the upload is created. the first record created with its path takes the reference
+        over (see track_references), discard drops it. False when the blob was removed meanwhile.
+        """
+        table = MediaBlob.__table__
+        referenced = db.session.execute(
+            update(table).where(table.c.id == blob.id).values(ref_count=table.c.ref_count + 1)
+        ).rowcount
+        db.session.commit()
+        if referenced:
+            pending_references().append(blob.path)
+        return bool(referenced)
+
+    @staticmethod
+    @contextmanager
+    def open_view(blob: MediaBlob) -> Iterator[mmap.mmap]:
+        """
+        A read-only memory-mapped view of the file of the blob, its pages are read from the page cache on demand
+        """
+        with open(blob.path, "rb") as file:
+            if not blob.byte_size:
+                # an empty file can not be mapped
+                yield io.BytesIO()
+                return
+            view = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+            try:
+                yield view
+            finally:
+                view.close()
+
+    def discard(self, blob: MediaBlob):
+        """
+        Drop the reference of the upload of a blob that is not used (eg. the upload failed) or remove an orphan blob,
+        the blob is removed unless a record references it
+        """
+        path, digest = blob.path, blob.digest
+        references = pending_references()
+        if path in references:
+            references.remove(path)
+            release(db.session.connection(), path, db.session())
+        elif db.session.execute(delete(MediaBlob).where(MediaBlob.id == blob.id, MediaBlob.ref_count <= 0)).rowcount:
+            on_commit(after_commit=lambda: remove_blob_files(path, digest))
+        db.session.commit()
+
+    def get_artifact(self, blob: MediaBlob, name: str) -> Optional[MediaBlob]:
+        """
+        The blob of the artifact of the blob (eg. its thumbnail) with the reference of the upload, None when it was
+        not derived yet or was removed
+        """
+        path = (blob.artifacts or {}).get(name)
+        if path is None:
+            return None
+        artifact = MediaBlob.query.filter_by(path=path).first()
+        if artifact is None or not os.path.exists(artifact.path) or not self.reference(artifact):
+            return None
+        return artifact
+
+    def set_artifact(self, blob: MediaBlob, name: str, artifact: MediaBlob):
+        # the JSON column is reassigned, in place changes are not tracked
+        blob.artifacts = {**(blob.artifacts or {}), name: artifact.path}
+        db.session.commit()
+
+    @staticmethod
+    def artifact_path(blob: MediaBlob, name: str) -> str:
+        """
+        The path of a file derived from the content of the blob (eg. its parsed columns), removed with the blob
+        """
+        return os.path.join(Config.MEDIA_ARTIFACTS_FOLDER, blob.hexdigest, name)
+
+    def write_artifact(self, blob: MediaBlob, name: str, write: Callable[[str], None]) -> str:
+        """
+        Write a file artifact of the blob with write(path), atomically so a concurrent reader never sees it partly
+        """
+        path = self.artifact_path(blob, name)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, temp_path = tempfile.mkstemp(dir=os.path.dirname(path), prefix=f".{name}-")
+        os.close(fd)
+        try:
+            write(temp_path)
+            os.replace(temp_path, path)
+        finally:
+            if os.path.exists(temp_path):
+                os.remove(temp_path)
+        return path
+
+    def collect_garbage(self, grace_seconds: int = None) -> int:
+        """
+        Remove the blobs no record references (uploads that failed before their record was created),
+        the blobs saved in the last grace_seconds may still be about to be referenced and are kept.
+        returns the number of blobs removed.
+        """
+        if grace_seconds is None:
+            grace_seconds = Config.MEDIA_ORPHAN_GRACE_SECONDS
+        created_before = datetime.now() - timedelta(seconds=grace_seconds)
+        orphans = MediaBlob.query.filter(MediaBlob.ref_count <= 0, MediaBlob.created_at < created_before).all()
+        for blob in orphans:
+            self.discard(blob)
+        return len(orphans)
+
+
+media_store = MediaStore()
+
+
+def remove_blob_files(path: str, digest: str = None):
+    if path and os.path.exists(path):
+        os.remove(path)
+    if digest:
+        shutil.rmtree(os.path.join(Config.MEDIA_ARTIFACTS_FOLDER, digest.split(":", 1)[1]), ignore_errors=True)
+
+
+def pending_references(session: Session = None) -> List[str]:
+    """
+    The paths of the blobs stored by the session whose reference of the upload was not taken over by a record yet
+    """
+    session = session or db.session()
+    return session.info.setdefault("media_references", [])
+
+
+def release_pending_references(exception=None):
+    """
+    Drop the references of the uploads no record took over (eg. a request that failed), at the end of the app context
+    """
+    references = db.session().info.pop("media_references", [])
+    if not references:
+        return
+    db.session.rollback()
+    for path in references:
+        release(db.session.connection(), path, db.session())
+    db.session.commit()
+
+
+def acquire(connection, path: str, session: Session = None):
+    """
+    Add a reference to the blob of the path, the reference of the upload of the blob when the session has it
+    """
+    if not path:
+        return
+    references = pending_references(session) if session is not None else []
+    if path in references:
+        references.remove(path)
+        return
+    connection.execute(
+        update(MediaBlob.__table__)
+        .where(MediaBlob.__table__.c.path == path)
+        .values(ref_count=MediaBlob.__table__.c.ref_count + 1)
+    )
+
+
+def release(connection, path: str, session: Session = None):
+    """
+    Remove a reference to the blob of the path, the blob is removed with its last reference.
+    the files stored before the content-addressed storage have no blob and are removed right away.
+    the files are removed once the transaction of the session is committed, they are kept when it is rolled back.
+    """
+    if not path:
+        return
+    table = MediaBlob.__table__
+    released = connection.execute(
+        update(table).where(table.c.path == path).values(ref_count=table.c.ref_count - 1)
+    ).rowcount
+    if not released:
+        on_commit(after_commit=lambda: remove_blob_files(path), session=session)
+        return
+    digest = connection.execute(select(table.c.digest).where(table.c.path == path, table.c.ref_count <= 0)).scalar()
+    if digest is not None and connection.execute(delete(table).where(table.c.path == path)).rowcount:
+        on_commit(after_commit=lambda: remove_blob_files(path, digest), session=session)
+
+
+def track_references(model, column: str = "path"):
+    """
+    Keep the reference counts of the blobs of the paths of the model records up to date
+    """
+
+    @listens_for(model, "after_insert")
+    def acquire_blob(mapper, connection, target):
+        acquire(connection, getattr(target, column), object_session(target))
+
+    @listens_for(getattr(model, column), "set", active_history=True)
+    def load_previous_path(target, value, previous, initiator):
+        # the previous path is loaded even when the record was expired (eg. by the commit of the new blob),
+        # so the update releases it
+        return value
+
+    @listens_for(model, "after_update")
+    def move_blob(mapper, connection, target):
+        history = inspect(target).attrs[column].history
+        if not history.has_changes():
+            return
+        for path in history.added:
+            acquire(connection, path, object_session(target))
+        for path in history.deleted:
+            release(connection, path, object_session(target))
+
+    @listens_for(model, "after_delete")
+    def release_blob(mapper, connection, target):
+        release(connection, getattr(target, column), object_session(target))
+
+    return model
@@ -2,7 +2,17 @@ from flask import Blueprint
 
 tabular_blueprint = Blueprint("tabular", __name__)
 
-from app.tabular_data.resources import NewTabularDataFileResource, TabularDataFileResource, TabularDataFilesResource
+from app.tabular_data import commands  # noqa: F401 registers the flask tabular cli commands
+from app.tabular_data.resources import (
+    NewTabularDataFileResource,
+    TabularDataFileAggregateResource,
+    TabularDataFileExportResource,
+    TabularDataFileOutliersResource,
+    TabularDataFileResource,
+    TabularDataFilesResource,
+    TabularDataFileZScoresResource,
+    TabularIngestionJobResource,
+)
 
 # Register the routes for the tabular data blueprint
 tabular_blueprint.add_url_rule(
@@ -11,4 +21,23 @@ tabular_blueprint.add_url_rule(
 tabular_blueprint.add_url_rule(
     "/files/<int:tabular_data_file_id>", view_func=TabularDataFileResource.as_view("tabular_data_file_resource")
 )
+tabular_blueprint.add_url_rule(
+    "/files/<int:tabular_data_file_id>/export",
+    view_func=TabularDataFileExportResource.as_view("tabular_data_file_export_resource"),
+)
+tabular_blueprint.add_url_rule(
+    "/files/<int:tabular_data_file_id>/outliers",
+    view_func=TabularDataFileOutliersResource.as_view("tabular_data_file_outliers_resource"),
+)
+tabular_blueprint.add_url_rule(
+    "/files/<int:tabular_data_file_id>/aggregate",
+    view_func=TabularDataFileAggregateResource.as_view("tabular_data_file_aggregate_resource"),
+)
+tabular_blueprint.add_url_rule(
+    "/files/<int:tabular_data_file_id>/z-scores",
+    view_func=TabularDataFileZScoresResource.as_view("tabular_data_file_z_scores_resource"),
+)
 tabular_blueprint.add_url_rule("/files", view_func=TabularDataFilesResource.as_view("tabular_data_files_resource"))
+tabular_blueprint.add_url_rule(
+    "/jobs/<int:job_id>", view_func=TabularIngestionJobResource.as_view("tabular_ingestion_job_resource")
+)
@@ -0,0 +1,111 @@
+import click
+
+from app.db import db
+from app.tabular_data import tabular_blueprint
+from app.tabular_data.catalog import SchemaCatalog
+from app.tabular_data.indexes import TEXT, RowIndexManager, infer_dtype
+from app.tabular_data.jobs import recover_stale_jobs
+from app.tabular_data.models import TabularDataFile
+from app.tabular_data.storage import STORAGE_BACKENDS, RowTableStorage, convert_storage, get_storage
+
+
+@tabular_blueprint.cli.command("convert-storage")
+@click.option("--backend", type=click.Choice(list(STORAGE_BACKENDS)), default="parquet", show_default=True)
+@click.option("--file-id", "file_ids", type=int, multiple=True, help="Only convert these tabular data files.")
+def convert_storage_command(backend, file_ids):
+    """
+    Move the rows of the tabular data files to another storage backend.
+
+        eg. flask tabular convert-storage --backend parquet --file-id 3
+    """
+    query = TabularDataFile.query.filter(TabularDataFile.storage_backend != backend)
+    if file_ids:
+        query = query.filter(TabularDataFile.id.in_(file_ids))
+
+    for tabular_data_file in query.order_by(TabularDataFile.id).all():
+        try:
+            report = convert_storage(tabular_data_file, backend)
+        except Exception as e:
+            click.echo(f"{tabular_data_file}: failed, {e}", err=True)
+            continue
+        click.echo(f"{tabular_data_file}: {report['rows']} rows moved to {backend} in {report['seconds']}s")
+
+
+@tabular_blueprint.cli.command("build-indexes")
+@click.option("--file-id", "file_ids", type=int, multiple=True, help="Only index these tabular data files.")
+def build_indexes_command(file_ids):
+    """
+    Infer the missing header dtypes and create the typed expression indexes of the files stored in the rows table.
+
+        eg. flask tabular build-indexes --file-id 3
+    """
+    query = TabularDataFile.query.filter(TabularDataFile.storage_backend == RowTableStorage.name)
+    if file_ids:
+        query = query.filter(TabularDataFile.id.in_(file_ids))
+
+    for tabular_data_file in query.order_by(TabularDataFile.id).all():
+        storage = get_storage(tabular_data_file)
+        headers = sorted(tabular_data_file.headers, key=lambda header: header.index)
+        untyped = [header for header in headers if header.dtype is None]
+        if untyped:
+            # files ingested before the dtypes existed, inferred from their first chunk of rows
+            frame = next(storage.iter_frames([header.header for header in headers]), None)
+            for header in untyped:
+                header.dtype = infer_dtype(frame[header.header]) if frame is not None else TEXT
+        try:
+            names = RowIndexManager(tabular_data_file.id).create(headers)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            click.echo(f"{tabular_data_file}: failed, {e}", err=True)
+            continue
+        click.echo(f"{tabular_data_file}: {len(names)} indexes")
+
+
+@tabular_blueprint.cli.command("profile-headers")
+@click.option("--file-id", "file_ids", type=int, multiple=True, help="Only profile these tabular data files.")
+@click.option("--all", "profile_all", is_flag=True, help="Profile the headers that already have a catalog too.")
+def profile_headers_command(file_ids, profile_all):
+    """
+    Build the column catalog (null count, distinct values, min, max, byte width) of the headers of the files
+    ingested before the catalog existed.
+
+        eg. flask tabular profile-headers --file-id 3
+    """
+    query = TabularDataFile.query
+    if file_ids:
+        query = query.filter(TabularDataFile.id.in_(file_ids))
+
+    for tabular_data_file in query.order_by(TabularDataFile.id).all():
+        headers = sorted(tabular_data_file.headers, key=lambda header: header.index)
+        if not headers or (not profile_all and all(header.null_count is not None for header in headers)):
+            continue
+        catalog = SchemaCatalog.for_headers(headers)
+        try:
+            for frame in get_storage(tabular_data_file).iter_frames([header.header for header in headers]):
+                catalog.update(frame)
+            catalog.apply(headers)
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            click.echo(f"{tabular_data_file}: failed, {e}", err=True)
+            continue
+        click.echo(f"{tabular_data_file}: {len(headers)} headers profiled")
+
+
+@tabular_blueprint.cli.command("recover-jobs")
+@click.option(
+    "--stale-seconds",
+    type=int,
+    default=None,
+    help="Recover the jobs of the other hosts not updated for this many seconds (default: TABULAR_JOBS_STALE_SECONDS).",
+)
+def recover_jobs_command(stale_seconds):
+    """
+    Fail the ingestion jobs of the process pools lost while running and run the lost queued ones, the web workers
+    recover them when they start.
+
+        eg. flask tabular recover-jobs --stale-seconds 600
+    """
+    failed, submitted = recover_stale_jobs(stale_seconds)
+    click.echo(f"{failed} jobs failed, {submitted} jobs submitted again")
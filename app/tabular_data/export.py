@@ -0,0 +1,168 @@
+import io
+import zlib
+from typing import Dict, Iterable, Iterator, List, Optional
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+from app.tabular_data.indexes import BOOLEAN, NUMERIC
+from app.tabular_data.statistics import numeric_values
+from app.tabular_data.storage import frame_to_table
+
+"""
+    This is the export.py file for the tabular_data blueprint.
+    it contains the TabularExporter used to stream the rows of a tabular data file (or of a filtered view of it)
+    as CSV, NDJSON or Parquet. the rows are read and encoded chunk by chunk, so the memory used by an export does
+    not depend on the size of the file.
+"""
+
+FORMATS = {
+    "csv": ("text/csv", "csv"),
+    "ndjson": ("application/x-ndjson", "ndjson"),
+    "parquet": ("application/vnd.apache.parquet", "parquet"),
+}
+COMPRESSIONS = {"none": None, "gzip": "gz", "zstd": "zst"}
+
+
+class DrainableSink(io.RawIOBase):
+    """
+    Writable file object keeping what was written until it is drained, the parquet writer writes into it
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.buffer = bytearray()
+        self.position = 0
+
+    def writable(self) -> bool:
+        return True
+
+    def write(self, data) -> int:
+        self.buffer += data
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        return self.position
+
+    def drain(self) -> bytes:
+        data = bytes(self.buffer)
+        self.buffer.clear()
+        return data
+
+
+class TabularExporter:
+    """
+    Encode DataFrame chunks of the same columns to the bytes of one export file.
+
+        csv and ndjson are compressed as a stream (gzip or zstd), parquet files are compressed by their pages
+        with the codec of the same name so the export stays readable by any parquet reader.
+        with the dtypes of the header catalog the parquet schema is the one of the headers instead of the one
+        inferred from the first chunk.
+    """
+
+    def __init__(
+        self, headers: List[str], format: str = "csv", compression: str = "none", dtypes: Dict[str, str] = None
+    ):
+        if format not in FORMATS:
+            raise ValueError(f"Unsupported export format {format!r}.")
+        if compression not in COMPRESSIONS:
+            raise ValueError(f"Unsupported export compression {compression!r}.")
+        self.headers = headers
+        self.format = format
+        self.compression = compression
+        self.dtypes = dtypes
+        self.compressor = None
+        if format != "parquet" and compression != "none":
+            self.compressor = self.make_compressor(compression)
+
+    @staticmethod
+    def make_compressor(compression: str):
+        if compression == "gzip":
+            # wbits=31 writes the gzip header and trailer
+            return zlib.compressobj(6, zlib.DEFLATED, 31)
+        try:
+            import zstandard
+        except ImportError:
+            raise ValueError("The zstd compression is not available, install the zstandard package.")
+        return zstandard.ZstdCompressor().compressobj()
+
+    @property
+    def mimetype(self) -> str:
+        if self.compressor is not None:
+            return "application/gzip" if self.compression == "gzip" else "application/zstd"
+        return FORMATS[self.format][0]
+
+    def filename(self, name: str) -> str:
+        name = f"{name}.{FORMATS[self.format][1]}"
+        if self.compressor is not None:
+            name = f"{name}.{COMPRESSIONS[self.compression]}"
+        return name
+
+    def encode(self, frames: Iterable[pd.DataFrame]) -> Iterator[bytes]:
+        """
+        Yield the bytes of the export file, at most one encoded chunk per frame
+        """
+        if self.format == "parquet":
+            chunks = self.encode_parquet(frames)
+        else:
+            chunks = self.encode_text(frames)
+        for chunk in chunks:
+            if self.compressor is not None:
+                chunk = self.compressor.compress(chunk)
+            if chunk:
+                yield chunk
+        if self.compressor is not None:
+            tail = self.compressor.flush()
+            if tail:
+                yield tail
+
+    def encode_text(self, frames: Iterable[pd.DataFrame]) -> Iterator[bytes]:
+        first = True
+        for df in frames:
+            df = df.reindex(columns=self.headers)
+            if self.format == "csv":
+                yield df.to_csv(index=False, header=first).encode()
+            elif len(df):
+                chunk = df.to_json(orient="records", lines=True, date_format="iso", force_ascii=False)
+                yield (chunk if chunk.endswith("\n") else chunk + "\n").encode()
+            first = False
+        if first and self.format == "csv":
+            # an empty view still gets its header line
+            yield pd.DataFrame(columns=self.headers).to_csv(index=False).encode()
+
+    def arrow_schema(self) -> Optional[pa.Schema]:
+        """
+        The parquet schema of the header dtypes, None without the dtypes (or for the headers without a dtype)
+        """
+        if self.dtypes is None or any(self.dtypes.get(header) is None for header in self.headers):
+            return None
+        types = {NUMERIC: pa.float64(), BOOLEAN: pa.bool_()}
+        return pa.schema([pa.field(header, types.get(self.dtypes[header], pa.string())) for header in self.headers])
+
+    def encode_parquet(self, frames: Iterable[pd.DataFrame]) -> Iterator[bytes]:
+        sink = DrainableSink()
+        writer = None
+        schema = self.arrow_schema()
+        codec = "snappy" if self.compression == "none" else self.compression
+        for df in frames:
+            df = df.reindex(columns=self.headers)
+            if schema is not None:
+                for field in schema:
+                    if pa.types.is_floating(field.type):
+                        # the cells of a numeric header that are not numbers are exported empty
+                        df[field.name] = numeric_values(df[field.name])
+            table = frame_to_table(df, schema)
+            if writer is None:
+                schema = table.schema.remove_metadata()
+                writer = pq.ParquetWriter(sink, schema, compression=codec)
+            writer.write_table(table.cast(schema))
+            yield sink.drain()
+        if writer is None:
+            # an empty view is exported as a parquet file without rows
+            if schema is None:
+                schema = frame_to_table(pd.DataFrame(columns=self.headers)).schema.remove_metadata()
+            writer = pq.ParquetWriter(sink, schema, compression=codec)
+        writer.close()
+        yield sink.drain()
@@ -0,0 +1,70 @@
+from functools import cached_property
+from typing import Dict, List
+
+from app.tabular_data.models import TabularDataFileHeader
+
+"""
+    This is the headers.py file for the tabular_data blueprint.
+    it contains the HeaderResolver used to read the headers of a tabular data file once per request
+    instead of once per filter, projected header or storage lookup.
+"""
+
+
+class HeaderResolver:
+    """
+    Resolve the headers of one tabular data file.
+
+        the headers are read with a single query the first time they are needed, every lookup after that
+        (header ids of the filters and of the projection, names, dtypes) is served from memory.
+    """
+
+    def __init__(self, tabular_data_file_id: int):
+        self.tabular_data_file_id = tabular_data_file_id
+
+    @cached_property
+    def all(self) -> List[TabularDataFileHeader]:
+        """
+        The headers of the file ordered by index
+        """
+        return (
+            TabularDataFileHeader.query.filter_by(tabular_data_file_id=self.tabular_data_file_id)
+            .order_by(TabularDataFileHeader.index)
+            .all()
+        )
+
+    @cached_property
+    def by_id(self) -> Dict[int, TabularDataFileHeader]:
+        return {header.id: header for header in self.all}
+
+    @cached_property
+    def by_name(self) -> Dict[str, TabularDataFileHeader]:
+        return {header.header: header for header in self.all}
+
+    @cached_property
+    def names(self) -> List[str]:
+        return [header.header for header in self.all]
+
+    @cached_property
+    def dtypes(self) -> Dict[str, str]:
+        return {header.header: header.dtype for header in self.all}
+
+    def select(self, header_ids: List[int]) -> List[TabularDataFileHeader]:
+        """
+        The headers with the given ids in the order of the file, the ids of other files are ignored
+        """
+        header_ids = set(header_ids)
+        return [header for header in self.all if header.id in header_ids]
+
+    def resolve_filters(self, row_filters: List[Dict]) -> List[Dict]:
+        """
+        Convert the request row filters (header_id, operator, row_value) to the storage filters
+        (header, operator, value), the filters on unknown headers are ignored
+        """
+        resolved = []
+        for row_filter in row_filters:
+            header = self.by_id.get(row_filter["header_id"])
+            if header:
+                resolved.append(
+                    {"header": header.header, "operator": row_filter["operator"], "value": row_filter["row_value"]}
+                )
+        return resolved
@@ -0,0 +1,245 @@
+from typing import Dict, List
+
+import pandas as pd
+from sqlalchemy import DDL, JSON, Numeric, Text, cast, event, func, text
+from sqlalchemy.orm import Session
+
+from app.db import db, on_commit
+from app.tabular_data.models import TabularDataFileHeader, TabularDataFileRow
+
+"""
+    This is the indexes.py file for the tabular_data blueprint.
+    it contains the typed expressions of the row_data cells and the index manager of the rows table:
+    - every header gets a dtype inferred from the pandas dtype of its column when the file is ingested.
+    - the filters and the ordering of the rows compile to the typed expression of the header dtype.
+    - on PostgreSQL every header of a file gets a partial expression index over the same typed expression,
+        so the planner can serve the filtered and ordered pages of one file from its indexes. the indexes are
+        built concurrently once the rows are committed.
+"""
+
+NUMERIC = "numeric"
+TEXT = "text"
+BOOLEAN = "boolean"
+
+# text to numeric cast returning NULL instead of failing, a cell edited to a non numeric value must not break the
+# numeric index of its header. IMMUTABLE so it can be used in index expressions, a plain SQL function (no exception
+# block, which would need a subtransaction) so the index builds and the scans can run in parallel.
+NUMERIC_FUNCTION = "tabular_numeric"
+CREATE_NUMERIC_FUNCTION = rf"""
+CREATE OR REPLACE FUNCTION {NUMERIC_FUNCTION}(value text) RETURNS numeric AS $$
+    SELECT CASE WHEN value ~ '^\s*[-+]?(\d+\.?\d*|\.\d+)([eE][-+]?\d{{1,3}})?\s*$' THEN value::numeric END
+$$ LANGUAGE sql IMMUTABLE STRICT PARALLEL SAFE
+"""
+
+# the migrations create the function, this keeps db.create_all() working on PostgreSQL
+event.listen(
+    TabularDataFileRow.__table__, "after_create", DDL(CREATE_NUMERIC_FUNCTION).execute_if(dialect="postgresql")
+)
+
+
+def infer_dtype(series: pd.Series) -> str:
+    """
+    The dtype of a header from the pandas dtype of its column
+    """
+    if pd.api.types.is_bool_dtype(series):
+        return BOOLEAN
+    if pd.api.types.is_numeric_dtype(series):
+        return NUMERIC
+    return TEXT
+
+
+def is_postgresql() -> bool:
+    return db.session.get_bind().dialect.name == "postgresql"
+
+
+def text_value(header: str):
+    """
+    The cell of the header as text, row_data ->> 'header' on PostgreSQL
+    """
+    if is_postgresql():
+        return TabularDataFileRow.row_data.op("->>", return_type=Text)(header)
+    return TabularDataFileRow.row_data[header].as_string()
+
+
+def json_type(header: str):
+    """
+    The JSON type of the cell of the header: number, boolean, string or null on PostgreSQL,
+    integer, real, true, false, text or null on SQLite
+    """
+    if is_postgresql():
+        return func.json_typeof(TabularDataFileRow.row_data.op("->", return_type=JSON)(header), type_=Text)
+    return func.json_type(TabularDataFileRow.row_data, f'$."{header}"', type_=Text)
+
+
+def numeric_value(header: str):
+    """
+    The cell of the header as a number, NULL when it is not a number
+    """
+    if is_postgresql():
+        return getattr(func, NUMERIC_FUNCTION)(text_value(header), type_=Numeric)
+    return cast(text_value(header), Numeric)
+
+
+def typed_value(header: str, dtype: str):
+    """
+    The expression a header is filtered and ordered by, the same expression its index is built on.
+    headers without a dtype (ingested before the dtypes existed) keep comparing their cells as numbers.
+    """
+    if dtype == NUMERIC or dtype is None:
+        return numeric_value(header)
+    if dtype == BOOLEAN and not is_postgresql():
+        # SQLite extracts the JSON booleans as 1 and 0
+        return TabularDataFileRow.row_data[header].as_boolean()
+    return text_value(header)
+
+
+def coerce_value(value, dtype: str):
+    """
+    Convert a filter value to the type of the header expression
+    """
+    if dtype == NUMERIC or dtype is None:
+        try:
+            return float(value)
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid value {value!r} for a numeric column.")
+    if dtype == BOOLEAN:
+        value = str(value).lower() in ("1", "true", "yes")
+        # PostgreSQL reads the JSON booleans back as 'true' and 'false'
+        return ("true" if value else "false") if is_postgresql() else value
+    return str(value)
+
+
+def compile_row_filter(row_filter: dict, dtype: str):
+    """
+    Compile one row filter {"header", "operator", "value"} to a SQL expression on the typed header expression
+    """
+    header = row_filter["header"]
+    operator = row_filter["operator"]
+    value = row_filter["value"]
+    if operator == "like":
+        return text_value(header).like(f"%{value}%")
+    if operator in ("in", "notin"):
+        values = [coerce_value(item, dtype) for item in (value if isinstance(value, list) else [value])]
+        expression = typed_value(header, dtype).in_(values)
+        return ~expression if operator == "notin" else expression
+
+    expression = typed_value(header, dtype)
+    value = coerce_value(value, dtype)
+    return {
+        "eq": lambda: expression == value,
+        "gt": lambda: expression > value,
+        "lt": lambda: expression < value,
+        "gte": lambda: expression >= value,
+        "lte": lambda: expression <= value,
+    }[operator]()
+
+
+class RowIndexManager:
+    """
+    Create and drop the per header expression indexes of the rows of one tabular data file.
+
+        the indexes are partial (WHERE tabular_data_file_id = <id>) so every file only indexes its own rows,
+        and end with the row index so the ordered pages are read from the index in order.
+        they are built and dropped CONCURRENTLY once the transaction of the session is committed, on a connection
+        of their own (the statements can not run in a transaction), so the writes of the other files go on.
+        they are only created on PostgreSQL, the other databases are used for development and tests.
+    """
+
+    TABLE = TabularDataFileRow.__tablename__
+
+    def __init__(self, tabular_data_file_id: int, session: Session = None):
+        self.tabular_data_file_id = int(tabular_data_file_id)
+        self.session = session or db.session()
+
+    @staticmethod
+    def execute(connection, statement: str, parameters: dict = None):
+        if parameters is None:
+            # the header names are part of the DDL, they must not be read as bind parameters
+            if connection.dialect.paramstyle in ("format", "pyformat"):
+                statement = statement.replace("%", "%%")
+            return connection.exec_driver_sql(statement)
+        return connection.execute(text(statement), parameters)
+
+    @property
+    def supported(self) -> bool:
+        return self.session.get_bind().dialect.name == "postgresql"
+
+    def autocommit(self):
+        return self.session.get_bind().connect().execution_options(isolation_level="AUTOCOMMIT")
+
+    def index_name(self, header: TabularDataFileHeader) -> str:
+        return f"ix_tabular_rows_{self.tabular_data_file_id}_{header.index}"
+
+    @staticmethod
+    def quote(value: str) -> str:
+        return "'" + value.replace("'", "''") + "'"
+
+    def index_expression(self, header: TabularDataFileHeader) -> str:
+        value = f"(row_data ->> {self.quote(header.header)})"
+        if header.dtype == NUMERIC:
+            return f"{NUMERIC_FUNCTION}{value}"
+        return value
+
+    def existing_indexes(self, connection) -> Dict[str, bool]:
+        """
+        The indexes of the file, by name, with whether they are valid (a concurrent build that failed leaves an
+        invalid index)
+        """
+        rows = self.execute(
+            connection,
+            "SELECT index_class.relname, pg_index.indisvalid FROM pg_index "
+            "JOIN pg_class index_class ON index_class.oid = pg_index.indexrelid "
+            "JOIN pg_class table_class ON table_class.oid = pg_index.indrelid "
+            "WHERE table_class.relname = :table AND index_class.relname LIKE :pattern",
+            {"table": self.TABLE, "pattern": f"ix\\_tabular\\_rows\\_{self.tabular_data_file_id}\\_%"},
+        )
+        return {name: valid for name, valid in rows}
+
+    def create(self, headers: List[TabularDataFileHeader] = None) -> List[str]:
+        """
+        Create the indexes of the headers (all the headers of the file by default) once the transaction is
+        committed, returns their names
+        """
+        if not self.supported:
+            return []
+        if headers is None:
+            headers = TabularDataFileHeader.query.filter_by(tabular_data_file_id=self.tabular_data_file_id).all()
+        statements = {
+            self.index_name(header): f'CREATE INDEX CONCURRENTLY IF NOT EXISTS "{self.index_name(header)}" '
+            f'ON {self.TABLE} ({self.index_expression(header)}, "index") '
+            f"WHERE tabular_data_file_id = {self.tabular_data_file_id}"
+            for header in headers
+        }
+        if statements:
+            # a concurrent build waits for the transactions writing the table, the one of the rows included
+            on_commit(after_commit=lambda: self.build(statements), session=self.session)
+        return list(statements)
+
+    def build(self, statements: Dict[str, str]):
+        with self.autocommit() as connection:
+            existing = self.existing_indexes(connection)
+            created = False
+            for name, statement in statements.items():
+                if existing.get(name):
+                    continue
+                if name in existing:
+                    self.execute(connection, f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
+                self.execute(connection, statement)
+                created = True
+            if created:
+                # the expression statistics are only collected by ANALYZE, it reads a fixed size sample of the
+                # table and does not block its writes
+                self.execute(connection, f"ANALYZE {self.TABLE}")
+
+    def drop(self):
+        """
+        Drop all the indexes of the file once the transaction is committed
+        """
+        if not self.supported:
+            return
+        on_commit(after_commit=self.drop_indexes, session=self.session)
+
+    def drop_indexes(self):
+        with self.autocommit() as connection:
+            for name in self.existing_indexes(connection):
+                self.execute(connection, f'DROP INDEX CONCURRENTLY IF EXISTS "{name}"')
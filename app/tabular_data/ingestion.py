@@ -0,0 +1,200 @@
+import io
+import time
+from typing import Callable, Dict, Iterator, List
+
+import pandas as pd
+from sqlalchemy import insert, select
+
+from app.db import db
+from app.tabular_data.catalog import SchemaCatalog
+from app.tabular_data.indexes import NUMERIC, TEXT, infer_dtype
+from app.tabular_data.models import TabularDataFileHeader, TabularDataFileRow
+from app.tabular_data.statistics import StatisticsAccumulator
+from config import Config
+
+"""
+    This is the ingestion.py file for the tabular_data blueprint.
+    it contains the bulk loader used to stream the rows of an uploaded file into the tabular_data_file_rows table
+    without building one ORM object per record, and the chunked ingestion used for large uploads.
+"""
+
+
+class BulkRowLoader:
+    """
+    Stream DataFrame rows into the tabular_data_file_rows table in batches.
+
+        when the session is bound to PostgreSQL through psycopg2 every batch is sent with a single COPY statement,
+        otherwise (eg. SQLite in tests) every batch is sent as one executemany INSERT.
+    """
+
+    COPY_COLUMNS = ("tabular_data_file_id", "row_data", "index", "created_at", "updated_at")
+
+    def __init__(self, tabular_data_file_id: int, batch_size: int = None):
+        self.tabular_data_file_id = tabular_data_file_id
+        self.batch_size = batch_size or Config.TABULAR_INGESTION_BATCH_SIZE
+        self.rows_loaded = 0
+        self.seconds = 0.0
+        self._now = None
+
+    @property
+    def method(self) -> str:
+        """
+        The method used to send the batches to the database, 'copy' or 'executemany'
+        """
+        bind = db.session.get_bind()
+        if bind.dialect.name == "postgresql" and bind.dialect.driver == "psycopg2":
+            return "copy"
+        return "executemany"
+
+    def load(self, df: pd.DataFrame, start_index: int = 0) -> int:
+        """
+        Load the rows of the DataFrame, the row index will start from start_index.
+        the rows are flushed to the current transaction, committing is left to the caller.
+        """
+        started = time.perf_counter()
+        method = self.method
+        if self._now is None:
+            # COPY bypasses the column defaults, so every row of the upload shares the database clock
+            self._now = db.session.execute(select(db.func.now())).scalar()
+
+        for offset in range(0, len(df), self.batch_size):
+            batch = df.iloc[offset : offset + self.batch_size]
+            if method == "copy":
+                self._copy_batch(batch, start_index + offset)
+            else:
+                self._insert_batch(batch, start_index + offset)
+
+        self.rows_loaded += len(df)
+        self.seconds += time.perf_counter() - started
+        return len(df)
+
+    def report(self) -> Dict[str, any]:
+        """
+        Report the ingestion throughput
+        """
+        rows_per_second = self.rows_loaded / self.seconds if self.seconds else 0.0
+        return {
+            "method": self.method,
+            "batch_size": self.batch_size,
+            "rows": self.rows_loaded,
+            "seconds": round(self.seconds, 3),
+            "rows_per_second": round(rows_per_second, 1),
+        }
+
+    @staticmethod
+    def serialize_rows(df: pd.DataFrame) -> List[str]:
+        """
+        Serialize the DataFrame rows to JSON documents, NaN values are written as null.
+        """
+        if df.empty:
+            return []
+        payload = df.to_json(orient="records", lines=True, double_precision=15, force_ascii=False, date_format="iso")
+        # split on "\n" only, JSON escapes it inside strings while str.splitlines would also split on U+2028
+        return [line for line in payload.split("\n") if line]
+
+    def _copy_batch(self, batch: pd.DataFrame, start_index: int):
+        """
+        Send one batch with PostgreSQL COPY in the text format.
+        """
+        timestamp = self._now.isoformat()
+        buffer = io.StringIO()
+        for offset, document in enumerate(self.serialize_rows(batch)):
+            # backslash is the escape character of the COPY text format
+            document = document.replace("\\", "\\\\")
+            buffer.write(f"{self.tabular_data_file_id}\t{document}\t{start_index + offset}\t{timestamp}\t{timestamp}\n")
+        buffer.seek(0)
+
+        table = TabularDataFileRow.__tablename__
+        columns = ", ".join(f'"{column}"' for column in self.COPY_COLUMNS)
+        cursor = db.session.connection().connection.cursor()
+        try:
+            cursor.copy_expert(f"COPY {table} ({columns}) FROM STDIN", buffer)
+        finally:
+            cursor.close()
+
+    def _insert_batch(self, batch: pd.DataFrame, start_index: int):
+        """
+        Send one batch as an executemany INSERT.
+        """
+        records = batch.astype(object).where(batch.notna(), None).to_dict(orient="records")
+        db.session.execute(
+            insert(TabularDataFileRow.__table__),
+            [
+                {
+                    "tabular_data_file_id": self.tabular_data_file_id,
+                    "row_data": record,
+                    "index": start_index + offset,
+                    "created_at": self._now,
+                    "updated_at": self._now,
+                }
+                for offset, record in enumerate(records)
+            ],
+        )
+
+
+class ChunkedIngestion:
+    """
+    Ingest a tabular data file chunk by chunk.
+
+        every chunk is written to the database and folded into the running statistics before the next chunk is
+        read, so the memory used depends on the chunk size and not on the size of the uploaded file.
+    """
+
+    def __init__(
+        self, tabular_data_file, chunks: Iterator[pd.DataFrame], writer, on_chunk: Callable[[int], None] = None
+    ):
+        self.tabular_data_file = tabular_data_file
+        self.chunks = chunks
+        # the writer of the tabular data file storage backend, a BulkRowLoader for the rows table
+        self.loader = writer
+        # called with the number of rows loaded after every chunk, eg. to commit and report the progress
+        self.on_chunk = on_chunk
+        self.statistics = StatisticsAccumulator()
+        self.catalog = None
+        self.headers = None
+        self.header_rows = []
+
+    def run(self) -> Dict[str, any]:
+        """
+        Consume the chunks, the headers are created from the first chunk.
+        returns the ingestion report, the statistics are set on the tabular data file.
+        """
+        for chunk in self.chunks:
+            if self.headers is None:
+                self.headers = self.create_headers(chunk)
+            elif list(chunk.columns) != self.headers:
+                raise ValueError("All the chunks of the file must have the same headers.")
+            self.loader.load(chunk, start_index=self.loader.rows_loaded)
+            self.statistics.update(chunk)
+            self.catalog.update(chunk)
+            self.catalog.apply(self.header_rows)
+            self.tabular_data_file.row_count = self.loader.rows_loaded
+            if self.on_chunk is not None:
+                self.on_chunk(self.loader.rows_loaded)
+
+        if self.headers is None:
+            raise ValueError("The file is empty.")
+        for header in self.header_rows:
+            # a column read as numbers in the first chunk can hold text further in the file
+            if header.dtype == NUMERIC and header.header in self.statistics.non_numeric:
+                header.dtype = TEXT
+        self.tabular_data_file.statistics = self.statistics.result()
+        self.tabular_data_file.statistics_sketch = self.statistics.to_dict()
+        return {**self.loader.report(), "streaming": True}
+
+    def create_headers(self, chunk: pd.DataFrame) -> List[str]:
+        headers = [str(header) for header in chunk.columns]
+        self.header_rows = [
+            TabularDataFileHeader(
+                tabular_data_file_id=self.tabular_data_file.id,
+                header=header,
+                index=index,
+                dtype=infer_dtype(chunk[header]),
+            )
+            for index, header in enumerate(headers)
+        ]
+        self.catalog = SchemaCatalog.for_headers(self.header_rows)
+        self.tabular_data_file.column_count = len(headers)
+        db.session.add_all(self.header_rows)
+        db.session.flush()
+        return headers
@@ -0,0 +1,308 @@
+import importlib
+import logging
+import multiprocessing
+import os
+import socket
+from concurrent.futures import Future, ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+
+from flask import has_app_context
+from sqlalchemy import update
+
+from app.db import db
+from app.tabular_data.ingestion import ChunkedIngestion
+from app.tabular_data.models import TabularDataFile, TabularIngestionJob
+from app.tabular_data.service import TabularDataService, view_cache
+from app.tabular_data.storage import get_storage
+from config import Config
+
+"""
+    This is the jobs.py file for the tabular_data blueprint.
+    it contains the background ingestion of the uploaded files:
+    - IngestionJobRunner: parses and loads the file of a TabularIngestionJob chunk by chunk, committing every chunk
+        with the progress of the job so the file is queryable while it is still being ingested.
+    - the job queues the upload request submits the jobs to: a local process pool (the default, no broker needed)
+        or a Redis queue consumed by rq workers.
+"""
+
+logger = logging.getLogger(__name__)
+
+
+class IngestionJobRunner:
+    """
+    Run one ingestion job inside an app context.
+    """
+
+    def __init__(self, job: TabularIngestionJob):
+        self.job = job
+        self.tabular_data_file = None
+        self.ingestion = None
+
+    def run(self) -> TabularIngestionJob:
+        job = self.job
+        try:
+            job.rows_total = TabularDataService(job.path).estimate_row_count()
+            self.tabular_data_file = TabularDataService.create_tabular_data_file(
+                job.name, job.path, None, storage_backend=job.storage_backend
+            )
+            db.session.add(self.tabular_data_file)
+            db.session.flush()
+            job.tabular_data_file_id = self.tabular_data_file.id
+            db.session.commit()
+
+            storage = get_storage(self.tabular_data_file)
+            self.ingestion = ChunkedIngestion(
+                self.tabular_data_file,
+                TabularDataService(job.path).iter_chunks(),
+                storage.writer(),
+                on_chunk=self.checkpoint,
+            )
+            report = self.ingestion.run()
+            storage.build_indexes()
+            self.lock_file()
+            self.tabular_data_file.version += 1
+            job.status = TabularIngestionJob.COMPLETED
+            job.rows_done = job.rows_total = report["rows"]
+            job.finished_at = db.func.now()
+            job.path = None
+            db.session.commit()
+        except Exception as e:
+            db.session.rollback()
+            self.fail(str(e.args[0]) if e.args else str(e))
+        if self.tabular_data_file is not None:
+            view_cache.invalidate(self.tabular_data_file.id)
+        return job
+
+    def checkpoint(self, rows_done: int):
+        """
+        Commit the chunk loaded so far with the statistics of the rows loaded so far and the progress of the job
+        """
+        self.lock_file()
+        self.tabular_data_file.statistics = self.ingestion.statistics.result()
+        # the cached views of the file are keyed by its version
+        self.tabular_data_file.version += 1
+        self.job.rows_done = rows_done
+        if self.job.rows_total is not None and self.job.rows_total < rows_done:
+            self.job.rows_total = rows_done
+        db.session.commit()
+
+    def lock_file(self):
+        """
+        Lock the row of the file until the commit, like the updates of its rows do, and reload its version
+        """
+        db.session.refresh(self.tabular_data_file, ["version"], with_for_update=True)
+
+    def fail(self, error: str):
+        """
+        Remove the partly ingested file and record the error on the job
+        """
+        job = self.job
+        tabular_data_file = None
+        if job.tabular_data_file_id is not None:
+            tabular_data_file = db.session.get(TabularDataFile, job.tabular_data_file_id)
+        if tabular_data_file is not None:
+            # the rows are deleted in bulk, not through the ORM cascade
+            get_storage(tabular_data_file).clear()
+            job.tabular_data_file_id = None
+            db.session.delete(tabular_data_file)
+        job.status = TabularIngestionJob.FAILED
+        job.error = error
+        job.finished_at = db.func.now()
+        # releases the uploaded file, removed unless another record references it
+        job.path = None
+        db.session.commit()
+
+
+def worker_id() -> str:
+    """
+    '<host>:<pid>' of the process the job is queued or running in
+    """
+    return f"{socket.gethostname()}:{os.getpid()}"
+
+
+def worker_alive(worker: str) -> Optional[bool]:
+    """
+    Whether the process of the worker_id is running, None when it is on another host
+    """
+    host, _, pid = worker.rpartition(":")
+    if host != socket.gethostname():
+        return None
+    try:
+        os.kill(int(pid), 0)
+    except ProcessLookupError:
+        return False
+    except PermissionError:
+        # the process of another user
+        pass
+    return True
+
+
+def create_app():
+    """
+    Create the app of a job process from the TABULAR_JOBS_APP_FACTORY ('module:function')
+    """
+    module_name, _, factory = Config.TABULAR_JOBS_APP_FACTORY.partition(":")
+    return getattr(importlib.import_module(module_name), factory or "create_app")()
+
+
+_app = None
+
+
+def run_ingestion_job(job_id: int) -> str:
+    """
+    Run the ingestion job, the entry point of the job processes and of the rq workers. returns the job status.
+    """
+    global _app
+    if not has_app_context():
+        if _app is None:
+            _app = create_app()
+        with _app.app_context():
+            return run_ingestion_job(job_id)
+
+    try:
+        # claim the job, a job submitted twice is only run once
+        claimed = db.session.execute(
+            update(TabularIngestionJob)
+            .where(TabularIngestionJob.id == job_id, TabularIngestionJob.status == TabularIngestionJob.QUEUED)
+            .values(status=TabularIngestionJob.RUNNING, started_at=db.func.now(), worker=worker_id())
+        ).rowcount
+        db.session.commit()
+        job = db.session.get(TabularIngestionJob, job_id)
+        if not claimed:
+            return job.status if job is not None else None
+        return IngestionJobRunner(job).run().status
+    finally:
+        db.session.remove()
+
+
+class ProcessPoolJobQueue:
+    """
+    Run the jobs in a pool of local processes owned by the web worker, no broker is needed.
+
+        the processes are spawned (not forked) so they do not share the database connections of the web worker,
+        every process creates its own app the first time it runs a job.
+        the jobs queued or running in the pool are lost with the web worker (recycled, killed by its timeout or
+        restarted), they are recovered by the next worker started (see recover_stale_jobs).
+    """
+
+    def __init__(self, max_workers: int = None):
+        self.max_workers = max_workers or Config.TABULAR_JOBS_WORKERS
+        self._executor = None
+
+    @property
+    def executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.max_workers, mp_context=multiprocessing.get_context("spawn")
+            )
+        return self._executor
+
+    def submit(self, job_id: int) -> Future:
+        # the job is lost with this web worker until a process of the pool claims it
+        db.session.execute(
+            update(TabularIngestionJob)
+            .where(TabularIngestionJob.id == job_id, TabularIngestionJob.status == TabularIngestionJob.QUEUED)
+            .values(worker=worker_id())
+        )
+        db.session.commit()
+        future = self.executor.submit(run_ingestion_job, job_id)
+        future.add_done_callback(lambda done: self.log_failure(job_id, done))
+        return future
+
+    @staticmethod
+    def log_failure(job_id: int, future: Future):
+        # the errors of the ingestion are recorded on the job, this only catches the process failures
+        if not future.cancelled() and future.exception() is not None:
+            logger.error("The tabular ingestion job %s failed: %s", job_id, future.exception())
+
+    def recover(self, stale_seconds: int = None) -> Tuple[int, int]:
+        """
+        Recover the jobs whose process is gone: the web worker a job is queued in, the pool process a job is running
+        in. the process of a job of another host can not be checked, its job is recovered once it was not updated
+        for stale_seconds (TABULAR_JOBS_STALE_SECONDS). the running jobs are failed with their partly ingested file
+        removed, the queued ones are submitted again to this pool.
+        returns the number of jobs failed and the number of jobs submitted again.
+        """
+        if stale_seconds is None:
+            stale_seconds = Config.TABULAR_JOBS_STALE_SECONDS
+        updated_before = datetime.now() - timedelta(seconds=stale_seconds)
+        jobs = (
+            TabularIngestionJob.query.filter(
+                TabularIngestionJob.status.in_([TabularIngestionJob.QUEUED, TabularIngestionJob.RUNNING]),
+                TabularIngestionJob.worker.isnot(None),
+            )
+            .order_by(TabularIngestionJob.id)
+            .all()
+        )
+        failed = submitted = 0
+        for job in jobs:
+            alive = worker_alive(job.worker)
+            if alive or (alive is None and job.updated_at > updated_before):
+                continue
+            # claimed like a job is, the workers started together recover a job once
+            claimed = db.session.execute(
+                update(TabularIngestionJob)
+                .where(
+                    TabularIngestionJob.id == job.id,
+                    TabularIngestionJob.status == job.status,
+                    TabularIngestionJob.worker == job.worker,
+                )
+                .values(worker=worker_id())
+            ).rowcount
+            db.session.commit()
+            if not claimed:
+                continue
+            if job.status == TabularIngestionJob.RUNNING:
+                IngestionJobRunner(job).fail("The ingestion was interrupted, upload the file again.")
+                failed += 1
+            else:
+                self.submit(job.id)
+                submitted += 1
+        return failed, submitted
+
+
+class RQJobQueue:
+    """
+    Enqueue the jobs in a Redis queue, consumed by `rq worker <TABULAR_JOBS_QUEUE>` processes.
+    """
+
+    def __init__(self, redis_url: str = None, queue_name: str = None):
+        try:
+            from redis import Redis
+            from rq import Queue
+        except ImportError:
+            raise RuntimeError("The rq jobs backend needs the rq package, install it or use the process backend.")
+        self.queue = Queue(
+            queue_name or Config.TABULAR_JOBS_QUEUE, connection=Redis.from_url(redis_url or Config.REDIS_URL)
+        )
+
+    def submit(self, job_id: int):
+        return self.queue.enqueue(run_ingestion_job, job_id, job_timeout=-1)
+
+    def recover(self, stale_seconds: int = None) -> Tuple[int, int]:
+        # the jobs are kept by Redis, a job of a worker that died is in the failed registry of rq
+        return 0, 0
+
+
+JOB_QUEUES = {"process": ProcessPoolJobQueue, "rq": RQJobQueue}
+_job_queue = None
+
+
+def recover_stale_jobs(stale_seconds: int = None) -> Tuple[int, int]:
+    """
+    Recover the jobs lost with the web worker whose pool they were queued or running in, see ProcessPoolJobQueue
+    """
+    return get_job_queue().recover(stale_seconds)
+
+
+def get_job_queue():
+    """
+    The job queue of the TABULAR_JOBS_BACKEND, created once per process
+    """
+    global _job_queue
+    if _job_queue is None:
+        if Config.TABULAR_JOBS_BACKEND not in JOB_QUEUES:
+            raise ValueError(f"Unknown tabular jobs backend {Config.TABULAR_JOBS_BACKEND!r}.")
+        _job_queue = JOB_QUEUES[Config.TABULAR_JOBS_BACKEND]()
+    return _job_queue
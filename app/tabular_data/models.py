@@ -1,9 +1,10 @@
-import os
-
 from sqlalchemy.event import listens_for
+from sqlalchemy.orm import object_session
 
 from app import db
 from app.base_abstracts import ParentAbstract
+from app.db import on_commit
+from app.media_storage import track_references
 
 """
     This is the models.py file for the tabular_data blueprint.
@@ -13,19 +14,37 @@ from app.base_abstracts import ParentAbstract
         of the tabular data files uploaded by the user.
     - TabularDataFileRow: This table stores the information about the rows of the
         tabular data files uploaded by the user.
+    - TabularIngestionJob: This table stores the state and the progress of the background ingestion of an upload.
 """
 
 
+@track_references
 class TabularDataFile(ParentAbstract):
     """
     This table stores the information about the tabular data files uploaded by the user.
     """
 
     __tablename__ = "tabular_data_files"
+    # the catalog is filtered and sorted by name or creation date
+    __table_args__ = (
+        db.Index("ix_tabular_data_files_name", "name"),
+        db.Index("ix_tabular_data_files_created_at", "created_at"),
+    )
 
     name = db.Column(db.String(255))
     path = db.Column(db.String(255))
     statistics = db.Column(db.JSON)
+    # the serialized StatisticsAccumulator the statistics are maintained from (see statistics.py)
+    statistics_sketch = db.deferred(db.Column(db.JSON))
+    # incremented on every change of the rows, part of the key of the cached statistics
+    version = db.Column(db.Integer, default=0, server_default="0", nullable=False)
+    # the backend the rows are stored in, 'rows' (TabularDataFileRow table) or 'parquet' (see storage.py)
+    storage_backend = db.Column(db.String(20), default="rows", server_default="rows", nullable=False)
+    # the size of the file, kept up to date on ingestion and on every update so the catalog never reads the rows
+    row_count = db.Column(db.Integer, default=0, server_default="0", nullable=False)
+    column_count = db.Column(db.Integer, default=0, server_default="0", nullable=False)
+    # the size of the uploaded file in bytes
+    byte_size = db.Column(db.BigInteger)
 
     headers = db.relationship(
         "TabularDataFileHeader", backref=db.backref("tabular_data_file", lazy=True), cascade="all, delete"
@@ -48,6 +67,17 @@ class TabularDataFileHeader(ParentAbstract):
     tabular_data_file_id = db.Column(db.Integer, db.ForeignKey("tabular_data_files.id"), nullable=False)
     header = db.Column(db.String(255))
     index = db.Column(db.Integer)
+    # 'numeric', 'text' or 'boolean', inferred from the column when the file is ingested (see indexes.py)
+    dtype = db.Column(db.String(20))
+    # the column schema catalog, profiled when the file is ingested and kept up to date by the row edits
+    # (see catalog.py): the empty cells, the distinct values estimate, the smallest and largest values and
+    # the width in bytes of the largest cell
+    nullable = db.Column(db.Boolean)
+    null_count = db.Column(db.BigInteger)
+    cardinality = db.Column(db.BigInteger)
+    min_value = db.Column(db.JSON)
+    max_value = db.Column(db.JSON)
+    byte_width = db.Column(db.Integer)
 
     # tabular_data_file = db.relationship('TabularDataFile', backref=db.backref('headers', lazy=True))
 
@@ -64,6 +94,7 @@ class TabularDataFileRow(ParentAbstract):
     """
 
     __tablename__ = "tabular_data_file_rows"
+    __table_args__ = (db.Index("ix_tabular_data_file_rows_file_index", "tabular_data_file_id", "index"),)
 
     tabular_data_file_id = db.Column(db.Integer, db.ForeignKey("tabular_data_files.id"), nullable=False)
     row_data = db.Column(db.JSON)
@@ -75,8 +106,51 @@ class TabularDataFileRow(ParentAbstract):
         return f"<TabularDataFileRow {self.id} - size: {len(self.row_data)} - {self.tabular_data_file}>"
 
 
+@track_references
+class TabularIngestionJob(ParentAbstract):
+    """
+    This table stores the state and the progress of the background ingestion of an uploaded file.
+
+        the job is created by the upload request and updated by the worker that ingests the file,
+        the tabular data file is created when the worker starts and is queryable from its first committed chunk.
+    """
+
+    __tablename__ = "tabular_ingestion_jobs"
+
+    QUEUED = "queued"
+    RUNNING = "running"
+    COMPLETED = "completed"
+    FAILED = "failed"
+
+    tabular_data_file_id = db.Column(
+        db.Integer, db.ForeignKey("tabular_data_files.id", ondelete="SET NULL"), nullable=True
+    )
+    name = db.Column(db.String(255))
+    # the uploaded file, referenced by the job until it is finished (the tabular data file references it then)
+    path = db.Column(db.String(255))
+    storage_backend = db.Column(db.String(20))
+    status = db.Column(db.String(20), default=QUEUED, server_default=QUEUED, nullable=False)
+    rows_done = db.Column(db.Integer, default=0, server_default="0", nullable=False)
+    # estimated from the uploaded file when the job starts, exact once the job is completed
+    rows_total = db.Column(db.Integer)
+    error = db.Column(db.Text)
+    started_at = db.Column(db.DateTime)
+    finished_at = db.Column(db.DateTime)
+    # '<host>:<pid>' of the web worker the job is queued in, then of the process running it (see recover_stale_jobs)
+    worker = db.Column(db.String(255))
+
+    def __repr__(self):
+        return f"<TabularIngestionJob {self.id} {self.status}>"
+
+
 @listens_for(TabularDataFile, "after_delete")
 def delete_tabular_data_file(mapper, connection, target):
-
-    if os.path.exists(target.path):
-        os.remove(target.path)
+    from app.tabular_data.indexes import RowIndexManager
+    from app.tabular_data.storage import ParquetStorage
+
+    # the uploaded file is released by track_references, it is removed with its last reference
+    if target.storage_backend == ParquetStorage.name:
+        # the rows stay with the file when the delete is rolled back
+        on_commit(after_commit=ParquetStorage(target).clear, session=object_session(target))
+    else:
+        RowIndexManager(target.id, object_session(target)).drop()
@@ -0,0 +1,164 @@
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from config import Config
+
+"""
+    This is the outliers.py file for the tabular_data blueprint.
+    it contains the OutlierEngine, the z-scores and the IQR fences of all the numeric columns of a file computed
+    together on a float64 block (rows x columns) of every chunk. only a summary is kept per column: the outlier
+    counts, the first outlier row indices and the top-k extremes, the z-scores of every cell are never stored.
+"""
+
+
+def numeric_block(df: pd.DataFrame, columns: List[str]) -> np.ndarray:
+    """
+    The columns of the chunk as one contiguous float64 block, the values that are not numbers are NaN
+    """
+    frame = df.reindex(columns=columns)
+    if not all(pd.api.types.is_numeric_dtype(dtype) for dtype in frame.dtypes):
+        # the rows table returns the JSON cells as objects
+        frame = frame.apply(pd.to_numeric, errors="coerce")
+    return np.ascontiguousarray(frame.to_numpy(dtype="float64", na_value=np.nan))
+
+
+class OutlierEngine:
+    """
+    Fold chunks of numeric columns into their outlier summaries.
+
+        the mean, the standard deviation and the quartiles are the statistics of the whole file (or filtered view),
+        so one pass over the rows gives the same summary whatever the chunk size.
+        a value is a z-score outlier when |z| > z_threshold and an IQR outlier when it is outside
+        [q1 - iqr_factor * iqr, q3 + iqr_factor * iqr].
+    """
+
+    def __init__(
+        self,
+        columns: List[str],
+        mean: np.ndarray,
+        std: np.ndarray,
+        q1: np.ndarray,
+        q3: np.ndarray,
+        z_threshold: float = None,
+        iqr_factor: float = 1.5,
+        top_k: int = None,
+        max_indices: int = None,
+    ):
+        self.columns = list(columns)
+        self.mean = np.asarray(mean, dtype="float64")
+        # a constant column has no z-scores
+        self.std = np.where(np.asarray(std, dtype="float64") > 0, std, np.nan).astype("float64")
+        q1 = np.asarray(q1, dtype="float64")
+        q3 = np.asarray(q3, dtype="float64")
+        self.lower = q1 - iqr_factor * (q3 - q1)
+        self.upper = q3 + iqr_factor * (q3 - q1)
+        self.z_threshold = z_threshold or Config.TABULAR_OUTLIER_Z_THRESHOLD
+        self.top_k = top_k or Config.TABULAR_OUTLIER_TOP_K
+        self.max_indices = Config.TABULAR_OUTLIER_MAX_INDICES if max_indices is None else max_indices
+
+        width = len(self.columns)
+        self.z_outliers = np.zeros(width, dtype="int64")
+        self.iqr_outliers = np.zeros(width, dtype="int64")
+        # the values that are outliers by either method, their first max_indices row indices are kept
+        self.outliers = np.zeros(width, dtype="int64")
+        self.indices = [[] for _ in self.columns]
+        # the top-k extremes of every column by |z|, -inf marks an empty slot
+        self.top_abs_z = np.full((0, width), -np.inf)
+        self.top_index = np.zeros((0, width), dtype="int64")
+        self.top_value = np.zeros((0, width))
+
+    @classmethod
+    def from_statistics(cls, statistics: Dict[str, Dict], columns: List[str] = None, **kwargs) -> "OutlierEngine":
+        """
+        The engine of the numeric columns of the statistics (only the given columns when set)
+        """
+        numeric = [column for column in statistics.get("mean", {}) if columns is None or column in columns]
+        quartiles = statistics.get("quartiles", {})
+
+        def quartile(column, q):
+            # the quartile keys are strings once the statistics went through JSON
+            values = quartiles.get(column, {})
+            return values.get(q, values.get(str(q)))
+
+        def value(name, column):
+            result = statistics.get(name, {}).get(column)
+            return np.nan if result is None else result
+
+        return cls(
+            numeric,
+            [value("mean", column) for column in numeric],
+            [value("std", column) for column in numeric],
+            [quartile(column, 0.25) for column in numeric],
+            [quartile(column, 0.75) for column in numeric],
+            **kwargs,
+        )
+
+    def z_scores(self, block: np.ndarray) -> np.ndarray:
+        return (block - self.mean) / self.std
+
+    def update(self, block: np.ndarray, index: np.ndarray):
+        """
+        Fold a (rows x columns) block of the engine columns, index holds the row index of every block row
+        """
+        if not block.size:
+            return
+        z = self.z_scores(block)
+        abs_z = np.abs(z)
+        with np.errstate(invalid="ignore"):
+            z_mask = abs_z > self.z_threshold
+            iqr_mask = (block < self.lower) | (block > self.upper)
+        self.z_outliers += z_mask.sum(axis=0)
+        self.iqr_outliers += iqr_mask.sum(axis=0)
+        outlier_mask = z_mask | iqr_mask
+        self.outliers += outlier_mask.sum(axis=0)
+
+        # the row indices of the outliers, column by column in row order
+        columns, rows = np.nonzero(outlier_mask.T)
+        bounds = np.searchsorted(columns, np.arange(len(self.columns) + 1))
+        for column, indices in enumerate(self.indices):
+            room = self.max_indices - len(indices)
+            if room > 0 and bounds[column + 1] > bounds[column]:
+                indices.extend(index[rows[bounds[column] : min(bounds[column + 1], bounds[column] + room)]].tolist())
+
+        # the top-k of the chunk, merged with the running top-k
+        abs_z = np.where(np.isnan(abs_z), -np.inf, abs_z)
+        if len(abs_z) > self.top_k:
+            positions = np.argpartition(-abs_z, self.top_k - 1, axis=0)[: self.top_k]
+        else:
+            positions = np.broadcast_to(np.arange(len(abs_z))[:, None], abs_z.shape)
+        candidates_abs_z = np.vstack([self.top_abs_z, np.take_along_axis(abs_z, positions, axis=0)])
+        candidates_index = np.vstack([self.top_index, index[positions]])
+        candidates_value = np.vstack([self.top_value, np.take_along_axis(block, positions, axis=0)])
+        order = np.argsort(-candidates_abs_z, axis=0, kind="stable")[: self.top_k]
+        self.top_abs_z = np.take_along_axis(candidates_abs_z, order, axis=0)
+        self.top_index = np.take_along_axis(candidates_index, order, axis=0)
+        self.top_value = np.take_along_axis(candidates_value, order, axis=0)
+
+    def result(self) -> Dict[str, Dict]:
+        """
+        The outlier summary of every column
+        """
+        summary = {}
+        for column, name in enumerate(self.columns):
+            extremes = [
+                {
+                    "index": int(self.top_index[row, column]),
+                    "value": float(self.top_value[row, column]),
+                    "z_score": float((self.top_value[row, column] - self.mean[column]) / self.std[column]),
+                }
+                for row in range(len(self.top_abs_z))
+                if np.isfinite(self.top_abs_z[row, column])
+            ]
+            summary[name] = {
+                "z_threshold": self.z_threshold,
+                "z_outliers": int(self.z_outliers[column]),
+                "iqr_lower": None if np.isnan(self.lower[column]) else float(self.lower[column]),
+                "iqr_upper": None if np.isnan(self.upper[column]) else float(self.upper[column]),
+                "iqr_outliers": int(self.iqr_outliers[column]),
+                "outlier_indices": self.indices[column],
+                "outlier_indices_truncated": int(self.outliers[column]) > len(self.indices[column]),
+                "extremes": extremes,
+            }
+        return summary
@@ -1,21 +1,43 @@
-from flask import request
-from flask_restful import Resource, fields, marshal_with, reqparse
+import itertools
+import os
+
+import numpy as np
+import pandas as pd
+from flask import Response, current_app, request, stream_with_context
+from flask_restful import Resource, fields, inputs, marshal, reqparse
 from marshmallow import ValidationError
-from sqlalchemy import Numeric, Text, and_, cast, or_
 from werkzeug.datastructures import FileStorage
 from werkzeug.exceptions import BadRequest
 
 from app.db import db
-from app.helpers import generate_random_filename, secure_filename
-from app.tabular_data.models import TabularDataFile, TabularDataFileHeader, TabularDataFileRow
+from app.helpers import secure_filename
+from app.media_storage import media_store
+from app.tabular_data.catalog import coerce_row_data
+from app.tabular_data.export import TabularExporter
+from app.tabular_data.headers import HeaderResolver
+from app.tabular_data.indexes import NUMERIC
+from app.tabular_data.ingestion import ChunkedIngestion
+from app.tabular_data.jobs import get_job_queue
+from app.tabular_data.models import TabularDataFile, TabularDataFileHeader, TabularIngestionJob
+from app.tabular_data.outliers import OutlierEngine, numeric_block
 from app.tabular_data.schemas import (
     PaginationSchema,
+    TabularDataFileAggregateSchema,
+    TabularDataFileCatalogSchema,
+    TabularDataFileExportSchema,
     TabularDataFileFilterSchema,
     TabularDataFileHeaderSchema,
+    TabularDataFileOutliersSchema,
+    TabularDataFileRowSchema,
     TabularDataFileSchema,
+    TabularDataFilesQuerySchema,
     TabularDataFileUpdateSchema,
+    TabularDataFileZScoresSchema,
+    TabularIngestionJobSchema,
 )
-from app.tabular_data.service import TabularDataService
+from app.tabular_data.service import TabularDataService, view_cache
+from app.tabular_data.storage import NUMERIC_AGGREGATE_FUNCTIONS, STORAGE_BACKENDS, get_storage, pagination_dict
+from app.uploads import UploadRejected, save_upload
 from config import Config
 
 # Define the fields for the tabular data file header response
@@ -24,6 +46,13 @@ tabular_data_file_header_fields = {
     "tabular_data_file_id": fields.Integer,
     "header": fields.String,
     "index": fields.Integer,
+    "dtype": fields.String,
+    "nullable": fields.Boolean,
+    "null_count": fields.Integer,
+    "cardinality": fields.Integer,
+    "min_value": fields.Raw,
+    "max_value": fields.Raw,
+    "byte_width": fields.Integer,
     "created_at": fields.DateTime,
     "updated_at": fields.DateTime,
 }
@@ -45,6 +74,10 @@ tabular_data_file_fields = {
     "id": fields.Integer,
     "name": fields.String,
     "path": fields.String,
+    "storage_backend": fields.String,
+    "row_count": fields.Integer,
+    "column_count": fields.Integer,
+    "byte_size": fields.Integer,
     "created_at": fields.DateTime,
     "updated_at": fields.DateTime,
     "headers": fields.List(fields.Nested(tabular_data_file_header_fields)),
@@ -72,6 +105,11 @@ class TabularDataFileResource(Resource):
             },
         ]
         rows_filter_operator = 'and' or 'or' this is the operator that will be used to combine the rows filter
+        cursor = the pagination.next_cursor of the previous response to read the next page by keyset instead of offset
+        count = 'exact' (cached per file version) or 'approximate' (the estimate of the database when it has one)
+        statistics_mode = 'exact' (default) or 'approximate': the quantiles from a uniform sample, the distinct counts
+            and the frequent values from streaming sketches, every approximate value with its error bound
+        statistics_error = the rank error of the approximate quantiles (default TABULAR_APPROXIMATE_ERROR)
         """
         if filters is None:
             filters = request.get_json()
@@ -91,79 +129,88 @@ class TabularDataFileResource(Resource):
         if not tabular_data_file:
             return {"message": "Tabular data file not found."}, 400
 
+        # every header lookup of the request is served by one query
+        header_resolver = HeaderResolver(tabular_data_file_id)
+        all_headers = header_resolver.all
+        headers = all_headers
         # Filter the headers of the tabular data file
-        with db.session.no_autoflush:
-            order_by = body.get("rows_order_by", "index")
-            if order_by.startswith("-"):
-                order_by = order_by[1:]
-                direction = "desc"
-            else:
-                direction = "asc"
-            if order_by in [header.header for header in tabular_data_file.headers]:
-                # Cast the JSON field to TEXT for ordering
-                order_by = getattr(cast(TabularDataFileRow.row_data[order_by], Text), direction)()
-            else:
-                # Default ordering
-                order_by = getattr(TabularDataFileRow.index, direction)()
-            all_headers = TabularDataFileHeader.query.filter_by(tabular_data_file_id=tabular_data_file_id).all()
-            if body.get("headers"):
-                tabular_data_file.headers = (
-                    TabularDataFileHeader.query.filter(
-                        TabularDataFileHeader.tabular_data_file_id == tabular_data_file_id,
-                        TabularDataFileHeader.id.in_(body["headers"]),
-                    )
-                    .order_by(TabularDataFileHeader.index)
-                    .all()
-                )
-                if not tabular_data_file.headers:
-                    return {"message": "No headers found."}, 400
-            # Filter the rows of the tabular data file
-            operator = and_ if body["rows_filter_operator"] == "and" else or_
-
-            row_operator_map = {
-                "eq": lambda x, y: cast(x, Numeric) == y,
-                "gt": lambda x, y: cast(cast(x, Text), Numeric) > y,
-                "lt": lambda x, y: cast(cast(x, Text), Numeric) < y,
-                "gte": lambda x, y: cast(cast(x, Text), Numeric) >= y,
-                "lte": lambda x, y: cast(cast(x, Text), Numeric) <= y,
-                "in": lambda x, y: x.in_(y),
-                "notin": lambda x, y: x.notin_(y),
-                "like": lambda x, y: x.like(f"%{y}%"),
-            }
-            if body.get("rows"):
-
-                filter_args = []
-                for row in body["rows"]:
-                    header = TabularDataFileHeader.query.filter_by(id=row["header_id"]).first()
-                    if header:
-                        json_field = TabularDataFileRow.row_data[header.header]
-                        filter_args.append(row_operator_map[row["operator"]](json_field, row["row_value"]))
-
-                pagination = (
-                    TabularDataFileRow.query.filter(
-                        TabularDataFileRow.tabular_data_file_id == tabular_data_file_id, operator(*filter_args)
-                    )
-                    .order_by(order_by)
-                    .paginate(page=page, per_page=page_size, error_out=False)
-                )
+        if body.get("headers"):
+            headers = header_resolver.select(body["headers"])
+            if not headers:
+                return {"message": "No headers found."}, 400
+        header_names = [header.header for header in headers]
 
-            else:
-                pagination = (
-                    TabularDataFileRow.query.filter_by(tabular_data_file_id=tabular_data_file_id)
-                    .order_by(order_by)
-                    .paginate(page=page, per_page=page_size, error_out=True)
-                )
+        order_by, direction = TabularDataService.parse_order_by(body.get("rows_order_by"), header_resolver.dtypes)
 
-            if pagination._query_offset >= pagination.total:
-                return {"message": "Page out of range."}, 400
+        # Filter the rows of the tabular data file
+        row_filters = header_resolver.resolve_filters(body.get("rows", []))
 
-            tabular_data_file.rows = pagination.items
+        try:
+            # keyset pagination, the page starts after the last row of the previous one
+            after = None
+            if body.get("cursor"):
+                after = TabularDataService.decode_cursor(
+                    body["cursor"], order_by, direction, header_resolver.dtypes.get(order_by)
+                )
+            rows, last_row = get_storage(tabular_data_file, header_resolver=header_resolver).query(
+                header_names,
+                row_filters,
+                filters_operator=body["rows_filter_operator"],
+                order_by=order_by,
+                direction=direction,
+                page=page,
+                page_size=page_size,
+                after=after,
+            )
+            total, approximate_total = TabularDataService.count_rows(
+                tabular_data_file,
+                row_filters,
+                body["rows_filter_operator"],
+                approximate=body["count"] == "approximate",
+                header_resolver=header_resolver,
+            )
+        except ValueError as e:
+            return {"message": str(e)}, 400
 
-            tabular_data_file.statistics = TabularDataService.statistics_from_TabularDataFile(tabular_data_file)
-        print("tabular_data_file rows length", len(tabular_data_file.rows))
+        if after is None:
+            if approximate_total:
+                # an estimate can not be lower than the rows already seen
+                total = max(total, (page - 1) * page_size + len(rows) + (1 if last_row is not None else 0))
+            if (page - 1) * page_size >= total:
+                return {"message": "Page out of range."}, 400
+            pagination = pagination_dict(page, page_size, total)
+        else:
+            pagination = {"per_page": page_size, "total": total}
+        pagination["next_cursor"] = (
+            TabularDataService.encode_cursor(order_by, direction, last_row) if last_row is not None else None
+        )
+        pagination["approximate_total"] = approximate_total
+
+        # the statistics of the whole (filtered) view, the computed ones are cached per file version
+        if body["statistics_mode"] == "approximate":
+            statistics = TabularDataService.approximate_statistics(
+                tabular_data_file,
+                header_names,
+                row_filters,
+                body["rows_filter_operator"],
+                error=body.get("statistics_error"),
+                header_resolver=header_resolver,
+            )
+        else:
+            statistics = TabularDataService.view_statistics(
+                tabular_data_file,
+                header_names,
+                row_filters,
+                body["rows_filter_operator"],
+                header_resolver=header_resolver,
+            )
         return {
-            **TabularDataFileSchema().dump(tabular_data_file),
-            "rows_count": len(tabular_data_file.rows),
+            **TabularDataFileSchema(exclude=("headers", "rows", "statistics")).dump(tabular_data_file),
+            "headers": TabularDataFileHeaderSchema().dump(headers, many=True),
+            "rows": TabularDataFileRowSchema().dump(rows, many=True),
+            "statistics": statistics,
+            "statistics_mode": body["statistics_mode"],
+            "rows_count": len(rows),
             "pagination": PaginationSchema().dump(pagination),
             "all_headers": TabularDataFileHeaderSchema().dump(all_headers, many=True),
         }
@@ -182,34 +229,41 @@ class TabularDataFileResource(Resource):
         except Exception as e:
             return {"message": str(e)}, 400
 
-        # Query the tabular data file by its id
-        tabular_data_file = TabularDataFile.query.filter_by(id=tabular_data_file_id).first()
+        # Query the tabular data file by its id, its row is locked until the commit: the statistics, the catalog of
+        # the headers and the indexes of the appended rows are read and written by one update at a time
+        tabular_data_file = TabularDataFile.query.filter_by(id=tabular_data_file_id).with_for_update().first()
         if not tabular_data_file:
             return {"message": "Tabular data file not found."}, 404
 
         # Update the tabular data file
         tabular_data_file.name = body.get("name", tabular_data_file.name)
 
-        # Update the rows of the tabular data file
+        # Update the rows of the tabular data file and fold the changed rows into the statistics
         if body.get("rows"):
-            last_index = (
-                TabularDataFileRow.query.filter_by(tabular_data_file_id=tabular_data_file_id)
-                .order_by(TabularDataFileRow.index.desc())
-                .first()
-                .index
-            )
-            for row in body["rows"]:
-                tabular_data_file_row = TabularDataFileRow.query.filter_by(id=row.get("id")).first()
-                if tabular_data_file_row:
-                    tabular_data_file_row.row_data = row["row_data"]
-                else:
-                    tabular_data_file_row = TabularDataFileRow(
-                        tabular_data_file_id=tabular_data_file_id, row_data=row["row_data"], index=last_index + 1
-                    )
-                    last_index += 1
-                    db.session.add(tabular_data_file_row)
+            header_resolver = HeaderResolver(tabular_data_file_id)
+            headers = header_resolver.names
+            try:
+                # the cells are stored with the dtype of their header
+                rows = [
+                    {**row, "row_data": coerce_row_data(row["row_data"], header_resolver.by_name)}
+                    for row in body["rows"]
+                ]
+            except ValueError as e:
+                db.session.rollback()
+                return {"message": str(e)}, 400
+            statistics = TabularDataService.load_statistics(tabular_data_file, headers)
+            try:
+                storage = get_storage(tabular_data_file, header_resolver=header_resolver)
+                replaced_rows, written_rows = storage.upsert_rows(rows)
+            except ValueError as e:
+                db.session.rollback()
+                return {"message": str(e)}, 400
+            TabularDataService.update_statistics(tabular_data_file, statistics, headers, replaced_rows, written_rows)
+            TabularDataService.update_catalog(header_resolver.all, replaced_rows, written_rows)
 
         db.session.commit()
+        # the version is part of the cache key, dropping the stale entries only frees their memory
+        view_cache.invalidate(tabular_data_file.id)
 
         return self.post(tabular_data_file_id, body.get("filters", {}))
 
@@ -226,10 +280,262 @@ class TabularDataFileResource(Resource):
         # Delete the tabular data file
         db.session.delete(tabular_data_file)
         db.session.commit()
+        view_cache.invalidate(tabular_data_file_id)
 
         return {"message": "Tabular data file deleted."}, 204
 
 
+class TabularDataFileExportResource(Resource):
+    """
+    This resource class handles exporting a tabular data file.
+    """
+
+    def post(self, tabular_data_file_id):
+        """
+        stream the rows of a tabular data file as a file download.
+        takes the same headers, rows filters, rows_filter_operator and rows_order_by as the tabular data file endpoint.
+        format = 'csv' or 'ndjson' or 'parquet'
+        compression = 'none' or 'gzip' or 'zstd'
+        the rows are read in chunks with a server side cursor and encoded while the response is sent.
+        """
+
+        # Parse the request arguments
+        try:
+            body = TabularDataFileExportSchema().load(request.get_json() or {})
+        except ValidationError as e:
+            return e.messages, 400
+        except Exception as e:
+            return {"message": str(e)}, 400
+
+        # Query the tabular data file by its id
+        tabular_data_file = TabularDataFile.query.filter_by(id=tabular_data_file_id).first()
+        if not tabular_data_file:
+            return {"message": "Tabular data file not found."}, 404
+
+        header_resolver = HeaderResolver(tabular_data_file_id)
+        header_names = header_resolver.names
+        if body.get("headers"):
+            header_names = [header.header for header in header_resolver.select(body["headers"])]
+            if not header_names:
+                return {"message": "No headers found."}, 400
+        order_by, direction = TabularDataService.parse_order_by(body.get("rows_order_by"), header_resolver.dtypes)
+        row_filters = header_resolver.resolve_filters(body.get("rows", []))
+
+        try:
+            exporter = TabularExporter(header_names, body["format"], body["compression"], dtypes=header_resolver.dtypes)
+            frames = get_storage(tabular_data_file, header_resolver=header_resolver).iter_frames(
+                header_names,
+                filters=row_filters,
+                filters_operator=body["rows_filter_operator"],
+                order_by=order_by,
+                direction=direction,
+            )
+            chunks = exporter.encode(frames)
+            # the first chunk runs the query, an invalid filter value is still answered with a 400
+            first_chunk = next(chunks, b"")
+        except ValueError as e:
+            return {"message": str(e)}, 400
+
+        filename = exporter.filename(os.path.splitext(secure_filename(tabular_data_file.name))[0] or "export")
+        return Response(
+            stream_with_context(itertools.chain([first_chunk], chunks)),
+            mimetype=exporter.mimetype,
+            headers={"Content-Disposition": f'attachment; filename="{filename}"'},
+        )
+
+
+class TabularDataFileOutliersResource(Resource):
+    """
+    This resource class handles the outlier summary of a tabular data file.
+    """
+
+    def post(self, tabular_data_file_id):
+        """
+        return the outlier summary of the numeric headers (all of them or the given header ids) of the file
+        or of the rows matching the rows filters: the z-score and IQR outlier counts, the IQR fences,
+        the first row indices of the outliers and the top_k extremes by |z|.
+        z_threshold = the |z| above which a value is an outlier (default TABULAR_OUTLIER_Z_THRESHOLD)
+        """
+
+        # Parse the request arguments
+        try:
+            body = TabularDataFileOutliersSchema().load(request.get_json() or {})
+        except ValidationError as e:
+            return e.messages, 400
+        except Exception as e:
+            return {"message": str(e)}, 400
+
+        # Query the tabular data file by its id
+        tabular_data_file = TabularDataFile.query.filter_by(id=tabular_data_file_id).first()
+        if not tabular_data_file:
+            return {"message": "Tabular data file not found."}, 404
+
+        header_resolver = HeaderResolver(tabular_data_file_id)
+        header_names = header_resolver.names
+        if body.get("headers"):
+            header_names = [header.header for header in header_resolver.select(body["headers"])]
+            if not header_names:
+                return {"message": "No headers found."}, 400
+
+        try:
+            outliers = TabularDataService.outlier_summary(
+                tabular_data_file,
+                header_names,
+                header_resolver.resolve_filters(body.get("rows", [])),
+                body["rows_filter_operator"],
+                header_resolver=header_resolver,
+                z_threshold=body.get("z_threshold"),
+                top_k=body.get("top_k"),
+            )
+        except ValueError as e:
+            return {"message": str(e)}, 400
+        return {"outliers": outliers}
+
+
+class TabularDataFileAggregateResource(Resource):
+    """
+    This resource class handles the group-by aggregation of a tabular data file.
+    """
+
+    def post(self, tabular_data_file_id):
+        """
+        group the rows of the file (or the rows matching the rows filters) by the group_by header ids and
+        return the aggregates of every group: count, sum, mean, min, max and percentile.
+        the aggregation runs in the storage backend, the result is a compact table (columns and rows as lists)
+        of at most limit groups ordered by the group values, truncated is true when there were more groups.
+        """
+
+        # Parse the request arguments
+        try:
+            body = TabularDataFileAggregateSchema().load(request.get_json() or {})
+        except ValidationError as e:
+            return e.messages, 400
+        except Exception as e:
+            return {"message": str(e)}, 400
+
+        # Query the tabular data file by its id
+        tabular_data_file = TabularDataFile.query.filter_by(id=tabular_data_file_id).first()
+        if not tabular_data_file:
+            return {"message": "Tabular data file not found."}, 404
+
+        header_resolver = HeaderResolver(tabular_data_file_id)
+        headers = header_resolver.by_id
+        unknown = [
+            header_id
+            for header_id in [*body["group_by"], *[item.get("header_id") for item in body["aggregates"]]]
+            if header_id is not None and header_id not in headers
+        ]
+        if unknown:
+            return {"message": f"Headers {unknown} not found."}, 400
+
+        aggregates = []
+        for item in body["aggregates"]:
+            header = headers[item["header_id"]] if item.get("header_id") is not None else None
+            if item["function"] in NUMERIC_AGGREGATE_FUNCTIONS and header.dtype not in (NUMERIC, None):
+                return {"message": f"The {item['function']} of the {header.header} header needs numbers."}, 400
+            aggregates.append(
+                {
+                    "function": item["function"],
+                    "header": header.header if header is not None else None,
+                    "percentile": item.get("percentile"),
+                    "alias": item.get("alias"),
+                }
+            )
+
+        try:
+            result = TabularDataService.aggregate(
+                tabular_data_file,
+                [headers[header_id].header for header_id in body["group_by"]],
+                aggregates,
+                header_resolver.resolve_filters(body.get("rows", [])),
+                body["rows_filter_operator"],
+                limit=body["limit"],
+                header_resolver=header_resolver,
+            )
+        except ValueError as e:
+            return {"message": str(e)}, 400
+        return result
+
+
+class TabularDataFileZScoresResource(Resource):
+    """
+    This resource class handles the z-scores of one header of a tabular data file.
+    """
+
+    def post(self, tabular_data_file_id):
+        """
+        return a page of the z-score column of one numeric header, computed on demand against the mean and the
+        standard deviation of the file (or of the rows matching the rows filters).
+        takes the same rows filters, rows_order_by, page and page_size as the tabular data file endpoint.
+        """
+
+        # Parse the request arguments
+        try:
+            body = TabularDataFileZScoresSchema().load(request.get_json() or {})
+        except ValidationError as e:
+            return e.messages, 400
+        except Exception as e:
+            return {"message": str(e)}, 400
+
+        # Query the tabular data file by its id
+        tabular_data_file = TabularDataFile.query.filter_by(id=tabular_data_file_id).first()
+        if not tabular_data_file:
+            return {"message": "Tabular data file not found."}, 404
+
+        header_resolver = HeaderResolver(tabular_data_file_id)
+        header = header_resolver.by_id.get(body["header_id"])
+        if not header:
+            return {"message": "Header not found."}, 400
+        order_by, direction = TabularDataService.parse_order_by(body.get("rows_order_by"), header_resolver.dtypes)
+        row_filters = header_resolver.resolve_filters(body.get("rows", []))
+        page = body["page"]
+        page_size = body["page_size"]
+
+        try:
+            statistics = TabularDataService.view_statistics(
+                tabular_data_file, [header.header], row_filters, body["rows_filter_operator"], header_resolver
+            )
+            if header.header not in statistics.get("mean", {}):
+                return {"message": "The header is not numeric."}, 400
+            rows, _ = get_storage(tabular_data_file, header_resolver=header_resolver).query(
+                [header.header],
+                row_filters,
+                filters_operator=body["rows_filter_operator"],
+                order_by=order_by,
+                direction=direction,
+                page=page,
+                page_size=page_size,
+            )
+            total, _ = TabularDataService.count_rows(
+                tabular_data_file, row_filters, body["rows_filter_operator"], header_resolver=header_resolver
+            )
+        except ValueError as e:
+            return {"message": str(e)}, 400
+        if (page - 1) * page_size >= max(total, 1):
+            return {"message": "Page out of range."}, 400
+
+        mean = statistics["mean"][header.header]
+        std = statistics["std"].get(header.header)
+        values = numeric_block(
+            pd.DataFrame([row["row_data"] for row in rows], columns=[header.header]), [header.header]
+        )
+        z_scores = OutlierEngine([header.header], [mean], [std], [np.nan], [np.nan]).z_scores(values)[:, 0]
+        return {
+            "header": TabularDataFileHeaderSchema().dump(header),
+            "mean": mean,
+            "std": std,
+            "rows": [
+                {
+                    "index": row["index"],
+                    "value": None if np.isnan(value) else float(value),
+                    "z_score": None if np.isnan(z_score) else float(z_score),
+                }
+                for row, value, z_score in zip(rows, values[:, 0], z_scores)
+            ],
+            "pagination": PaginationSchema().dump(pagination_dict(page, page_size, total)),
+        }
+
+
 class NewTabularDataFileResource(Resource):
     """
     This resource class handles creating a new tabular data file.
@@ -248,10 +554,31 @@ class NewTabularDataFileResource(Resource):
         parser.add_argument(
             "file", type=FileStorage, location="files", required=True, help="The tabular data file to upload."
         )
+        parser.add_argument(
+            "streaming", type=inputs.boolean, location="form", required=False, help="Ingest the file in chunks."
+        )
+        parser.add_argument(
+            "background",
+            type=inputs.boolean,
+            location="form",
+            required=False,
+            help="Ingest the file in a background job, the job is returned.",
+        )
+        parser.add_argument(
+            "storage",
+            type=str,
+            location="form",
+            required=False,
+            default=Config.TABULAR_STORAGE_BACKEND,
+            choices=list(STORAGE_BACKENDS),
+            help="The storage backend of the rows.",
+        )
         try:
             args = parser.parse_args()
         except BadRequest as e:
             return e.data, e.code
+        except UploadRejected as e:
+            return {"message": e.description}, e.code
         except Exception as e:
             return {"message": str(e)}, 400
 
@@ -261,20 +588,37 @@ class NewTabularDataFileResource(Resource):
         if not self.allowed_file(args["file"].filename):
             return {"message": "File extension not allowed."}, 400
 
-        # Save the file
-        filename = secure_filename(args["file"].filename).split(".")[0] + generate_random_filename(
-            args["file"].filename
-        )
-        path = f"{Config.MEDIA_DIR}/{filename}"
-        args["file"].save(path)
-
-        # read the tabular data file
-        tabular_data_service = TabularDataService(path)
-        df = tabular_data_service.process_data()
+        # Save the file, a content already uploaded is stored once
+        filename = secure_filename(args["file"].filename)
+        try:
+            blob = save_upload(args["file"])
+        except UploadRejected as e:
+            return {"message": e.description}, e.code
+        path = blob.path
+
+        background = args["background"]
+        if background is None:
+            background = os.path.getsize(path) > Config.TABULAR_BACKGROUND_THRESHOLD
+        if background:
+            return self.submit_ingestion_job(filename, path, args["storage"])
+
+        streaming = args["streaming"]
+        if streaming is None:
+            streaming = os.path.getsize(path) > Config.TABULAR_STREAMING_THRESHOLD
+        if streaming:
+            return self.ingest_in_chunks(filename, path, args["storage"])
+
+        # read the tabular data file, the parsed columns and the statistics of a known content are reused
+        try:
+            df, statistics = TabularDataService.read_upload(blob)
+        except Exception as e:
+            media_store.discard(blob)
+            return {"message": f"Could not read the file: {e}"}, 400
         # Create the tabular data file
         tabular_data_file = TabularDataService.create_tabular_data_file(
-            filename, path, TabularDataService.compute_statistics(df)
+            filename, path, statistics.result(), storage_backend=args["storage"]
         )
+        tabular_data_file.statistics_sketch = statistics.to_dict()
 
         # Create the tabular data file headers
 
@@ -285,19 +629,74 @@ class NewTabularDataFileResource(Resource):
             tabular_data_file_headers = TabularDataService.create_tabular_data_file_headers(tabular_data_file, df)
             db.session.add_all(tabular_data_file_headers)
             # db.session.refresh(tabular_data_file_headers)
-            # Create the tabular data file rows
-            tabular_data_file_rows = TabularDataService.create_tabular_data_file_rows(tabular_data_file, df)
-
-            # Save the tabular data file to the database
-            db.session.add_all(tabular_data_file_rows)
+            # Stream the tabular data file rows into its storage in bulk
+            ingestion = TabularDataService.bulk_load_tabular_data_file_rows(tabular_data_file, df)
         except Exception as e:
+            db.session.rollback()
             db.session.delete(tabular_data_file)
             db.session.commit()
             return {"message": str(e.args[0])}, 400
         db.session.commit()
+        return self.ingested_response(tabular_data_file, ingestion)
+
+    @staticmethod
+    def submit_ingestion_job(filename, path, storage_backend):
+        """
+        Queue the ingestion of the saved file and return the job right away,
+        its progress is read from the tabular ingestion job endpoint.
+        """
+        job = TabularIngestionJob(name=filename, path=path, storage_backend=storage_backend)
+        db.session.add(job)
+        db.session.commit()
+        try:
+            get_job_queue().submit(job.id)
+        except Exception as e:
+            job.status = TabularIngestionJob.FAILED
+            job.error = f"Could not queue the ingestion job: {e}"
+            job.path = None
+            db.session.commit()
+            return TabularIngestionJobSchema().dump(job), 503
+        return TabularIngestionJobSchema().dump(job), 202
+
+    def ingest_in_chunks(self, filename, path, storage_backend):
+        """
+        Create the tabular data file while reading, writing and summarizing the uploaded file chunk by chunk.
+        """
+        tabular_data_file = TabularDataService.create_tabular_data_file(
+            filename, path, None, storage_backend=storage_backend
+        )
+        db.session.add(tabular_data_file)
+        db.session.commit()
+        try:
+            chunks = TabularDataService(path).iter_chunks()
+            storage = get_storage(tabular_data_file)
+            ingestion = ChunkedIngestion(tabular_data_file, chunks, storage.writer()).run()
+            storage.build_indexes()
+        except Exception as e:
+            db.session.rollback()
+            db.session.delete(tabular_data_file)
+            db.session.commit()
+            return {"message": str(e.args[0]) if e.args else str(e)}, 400
+        db.session.commit()
+        return self.ingested_response(tabular_data_file, ingestion)
+
+    @staticmethod
+    def ingested_response(tabular_data_file, ingestion):
         db.session.refresh(tabular_data_file)
+        current_app.logger.info(
+            "tabular data file %s ingested %s rows in %ss (%s rows/sec)",
+            tabular_data_file.id,
+            ingestion["rows"],
+            ingestion["seconds"],
+            ingestion["rows_per_second"],
+        )
 
-        return TabularDataFileSchema().dump(tabular_data_file)
+        # the rows are not echoed back, a multi-million row upload would otherwise be serialized in this request
+        return {
+            **TabularDataFileSchema(exclude=("rows",)).dump(tabular_data_file),
+            "rows_count": ingestion["rows"],
+            "ingestion": ingestion,
+        }
 
     def allowed_file(self, filename):
         """
@@ -307,17 +706,85 @@ class NewTabularDataFileResource(Resource):
         return "." in filename and filename.rsplit(".", 1)[1].lower() in ALLOWED_EXTENSIONS
 
 
+class TabularIngestionJobResource(Resource):
+    """
+    This resource class handles the tabular ingestion job endpoint.
+    """
+
+    def get(self, job_id):
+        """
+        return the status and the progress (rows_done of rows_total) of an ingestion job.
+        the tabular_data_file_id is set as soon as the job starts, the file is queryable from its first chunk.
+        """
+        job = db.session.get(TabularIngestionJob, job_id)
+        if not job:
+            return {"message": "Tabular ingestion job not found."}, 404
+        return TabularIngestionJobSchema().dump(job)
+
+
 class TabularDataFilesResource(Resource):
     """
     This resource class handles the tabular data files endpoints.
     """
 
-    @marshal_with(tabular_data_file_fields)
     def get(self):
         """
-        return a list of tabular data files.
+        return a page of the tabular data files catalog.
+        every file comes with its row count, column count, byte size and the dtypes of its headers, all stored on
+        the file or its headers so the rows are never read.
+        query arguments:
+        name = only the files whose name contains the value
+        created_after, created_before = ISO 8601 datetimes
+        order_by = 'name' or '-name' or 'created_at' or '-created_at' (default)
+        page, page_size = the page of the catalog
+        full = true to include the headers and all the rows of every file of the page
         """
 
-        # Query all the tabular data files
-        tabular_data_files = TabularDataFile.query.all()
-        return tabular_data_files
+        # Parse the request arguments
+        try:
+            args = TabularDataFilesQuerySchema().load(request.args)
+        except ValidationError as e:
+            return e.messages, 400
+
+        query = TabularDataFile.query
+        if args.get("name"):
+            query = query.filter(TabularDataFile.name.ilike(f"%{args['name']}%"))
+        if args.get("created_after"):
+            query = query.filter(TabularDataFile.created_at >= args["created_after"])
+        if args.get("created_before"):
+            query = query.filter(TabularDataFile.created_at <= args["created_before"])
+        total = query.order_by(None).count()
+
+        order_by = args["order_by"]
+        column = getattr(TabularDataFile, order_by.lstrip("-"))
+        direction = "desc" if order_by.startswith("-") else "asc"
+        page = args["page"]
+        page_size = args["page_size"]
+        tabular_data_files = (
+            query.options(db.defer(TabularDataFile.statistics))
+            .order_by(getattr(column, direction)(), getattr(TabularDataFile.id, direction)())
+            .offset((page - 1) * page_size)
+            .limit(page_size)
+            .all()
+        )
+
+        if args["full"]:
+            files = marshal(tabular_data_files, tabular_data_file_fields)
+        else:
+            # the dtypes of all the files of the page are read with one query on the headers
+            dtypes = {tabular_data_file.id: {} for tabular_data_file in tabular_data_files}
+            headers = (
+                db.session.query(
+                    TabularDataFileHeader.tabular_data_file_id,
+                    TabularDataFileHeader.header,
+                    TabularDataFileHeader.dtype,
+                )
+                .filter(TabularDataFileHeader.tabular_data_file_id.in_(list(dtypes)))
+                .order_by(TabularDataFileHeader.tabular_data_file_id, TabularDataFileHeader.index)
+            )
+            for tabular_data_file_id, header, dtype in headers:
+                dtypes[tabular_data_file_id][header] = dtype
+            files = TabularDataFileCatalogSchema(many=True).dump(tabular_data_files)
+            for file in files:
+                file["dtypes"] = dtypes[file["id"]]
+        return {"files": files, "pagination": PaginationSchema().dump(pagination_dict(page, page_size, total))}
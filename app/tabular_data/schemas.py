@@ -1,6 +1,7 @@
-from marshmallow import EXCLUDE, Schema, fields, validate
+from marshmallow import EXCLUDE, Schema, ValidationError, fields, validate, validates_schema
 
-from app.tabular_data.models import TabularDataFile, TabularDataFileHeader, TabularDataFileRow
+from app.tabular_data.models import TabularDataFile, TabularDataFileHeader, TabularDataFileRow, TabularIngestionJob
+from app.tabular_data.storage import AGGREGATE_FUNCTIONS
 
 
 class TabularDataFileHeaderSchema(Schema):
@@ -10,7 +11,21 @@ class TabularDataFileHeaderSchema(Schema):
 
     class Meta:
         model = TabularDataFileHeader
-        fields = ("id", "tabular_data_file_id", "header", "index", "created_at", "updated_at")
+        fields = (
+            "id",
+            "tabular_data_file_id",
+            "header",
+            "index",
+            "dtype",
+            "nullable",
+            "null_count",
+            "cardinality",
+            "min_value",
+            "max_value",
+            "byte_width",
+            "created_at",
+            "updated_at",
+        )
 
 
 class TabularDataFileRowSchema(Schema):
@@ -33,7 +48,101 @@ class TabularDataFileSchema(Schema):
 
     class Meta:
         model = TabularDataFile
-        fields = ("id", "name", "path", "created_at", "updated_at", "headers", "rows", "statistics")
+        fields = (
+            "id",
+            "name",
+            "path",
+            "storage_backend",
+            "row_count",
+            "column_count",
+            "byte_size",
+            "created_at",
+            "updated_at",
+            "headers",
+            "rows",
+            "statistics",
+        )
+
+
+class TabularDataFileCatalogSchema(Schema):
+    """
+    This class represents the schema for the tabular data file in the files catalog.
+    the dtypes of the headers are added by the resource.
+    """
+
+    class Meta:
+        model = TabularDataFile
+        fields = (
+            "id",
+            "name",
+            "path",
+            "storage_backend",
+            "row_count",
+            "column_count",
+            "byte_size",
+            "version",
+            "created_at",
+            "updated_at",
+        )
+
+
+class TabularDataFilesQuerySchema(Schema):
+    """
+    This class represents the schema for the query arguments of the tabular data files catalog.
+    """
+
+    # the files whose name contains the value (case insensitive)
+    name = fields.String(required=False)
+    created_after = fields.DateTime(required=False)
+    created_before = fields.DateTime(required=False)
+    order_by = fields.String(
+        required=False,
+        validate=validate.OneOf(["name", "-name", "created_at", "-created_at"]),
+        missing="-created_at",
+    )
+    page = fields.Integer(required=False, missing=1, validate=validate.Range(min=1))
+    page_size = fields.Integer(required=False, missing=20, validate=validate.Range(min=1, max=100))
+    # include the headers and all the rows of every file of the page
+    full = fields.Boolean(required=False, missing=False)
+
+    class Meta:
+        unknown = EXCLUDE
+
+
+class TabularIngestionJobSchema(Schema):
+    """
+    This class represents the schema for the tabular ingestion job.
+    """
+
+    progress = fields.Method("get_progress")
+
+    class Meta:
+        model = TabularIngestionJob
+        fields = (
+            "id",
+            "tabular_data_file_id",
+            "name",
+            "storage_backend",
+            "status",
+            "rows_done",
+            "rows_total",
+            "progress",
+            "error",
+            "started_at",
+            "finished_at",
+            "created_at",
+            "updated_at",
+        )
+
+    def get_progress(self, job):
+        """
+        The fraction of the rows done, None while the total is not known
+        """
+        if job.status == TabularIngestionJob.COMPLETED:
+            return 1.0
+        if not job.rows_total:
+            return None
+        return round(min(job.rows_done / job.rows_total, 1.0), 4)
 
 
 class TabularDataFileRowFilterSchema(Schema):
@@ -61,6 +170,86 @@ class TabularDataFileFilterSchema(Schema):
     rows_order_by = fields.String(required=False)
     page = fields.Integer(required=False, missing=1, validate=validate.Range(min=1))
     page_size = fields.Integer(required=False, missing=10, validate=validate.Range(min=5, max=100))
+    # the next_cursor of the previous page, the page then starts after its last row and page is ignored
+    cursor = fields.String(required=False)
+    # 'approximate' returns the planner row estimate as the total when the database has one
+    count = fields.String(required=False, validate=validate.OneOf(["exact", "approximate"]), missing="exact")
+    # 'approximate' computes the statistics from a sample and streaming sketches, with their error bounds
+    statistics_mode = fields.String(required=False, validate=validate.OneOf(["exact", "approximate"]), missing="exact")
+    # the rank error of the approximate quantiles and the relative error of the approximate distinct counts
+    statistics_error = fields.Float(required=False, validate=validate.Range(min=0.001, max=0.5))
+
+
+class TabularDataFileExportSchema(Schema):
+    """
+    This class represents the schema for exporting the tabular data file.
+    """
+
+    headers = fields.List(fields.Integer(), required=False)
+    rows = fields.List(fields.Nested(TabularDataFileRowFilterSchema), required=False)
+    rows_filter_operator = fields.String(required=False, validate=validate.OneOf(["and", "or"]), missing="and")
+    rows_order_by = fields.String(required=False)
+    format = fields.String(required=False, validate=validate.OneOf(["csv", "ndjson", "parquet"]), missing="csv")
+    compression = fields.String(required=False, validate=validate.OneOf(["none", "gzip", "zstd"]), missing="none")
+
+
+class TabularDataFileOutliersSchema(Schema):
+    """
+    This class represents the schema for the outlier summary of the tabular data file.
+    """
+
+    headers = fields.List(fields.Integer(), required=False)
+    rows = fields.List(fields.Nested(TabularDataFileRowFilterSchema), required=False)
+    rows_filter_operator = fields.String(required=False, validate=validate.OneOf(["and", "or"]), missing="and")
+    z_threshold = fields.Float(required=False, validate=validate.Range(min=0, min_inclusive=False))
+    top_k = fields.Integer(required=False, validate=validate.Range(min=1, max=100))
+
+
+class TabularDataFileZScoresSchema(Schema):
+    """
+    This class represents the schema for the z-scores of one header of the tabular data file.
+    """
+
+    header_id = fields.Integer(required=True)
+    rows = fields.List(fields.Nested(TabularDataFileRowFilterSchema), required=False)
+    rows_filter_operator = fields.String(required=False, validate=validate.OneOf(["and", "or"]), missing="and")
+    rows_order_by = fields.String(required=False)
+    page = fields.Integer(required=False, missing=1, validate=validate.Range(min=1))
+    page_size = fields.Integer(required=False, missing=100, validate=validate.Range(min=5, max=1000))
+
+
+class TabularDataFileAggregateFunctionSchema(Schema):
+    """
+    This class represents the schema for one aggregate of the tabular data file aggregation.
+    """
+
+    function = fields.String(required=True, validate=validate.OneOf(AGGREGATE_FUNCTIONS))
+    # header_id = the aggregated header, count counts the rows when it is not set
+    header_id = fields.Integer(required=False)
+    # percentile = between 0 and 1, only for the percentile function
+    percentile = fields.Float(required=False, validate=validate.Range(min=0, max=1))
+    alias = fields.String(required=False, validate=validate.Length(min=1, max=100))
+
+    @validates_schema
+    def validate_function(self, data, **kwargs):
+        if data["function"] != "count" and data.get("header_id") is None:
+            raise ValidationError(f"The {data['function']} function needs a header_id.", "header_id")
+        if data["function"] == "percentile" and data.get("percentile") is None:
+            raise ValidationError("The percentile function needs a percentile.", "percentile")
+
+
+class TabularDataFileAggregateSchema(Schema):
+    """
+    This class represents the schema for the group-by aggregation of the tabular data file.
+    """
+
+    group_by = fields.List(fields.Integer(), required=False, missing=[], validate=validate.Length(max=10))
+    aggregates = fields.List(
+        fields.Nested(TabularDataFileAggregateFunctionSchema), required=True, validate=validate.Length(min=1, max=50)
+    )
+    rows = fields.List(fields.Nested(TabularDataFileRowFilterSchema), required=False)
+    rows_filter_operator = fields.String(required=False, validate=validate.OneOf(["and", "or"]), missing="and")
+    limit = fields.Integer(required=False, missing=1000, validate=validate.Range(min=1, max=10000))
 
 
 class TabularDataFileRowAddSchema(Schema):
@@ -95,3 +284,5 @@ class PaginationSchema(Schema):
     pages = fields.Int(required=True)
     prev_num = fields.Int()
     next_num = fields.Int()
+    next_cursor = fields.String(allow_none=True)
+    approximate_total = fields.Bool()
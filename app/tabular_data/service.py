@@ -1,9 +1,33 @@
-from collections.abc import Hashable
-from typing import Dict, List
+import base64
+import binascii
+import json
+import os
+from decimal import Decimal, InvalidOperation
+from itertools import islice
+from typing import Dict, Iterator, List, Optional, Tuple
 
 import pandas as pd
+import pyarrow as pa
+from openpyxl import load_workbook
 
-from app.tabular_data.models import TabularDataFile, TabularDataFileHeader, TabularDataFileRow
+from app.cache import TieredCache
+from app.media_storage import MediaBlob, media_store
+from app.tabular_data.catalog import SchemaCatalog
+from app.tabular_data.headers import HeaderResolver
+from app.tabular_data.indexes import NUMERIC, infer_dtype
+from app.tabular_data.models import TabularDataFile, TabularDataFileHeader
+from app.tabular_data.outliers import OutlierEngine, numeric_block
+from app.tabular_data.statistics import ApproximateStatistics, StatisticsAccumulator
+from app.tabular_data.storage import get_storage
+from config import Config
+
+# statistics and row counts of the filtered views, keyed by the file id, its version and the view (filters, headers)
+view_cache = TieredCache(
+    "tabular_views",
+    max_bytes=Config.TABULAR_VIEW_CACHE_MAX_BYTES,
+    disk_max_bytes=Config.TABULAR_VIEW_CACHE_DISK_MAX_BYTES,
+    directory=Config.CACHE_FOLDER,
+)
 
 
 class TabularDataService:
@@ -11,26 +35,97 @@ class TabularDataService:
     def __init__(self, file):
         self.file = file
 
+    @property
+    def extension(self) -> str:
+        return str(self.file).rsplit(".", 1)[-1].lower()
+
     def process_data(self) -> pd.DataFrame:
         """
         Process the tabular data
         """
-        df = pd.read_csv(self.file)
+        if self.extension in ("xls", "xlsx"):
+            df = pd.read_excel(self.file)
+        else:
+            # the csv is parsed from a memory map of the file instead of buffered reads
+            df = pd.read_csv(self.file, memory_map=True)
+        df.columns = [str(column) for column in df.columns]
         return df
 
-    @staticmethod
-    def get_headers(df: pd.DataFrame) -> List[str]:
+    def iter_chunks(self, chunksize: int = None) -> Iterator[pd.DataFrame]:
         """
-        Get the headers of the tabular data
+        Read the tabular data in chunks of at most chunksize rows, only one chunk is held in memory at a time.
+
+            csv files are read with the pandas chunked reader, xlsx files with openpyxl in read-only mode,
+            xls files have no streaming reader so the sheet is read once and sliced.
         """
-        return df.columns.tolist()
+        chunksize = chunksize or Config.TABULAR_INGESTION_CHUNK_SIZE
+        if self.extension == "xlsx":
+            yield from self._iter_xlsx_chunks(chunksize)
+        elif self.extension == "xls":
+            df = self.process_data()
+            for offset in range(0, len(df), chunksize):
+                yield df.iloc[offset : offset + chunksize]
+        else:
+            with pd.read_csv(self.file, chunksize=chunksize, memory_map=True) as reader:
+                for chunk in reader:
+                    chunk.columns = [str(column) for column in chunk.columns]
+                    yield chunk
+
+    def estimate_row_count(self) -> Optional[int]:
+        """
+        The number of rows of the file without parsing it, the lines of a csv file (a quoted value can span lines)
+        and the dimension of a xlsx sheet. None when it is not known.
+        """
+        if self.extension == "xlsx":
+            workbook = load_workbook(self.file, read_only=True)
+            try:
+                max_row = workbook.worksheets[0].max_row
+            finally:
+                workbook.close()
+            return max(max_row - 1, 0) if max_row else None
+        if self.extension != "csv":
+            return None
+        lines = 0
+        last = b"\n"
+        with open(self.file, "rb") as file:
+            for block in iter(lambda: file.read(1024 * 1024), b""):
+                lines += block.count(b"\n")
+                last = block[-1:]
+        if last != b"\n":
+            lines += 1
+        # the header line
+        return max(lines - 1, 0)
+
+    def _iter_xlsx_chunks(self, chunksize: int) -> Iterator[pd.DataFrame]:
+        """
+        Read the first sheet of a xlsx file row by row
+        """
+        workbook = load_workbook(self.file, read_only=True, data_only=True)
+        try:
+            rows = workbook.worksheets[0].iter_rows(values_only=True)
+            header_row = next(rows, None)
+            if header_row is None:
+                return
+            headers = [
+                str(header) if header is not None else f"Unnamed: {index}" for index, header in enumerate(header_row)
+            ]
+            while True:
+                batch = list(islice(rows, chunksize))
+                if not batch:
+                    break
+                # read-only sheets can report ragged rows, align them to the header row
+                width = len(headers)
+                batch = [tuple(row[:width]) + (None,) * (width - len(row)) for row in batch]
+                yield pd.DataFrame(batch, columns=headers).infer_objects()
+        finally:
+            workbook.close()
 
     @staticmethod
-    def get_rows(df: pd.DataFrame) -> List[Dict[str, any]]:
+    def get_headers(df: pd.DataFrame) -> List[str]:
         """
-        Get the rows of the tabular data
+        Get the headers of the tabular data
         """
-        return df.to_dict(orient="records")
+        return df.columns.tolist()
 
     @staticmethod
     def df_from_rows_and_headers(rows: List[Dict[str, any]], headers: List[str]) -> pd.DataFrame:
@@ -40,75 +135,332 @@ class TabularDataService:
         return pd.DataFrame(rows, columns=headers)
 
     @staticmethod
-    def statistics_from_TabularDataFile(tabular_data_file: TabularDataFile) -> Dict[str, Dict]:
+    def filtered_statistics(
+        tabular_data_file: TabularDataFile,
+        headers: List[str],
+        filters: List[Dict],
+        filters_operator: str = "and",
+        header_resolver: HeaderResolver = None,
+    ) -> Dict[str, Dict]:
         """
-        Get statistics from a TabularDataFile
+        Get the statistics of all the rows matching the filters, not only of one page.
+        the result is cached until the rows of the file change so paging through a filtered view only fetches rows.
         """
-        tabular_data_file_headers = [header.header for header in tabular_data_file.headers]
-        tabular_data_file_rows = [row.row_data for row in tabular_data_file.rows]
-        df = TabularDataService.df_from_rows_and_headers(tabular_data_file_rows, tabular_data_file_headers)
-        return TabularDataService.compute_statistics(df)
+        key = {
+            **TabularDataService.view_key(tabular_data_file, filters, filters_operator),
+            "statistics": headers,
+        }
+
+        header_resolver = header_resolver or HeaderResolver(tabular_data_file.id)
+
+        def compute():
+            # the numeric headers of the catalog, a page of rows edited to text does not hide a numeric header
+            statistics = StatisticsAccumulator(dtypes=header_resolver.dtypes)
+            for frame in get_storage(tabular_data_file, header_resolver=header_resolver).iter_frames(
+                headers, filters=filters, filters_operator=filters_operator
+            ):
+                statistics.update(frame)
+            return statistics.result()
+
+        return view_cache.get_or_set(key, compute, tag=tabular_data_file.id)
 
     @staticmethod
-    def compute_statistics(df: pd.DataFrame) -> Dict[str, Dict]:
+    def approximate_statistics(
+        tabular_data_file: TabularDataFile,
+        headers: List[str],
+        filters: List[Dict] = None,
+        filters_operator: str = "and",
+        error: float = None,
+        header_resolver: HeaderResolver = None,
+    ) -> Dict[str, Dict]:
         """
-        Compute statistics for the tabular data
+        The approximate statistics of the file or of the rows matching the filters, with the distinct counts and the
+        frequent values of every header. one pass over the rows in bounded memory, cached per file version and error.
         """
-        numeric_df = df.select_dtypes(include=["number"])
+        error = error or Config.TABULAR_APPROXIMATE_ERROR
+        key = {
+            **TabularDataService.view_key(tabular_data_file, filters or [], filters_operator),
+            "approximate_statistics": headers,
+            "error": error,
+        }
+
+        def compute():
+            statistics = ApproximateStatistics(error)
+            for frame in get_storage(tabular_data_file, header_resolver=header_resolver).iter_frames(
+                headers, filters=filters, filters_operator=filters_operator
+            ):
+                statistics.update(frame)
+            return statistics.result()
 
-        # Compute statistics
-        statistics = {
-            "mean": numeric_df.mean().to_dict(),
-            "median": numeric_df.median().to_dict(),
-            "mode": numeric_df.mode().iloc[0].to_dict(),
-            "quartiles": numeric_df.quantile([0.25, 0.5, 0.75]).to_dict(),
-            "z_scores": TabularDataService.outliers_z_scores(numeric_df, numeric_df.columns.tolist()).to_dict(),
+        return view_cache.get_or_set(key, compute, tag=tabular_data_file.id)
+
+    @staticmethod
+    def view_key(tabular_data_file: TabularDataFile, filters: List[Dict], filters_operator: str) -> Dict[str, any]:
+        """
+        The cache key of a filtered view of the file, the version changes with every update of the rows
+        """
+        return {
+            "file": tabular_data_file.id,
+            "version": tabular_data_file.version,
+            # the order of the filters does not change the result
+            "filters": sorted(filters, key=lambda row_filter: repr(sorted(row_filter.items()))),
+            "operator": filters_operator,
         }
+
+    @staticmethod
+    def count_rows(
+        tabular_data_file: TabularDataFile,
+        filters: List[Dict],
+        filters_operator: str = "and",
+        approximate: bool = False,
+        header_resolver: HeaderResolver = None,
+    ) -> Tuple[int, bool]:
+        """
+        Count the rows matching the filters, returns the count and whether it is an estimate.
+        the exact counts are cached per file version, the estimates are read from the query planner when available.
+        """
+        storage = get_storage(tabular_data_file, header_resolver=header_resolver)
+        if approximate:
+            total, estimated = storage.count(filters, filters_operator, approximate=True)
+            if estimated:
+                return total, True
+        key = {**TabularDataService.view_key(tabular_data_file, filters, filters_operator), "count": True}
+        total = view_cache.get_or_set(
+            key, lambda: storage.count(filters, filters_operator)[0], tag=tabular_data_file.id
+        )
+        return total, False
+
+    @staticmethod
+    def parse_order_by(rows_order_by: str, header_names) -> Tuple[Optional[str], str]:
+        """
+        The header and the direction of a rows_order_by ('header' or '-header'), the header is None
+        (the rows are ordered by index) when it is not a header of the file
+        """
+        order_by = rows_order_by or "index"
+        direction = "asc"
+        if order_by.startswith("-"):
+            order_by = order_by[1:]
+            direction = "desc"
+        if order_by not in header_names:
+            order_by = None
+        return order_by, direction
+
+    @staticmethod
+    def encode_cursor(order_by: str, direction: str, position: Dict) -> str:
+        """
+        The opaque cursor of the next page, the ordering and the (key, index) of the last row of the page
+        """
+        payload = {"order_by": order_by, "direction": direction, "key": position["key"], "index": position["index"]}
+        # numeric keys are read from the database as Decimal, they are kept exact as strings
+        return base64.urlsafe_b64encode(json.dumps(payload, default=str).encode()).decode()
+
+    @staticmethod
+    def decode_cursor(cursor: str, order_by: str, direction: str, dtype: str = None) -> Dict:
+        """
+        Read the position of a cursor, it must have been returned for the same ordering
+        """
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+            position = {"key": payload["key"], "index": int(payload["index"])}
+            if order_by is not None and dtype == NUMERIC and isinstance(position["key"], str):
+                position["key"] = Decimal(position["key"])
+            same_order = payload["order_by"] == order_by and payload["direction"] == direction
+        except (TypeError, KeyError, ValueError, binascii.Error, InvalidOperation):
+            # JSONDecodeError and UnicodeDecodeError are ValueErrors too
+            raise ValueError("Invalid cursor.")
+        if not same_order:
+            raise ValueError("The cursor was returned for another rows_order_by.")
+        return position
+
+    @staticmethod
+    def build_statistics(df: pd.DataFrame) -> StatisticsAccumulator:
+        """
+        Build the statistics sketches of the DataFrame, the stored statistics are read from them
+        """
+        statistics = StatisticsAccumulator()
+        statistics.update(df)
         return statistics
 
     @staticmethod
-    def outliers_z_scores(df: pd.DataFrame, columns: List[str]) -> pd.DataFrame:
+    def read_upload(blob: MediaBlob) -> Tuple[pd.DataFrame, StatisticsAccumulator]:
         """
-        Compute the Z-scores for the outliers
+        Parse the uploaded file and build its statistics sketches, both are stored as artifacts of the content
+        so the next upload of the same file reuses them instead of parsing and summarizing it again.
         """
-        z_scores = {}
-        for column in columns:
-            z_scores[column] = TabularDataService.calculate_z_score(df, column)
-        return pd.DataFrame(z_scores)
+        frame_path = media_store.artifact_path(blob, "columns.feather")
+        statistics_path = media_store.artifact_path(blob, "statistics.json")
+        if os.path.exists(frame_path) and os.path.exists(statistics_path):
+            with open(statistics_path) as file:
+                statistics = StatisticsAccumulator.from_dict(json.load(file))
+            return pd.read_feather(frame_path), statistics
+
+        df = TabularDataService(blob.path).process_data()
+        statistics = TabularDataService.build_statistics(df)
+        # the arrow columns keep the dtypes of the parsed columns the header dtypes are inferred from, compressed.
+        # a frame arrow can not represent (eg. an object column of mixed types) is parsed again the next time
+        try:
+            media_store.write_artifact(blob, "columns.feather", lambda path: df.to_feather(path, compression="zstd"))
+        except (pa.ArrowException, ValueError):
+            pass
+        sketch = statistics.to_dict()
+
+        def write_statistics(path):
+            with open(path, "w") as file:
+                json.dump(sketch, file)
+
+        media_store.write_artifact(blob, "statistics.json", write_statistics)
+        return df, statistics
 
     @staticmethod
-    def calculate_z_score(df: pd.DataFrame, column: str) -> pd.DataFrame:
+    def load_statistics(tabular_data_file: TabularDataFile, headers: List[str]) -> StatisticsAccumulator:
         """
-        Calculate the Z-score for a column
+        Load the statistics sketches of a tabular data file,
+        files ingested before the sketches existed get them built once from their stored rows.
         """
-        mean = df[column].mean()
-        std = df[column].std()
-        z_scores = (df[column] - mean) / std
-        return z_scores
+        if tabular_data_file.statistics_sketch:
+            return StatisticsAccumulator.from_dict(tabular_data_file.statistics_sketch)
+        statistics = StatisticsAccumulator()
+        for frame in get_storage(tabular_data_file).iter_frames(headers):
+            statistics.update(frame)
+        return statistics
 
     @staticmethod
-    def detect_outliers(df: pd.DataFrame) -> Dict[Hashable, any]:
+    def update_statistics(
+        tabular_data_file: TabularDataFile,
+        statistics: StatisticsAccumulator,
+        headers: List[str],
+        removed_rows: List[Dict[str, any]],
+        added_rows: List[Dict[str, any]],
+    ):
         """
-        Detect outliers using the IQR method
+        Fold the replaced and the new rows into the statistics sketches and store the new statistics,
+        only the changed rows are read.
         """
+        if removed_rows:
+            statistics.remove(TabularDataService.df_from_rows_and_headers(removed_rows, headers))
+        if added_rows:
+            statistics.update(TabularDataService.df_from_rows_and_headers(added_rows, headers), coerce=True)
+        tabular_data_file.statistics = statistics.result()
+        tabular_data_file.statistics_sketch = statistics.to_dict()
+        tabular_data_file.row_count += len(added_rows) - len(removed_rows)
+        tabular_data_file.version += 1
 
+    @staticmethod
+    def update_catalog(
+        headers: List[TabularDataFileHeader], removed_rows: List[Dict[str, any]], added_rows: List[Dict[str, any]]
+    ):
         """
-        Detect outliers using the IQR method
+        Fold the replaced and the new rows into the column catalog of the headers
         """
-        outliers = {}
-        Q1 = df.quantile(0.25)
-        Q3 = df.quantile(0.75)
-        IQR = Q3 - Q1
+        names = [header.header for header in headers]
+        catalog = SchemaCatalog.from_headers(headers)
+        if removed_rows:
+            catalog.remove(TabularDataService.df_from_rows_and_headers(removed_rows, names))
+        if added_rows:
+            catalog.update(TabularDataService.df_from_rows_and_headers(added_rows, names))
+        catalog.apply(headers)
 
-        for column in df.columns:
-            if pd.api.types.is_numeric_dtype(df[column]):
-                lower_bound = Q1[column] - 1.5 * IQR[column]
-                upper_bound = Q3[column] + 1.5 * IQR[column]
+    @staticmethod
+    def outlier_summary(
+        tabular_data_file: TabularDataFile,
+        headers: List[str],
+        filters: List[Dict] = None,
+        filters_operator: str = "and",
+        header_resolver: HeaderResolver = None,
+        z_threshold: float = None,
+        top_k: int = None,
+    ) -> Dict[str, Dict]:
+        """
+        The outlier summary of the numeric headers of the file or of the rows matching the filters,
+        computed in one pass over the rows against the statistics of the view and cached per file version.
+        """
+        z_threshold = z_threshold or Config.TABULAR_OUTLIER_Z_THRESHOLD
+        top_k = top_k or Config.TABULAR_OUTLIER_TOP_K
+        key = {
+            **TabularDataService.view_key(tabular_data_file, filters or [], filters_operator),
+            "outliers": headers,
+            "z_threshold": z_threshold,
+            "top_k": top_k,
+        }
 
-                column_outliers = df[(df[column] < lower_bound) | (df[column] > upper_bound)][column].tolist()
-                outliers[column] = column_outliers
+        def compute():
+            statistics = TabularDataService.view_statistics(
+                tabular_data_file, headers, filters, filters_operator, header_resolver
+            )
+            engine = OutlierEngine.from_statistics(statistics, headers, z_threshold=z_threshold, top_k=top_k)
+            if engine.columns:
+                for frame in get_storage(tabular_data_file, header_resolver=header_resolver).iter_frames(
+                    engine.columns, filters=filters, filters_operator=filters_operator
+                ):
+                    engine.update(numeric_block(frame, engine.columns), frame.index.to_numpy())
+            return engine.result()
 
-        return outliers
+        return view_cache.get_or_set(key, compute, tag=tabular_data_file.id)
+
+    @staticmethod
+    def aggregate(
+        tabular_data_file: TabularDataFile,
+        group_by: List[str],
+        aggregates: List[Dict],
+        filters: List[Dict] = None,
+        filters_operator: str = "and",
+        limit: int = 1000,
+        header_resolver: HeaderResolver = None,
+    ) -> Dict[str, any]:
+        """
+        Group the rows of the file (or the rows matching the filters) by the group_by headers and aggregate every
+        group in the storage backend, cached per file version.
+        returns the column names and the rows of the groups as lists, and whether there were more than limit groups.
+        """
+        key = {
+            **TabularDataService.view_key(tabular_data_file, filters or [], filters_operator),
+            "aggregate": {"group_by": group_by, "aggregates": aggregates, "limit": limit},
+        }
+
+        def compute():
+            rows, truncated = get_storage(tabular_data_file, header_resolver=header_resolver).aggregate(
+                group_by, aggregates, filters, filters_operator, limit
+            )
+            return {
+                "columns": [*group_by, *[TabularDataService.aggregate_name(item) for item in aggregates]],
+                "rows": rows,
+                "truncated": truncated,
+            }
+
+        return view_cache.get_or_set(key, compute, tag=tabular_data_file.id)
+
+    @staticmethod
+    def aggregate_name(aggregate: Dict) -> str:
+        """
+        The column name of an aggregate, its alias or eg. mean(Salary), count(*), percentile(Salary, 0.9)
+        """
+        if aggregate.get("alias"):
+            return aggregate["alias"]
+        arguments = [aggregate.get("header") or "*"]
+        if aggregate["function"] == "percentile":
+            arguments.append(str(aggregate["percentile"]))
+        return f"{aggregate['function']}({', '.join(arguments)})"
+
+    @staticmethod
+    def view_statistics(
+        tabular_data_file: TabularDataFile,
+        headers: List[str],
+        filters: List[Dict] = None,
+        filters_operator: str = "and",
+        header_resolver: HeaderResolver = None,
+    ) -> Dict[str, Dict]:
+        """
+        The statistics of the headers of the file, of the rows matching the filters when there are filters
+        """
+        if filters:
+            return TabularDataService.filtered_statistics(
+                tabular_data_file, headers, filters, filters_operator, header_resolver=header_resolver
+            )
+        # the stored statistics are maintained on every update, only the headers are returned
+        return {
+            name: {header: value for header, value in values.items() if header in headers}
+            for name, values in (tabular_data_file.statistics or {}).items()
+        }
 
     @staticmethod
     def create_tabular_data_file_headers(
@@ -120,28 +472,42 @@ class TabularDataService:
         tabular_data_file_headers = []
         for index, header in enumerate(TabularDataService.get_headers(df)):
             tabular_data_file_header = TabularDataFileHeader(
-                tabular_data_file_id=tabular_data_file.id, header=header, index=index
+                tabular_data_file_id=tabular_data_file.id, header=header, index=index, dtype=infer_dtype(df[header])
             )
             tabular_data_file_headers.append(tabular_data_file_header)
+        catalog = SchemaCatalog.for_headers(tabular_data_file_headers)
+        catalog.update(df)
+        catalog.apply(tabular_data_file_headers)
+        tabular_data_file.column_count = len(tabular_data_file_headers)
         return tabular_data_file_headers
 
     @staticmethod
-    def create_tabular_data_file(name: str, path: str, statistics: Dict[str, Dict]) -> TabularDataFile:
+    def create_tabular_data_file(
+        name: str, path: str, statistics: Dict[str, Dict], storage_backend: str = None
+    ) -> TabularDataFile:
         """
         Create a new tabular data file
         """
-        tabular_data_file = TabularDataFile(name=name, path=path, statistics=statistics)
+        tabular_data_file = TabularDataFile(
+            name=name,
+            path=path,
+            statistics=statistics,
+            storage_backend=storage_backend or Config.TABULAR_STORAGE_BACKEND,
+            byte_size=os.path.getsize(path) if os.path.exists(path) else None,
+        )
         return tabular_data_file
 
     @staticmethod
-    def create_tabular_data_file_rows(tabular_data_file: TabularDataFile, df: pd.DataFrame) -> List[TabularDataFileRow]:
+    def bulk_load_tabular_data_file_rows(
+        tabular_data_file: TabularDataFile, df: pd.DataFrame, batch_size: int = None
+    ) -> Dict[str, any]:
         """
-        Create tabular data file rows
+        Stream the rows of the DataFrame into the storage backend of the file without creating ORM objects,
+        returns the ingestion report (rows, seconds, rows_per_second).
         """
-        tabular_data_file_rows = []
-        for row_index, row in enumerate(TabularDataService.get_rows(df)):
-            tabular_data_file_row = TabularDataFileRow(
-                tabular_data_file_id=tabular_data_file.id, row_data=row, index=row_index
-            )
-            tabular_data_file_rows.append(tabular_data_file_row)
-        return tabular_data_file_rows
+        storage = get_storage(tabular_data_file)
+        writer = storage.writer(batch_size=batch_size)
+        writer.load(df)
+        storage.build_indexes()
+        tabular_data_file.row_count = writer.rows_loaded
+        return writer.report()
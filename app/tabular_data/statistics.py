@@ -0,0 +1,645 @@
+import math
+from typing import Dict, List
+
+import numpy as np
+import pandas as pd
+
+from app.tabular_data.indexes import NUMERIC
+from config import Config
+
+"""
+    This is the statistics.py file for the tabular_data blueprint.
+    it contains the mergeable statistics sketches of the tabular data files:
+    - KLLSketch: a KLL quantile sketch, exact until it has to compact.
+    - FrequentItems: a Misra-Gries heavy hitters counter used for the mode.
+    - ColumnAccumulator: the Welford moments and the sketches of one numeric column.
+    - StatisticsAccumulator: the sketches of every numeric column of a file.
+    - HyperLogLog, ReservoirSample and ApproximateStatistics: the opt-in approximate statistics of a view,
+        quantiles from a uniform sample, distinct counts and frequent values from streaming sketches,
+        every value reported with its error bound.
+
+    the accumulators are folded chunk by chunk at ingestion, serialized to TabularDataFile.statistics_sketch,
+    and updated incrementally when rows are added, edited or removed.
+"""
+
+QUARTILES = [0.25, 0.5, 0.75]
+
+
+class KLLSketch:
+    """
+    KLL quantile sketch (Karnin, Lang, Liberty) over float values.
+
+        the values are kept in compactors, an item of level h stands for 2 ** h values. a compactor over its
+        capacity is sorted and every other item is promoted to the next level. as long as nothing has been
+        compacted the sketch holds every value and the quantiles are exact.
+    """
+
+    def __init__(self, k: int, compactors: List[List[float]] = None, compactions: int = 0):
+        self.k = k
+        self.compactors = [np.asarray(level, dtype="float64") for level in compactors or [[]]]
+        self.compactions = compactions
+
+    @property
+    def exact(self) -> bool:
+        return len(self.compactors) == 1
+
+    @property
+    def count(self) -> int:
+        return int(sum(level.size * 2**height for height, level in enumerate(self.compactors)))
+
+    def capacity(self, height: int) -> int:
+        depth = len(self.compactors) - height - 1
+        return max(int(math.ceil(self.k * (2 / 3) ** depth)), 8)
+
+    def update(self, values: np.ndarray):
+        self.compactors[0] = np.concatenate([self.compactors[0], values])
+        self.compress()
+
+    def merge(self, other: "KLLSketch"):
+        while len(self.compactors) < len(other.compactors):
+            self.compactors.append(np.empty(0, dtype="float64"))
+        for height, level in enumerate(other.compactors):
+            self.compactors[height] = np.concatenate([self.compactors[height], level])
+        self.compress()
+
+    def compress(self):
+        height = 0
+        while height < len(self.compactors):
+            items = self.compactors[height]
+            if items.size > self.capacity(height):
+                if height + 1 == len(self.compactors):
+                    self.compactors.append(np.empty(0, dtype="float64"))
+                items = np.sort(items)
+                kept, items = (items[-1:], items[:-1]) if items.size % 2 else (items[:0], items)
+                # alternate the kept half so the rank error does not drift in one direction
+                offset = self.compactions % 2
+                self.compactions += 1
+                self.compactors[height + 1] = np.concatenate([self.compactors[height + 1], items[offset::2]])
+                self.compactors[height] = kept
+            height += 1
+
+    def values(self) -> np.ndarray:
+        return np.concatenate(self.compactors)
+
+    def weighted_items(self):
+        """
+        The sorted items and their cumulative weights
+        """
+        values = self.values()
+        weights = np.concatenate([np.full(level.size, 2**height) for height, level in enumerate(self.compactors)])
+        order = np.argsort(values, kind="stable")
+        return values[order], np.cumsum(weights[order])
+
+    def to_dict(self) -> Dict[str, any]:
+        return {
+            "k": self.k,
+            "compactors": [level.tolist() for level in self.compactors],
+            "compactions": self.compactions,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, any]) -> "KLLSketch":
+        return cls(data["k"], data["compactors"], data["compactions"])
+
+
+class FrequentItems:
+    """
+    Misra-Gries heavy hitters, every value seen more than count / (capacity + 1) times is kept
+    and its count is underestimated by at most that much. exact while there are no more distinct values
+    than the capacity.
+    """
+
+    def __init__(self, capacity: int, counts: Dict[float, int] = None):
+        self.capacity = capacity
+        self.counts = dict(counts or {})
+
+    def update(self, values: np.ndarray):
+        self.update_counts((float(value), int(count)) for value, count in zip(*np.unique(values, return_counts=True)))
+
+    def update_counts(self, counts):
+        """
+        Fold (value, count) pairs, the values can be of any hashable type
+        """
+        for value, count in counts:
+            self.counts[value] = self.counts.get(value, 0) + count
+        if len(self.counts) > self.capacity:
+            # batched decrement by the (capacity + 1)th largest count keeps the summary mergeable
+            threshold = sorted(self.counts.values(), reverse=True)[self.capacity]
+            self.counts = {value: count - threshold for value, count in self.counts.items() if count > threshold}
+
+    def remove(self, values: np.ndarray):
+        """
+        Subtract the counts of removed values, exact only while nothing was decremented (no more distinct values
+        than the capacity), otherwise the kept counts are underestimates and the mode is an estimate.
+        """
+        for value, count in zip(*np.unique(values, return_counts=True)):
+            remaining = self.counts.get(float(value), 0) - int(count)
+            if remaining > 0:
+                self.counts[float(value)] = remaining
+            else:
+                self.counts.pop(float(value), None)
+
+    def merge(self, other: "FrequentItems"):
+        for value, count in other.counts.items():
+            self.counts[value] = self.counts.get(value, 0) + count
+        self.update(np.empty(0))
+
+    def mode(self, default=None):
+        """
+        The smallest of the most frequent values, like pandas mode().iloc[0]. the summary is empty when no value is
+        frequent enough to be counted (eg. a column of distinct values), the default is returned then.
+        """
+        if not self.counts:
+            return default
+        return min(self.counts.items(), key=lambda item: (-item[1], item[0]))[0]
+
+    def to_list(self) -> List[List[float]]:
+        return [[value, count] for value, count in self.counts.items()]
+
+
+class ColumnAccumulator:
+    """
+    Running statistics of one numeric column.
+
+        count / mean / m2 are the Welford moments merged chunk by chunk (Chan et al. parallel update) and
+        un-merged when values are removed, they stay exact. the removed values are also kept in their own KLL
+        sketch, the quantiles are then read from the difference of the two rank functions.
+        once a sketch has compacted the quantiles, the mode and the min / max recomputed after a removal are
+        estimates, the column is then reported as approximate.
+    """
+
+    def __init__(self, sketch_size: int = None, frequent_items: int = None):
+        self.sketch = KLLSketch(sketch_size or Config.TABULAR_STATISTICS_SKETCH_SIZE)
+        self.frequent = FrequentItems(frequent_items or Config.TABULAR_STATISTICS_FREQUENT_ITEMS)
+        self.clear()
+
+    def clear(self):
+        """
+        Forget every value, the sketches keep their size
+        """
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+        self.sketch = KLLSketch(self.sketch.k)
+        self.removed = KLLSketch(self.sketch.k)
+        self.frequent = FrequentItems(self.frequent.capacity)
+
+    @staticmethod
+    def moments(values: np.ndarray):
+        mean = float(values.mean())
+        return values.size, mean, float(((values - mean) ** 2).sum())
+
+    def update(self, values: np.ndarray):
+        values = values[np.isfinite(values)]
+        if not values.size:
+            return
+
+        # merge the moments of the chunk into the running moments
+        count, mean, m2 = self.moments(values)
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta**2 * self.count * count / total
+        self.count = total
+
+        self.min = float(values.min()) if self.min is None else min(self.min, float(values.min()))
+        self.max = float(values.max()) if self.max is None else max(self.max, float(values.max()))
+        self.sketch.update(values)
+        self.frequent.update(values)
+
+    def remove(self, values: np.ndarray):
+        values = values[np.isfinite(values)]
+        if not values.size:
+            return
+        if values.size >= self.count:
+            # no value is left, the column starts over empty and exact
+            self.clear()
+            return
+
+        # inverse of the parallel update
+        count, mean, m2 = self.moments(values)
+        total = self.count - count
+        remaining_mean = (self.count * self.mean - count * mean) / total
+        delta = mean - remaining_mean
+        self.m2 = max(self.m2 - m2 - delta**2 * total * count / self.count, 0.0)
+        self.mean = remaining_mean
+        self.count = total
+
+        self.removed.update(values)
+        self.frequent.remove(values)
+        if self.min in values or self.max in values:
+            self.min, self.max = self.quantiles([0.0, 1.0])
+
+    @property
+    def std(self):
+        return float(np.sqrt(self.m2 / (self.count - 1))) if self.count > 1 else None
+
+    @property
+    def exact(self) -> bool:
+        """
+        Whether the sketches still hold every value, the quantiles and the mode are exact then
+        """
+        return self.sketch.exact and self.removed.exact
+
+    def value_counts(self):
+        """
+        The distinct values and their counts, while every value is still in the sketches
+        """
+        values, counts = np.unique(self.sketch.values(), return_counts=True)
+        removed, removed_counts = np.unique(self.removed.values(), return_counts=True)
+        positions = np.searchsorted(values, removed)
+        known = positions < values.size
+        known[known] = values[positions[known]] == removed[known]
+        counts[positions[known]] -= removed_counts[known]
+        return values, np.maximum(counts, 0)
+
+    def quantiles(self, q: List[float]) -> List[float]:
+        if self.exact:
+            # every value is still in the sketches, interpolate like pandas does
+            values, counts = self.value_counts()
+            return [float(value) for value in np.quantile(np.repeat(values, counts), q)]
+
+        values, ranks = self.sketch.weighted_items()
+        removed, removed_ranks = self.removed.weighted_items()
+        if removed.size:
+            positions = np.searchsorted(removed, values, side="right")
+            ranks = ranks - np.concatenate([[0], removed_ranks])[positions]
+            ranks = np.maximum.accumulate(ranks)
+        positions = np.searchsorted(ranks, [max(quantile * self.count, 1) for quantile in q], side="left")
+        return [float(values[min(position, values.size - 1)]) for position in positions]
+
+    def mode(self):
+        if not self.count:
+            return None
+        if self.exact:
+            values, counts = self.value_counts()
+            return float(values[np.argmax(counts)])
+        # with no frequent value left every value is about as frequent, the smallest one like pandas
+        return self.frequent.mode(default=self.min)
+
+    def to_dict(self) -> Dict[str, any]:
+        return {
+            "count": self.count,
+            "mean": self.mean,
+            "m2": self.m2,
+            "min": self.min,
+            "max": self.max,
+            "sketch": self.sketch.to_dict(),
+            "removed": self.removed.to_dict(),
+            "frequent": self.frequent.to_list(),
+            "frequent_capacity": self.frequent.capacity,
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, any]) -> "ColumnAccumulator":
+        accumulator = cls(data["sketch"]["k"], data["frequent_capacity"])
+        accumulator.count = data["count"]
+        accumulator.mean = data["mean"]
+        accumulator.m2 = data["m2"]
+        accumulator.min = data["min"]
+        accumulator.max = data["max"]
+        accumulator.sketch = KLLSketch.from_dict(data["sketch"])
+        accumulator.removed = KLLSketch.from_dict(data["removed"])
+        accumulator.frequent = FrequentItems(
+            data["frequent_capacity"], {value: count for value, count in data["frequent"]}
+        )
+        return accumulator
+
+
+def numeric_values(series: pd.Series) -> np.ndarray:
+    """
+    The float values of a column of a numeric header, NaN for the cells that are not numbers
+    """
+    if not pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+        series = pd.to_numeric(series, errors="coerce")
+    return series.to_numpy(dtype="float64", na_value=np.nan)
+
+
+class StatisticsAccumulator:
+    """
+    Fold DataFrame chunks into the statistics sketches of the numeric columns.
+
+        a column counts as numeric only while every chunk of it has a numeric dtype,
+        which is what select_dtypes would say about the whole file.
+        with the dtypes of the header catalog the numeric columns are the numeric headers instead, their cells that
+        are not numbers are skipped.
+    """
+
+    def __init__(self, sketch_size: int = None, frequent_items: int = None, dtypes: Dict[str, str] = None):
+        self.sketch_size = sketch_size or Config.TABULAR_STATISTICS_SKETCH_SIZE
+        self.frequent_items = frequent_items or Config.TABULAR_STATISTICS_FREQUENT_ITEMS
+        self.columns: Dict[str, ColumnAccumulator] = {}
+        self.non_numeric = set()
+        self.dtypes = dtypes
+
+    def numeric_values(self, df: pd.DataFrame, coerce: bool = False) -> Dict[str, np.ndarray]:
+        """
+        The float values of the numeric columns of the chunk.
+            with coerce the columns already known to be numeric are parsed with to_numeric, the values that are not
+            numbers are skipped instead of turning the column non numeric (used for the rows edited by the users).
+        """
+        values = {}
+        for column in df.columns:
+            if column in self.non_numeric:
+                continue
+            series = df[column]
+            if self.dtypes is not None:
+                if self.dtypes.get(column) == NUMERIC:
+                    values[column] = numeric_values(series)
+                continue
+            if coerce and column in self.columns:
+                series = pd.to_numeric(series, errors="coerce")
+            if not pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series):
+                # an all-empty chunk is read as float NaN, a text chunk makes the whole column non numeric
+                self.non_numeric.add(column)
+                self.columns.pop(column, None)
+                continue
+            values[column] = series.to_numpy(dtype="float64", na_value=np.nan)
+        return values
+
+    def update(self, df: pd.DataFrame, coerce: bool = False):
+        for column, values in self.numeric_values(df, coerce).items():
+            accumulator = self.columns.get(column)
+            if accumulator is None:
+                accumulator = self.columns[column] = ColumnAccumulator(self.sketch_size, self.frequent_items)
+            accumulator.update(values)
+
+    def remove(self, df: pd.DataFrame):
+        for column in df.columns:
+            if column in self.columns:
+                values = pd.to_numeric(df[column], errors="coerce").to_numpy(dtype="float64", na_value=np.nan)
+                self.columns[column].remove(values)
+
+    def result(self) -> Dict[str, Dict]:
+        """
+        The statistics of the numeric columns (count, mean, std, min, max, median, mode, quartiles),
+        approximate tells the columns whose median, quartiles and mode (and min / max after a removal) are
+        estimates of the sketches, count, mean and std are always exact.
+        """
+        columns = {column: accumulator for column, accumulator in self.columns.items() if accumulator.count}
+        quartiles = {column: accumulator.quantiles(QUARTILES) for column, accumulator in columns.items()}
+        return {
+            "count": {column: accumulator.count for column, accumulator in columns.items()},
+            "mean": {column: accumulator.mean for column, accumulator in columns.items()},
+            "std": {column: accumulator.std for column, accumulator in columns.items()},
+            "min": {column: accumulator.min for column, accumulator in columns.items()},
+            "max": {column: accumulator.max for column, accumulator in columns.items()},
+            "median": {column: values[1] for column, values in quartiles.items()},
+            "mode": {column: accumulator.mode() for column, accumulator in columns.items()},
+            "quartiles": {column: dict(zip(QUARTILES, values)) for column, values in quartiles.items()},
+            "approximate": {column: not accumulator.exact for column, accumulator in columns.items()},
+        }
+
+    def to_dict(self) -> Dict[str, any]:
+        return {
+            "sketch_size": self.sketch_size,
+            "frequent_items": self.frequent_items,
+            "non_numeric": sorted(self.non_numeric),
+            "columns": {column: accumulator.to_dict() for column, accumulator in self.columns.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, any]) -> "StatisticsAccumulator":
+        statistics = cls(data["sketch_size"], data["frequent_items"])
+        statistics.non_numeric = set(data["non_numeric"])
+        statistics.columns = {
+            column: ColumnAccumulator.from_dict(accumulator) for column, accumulator in data["columns"].items()
+        }
+        return statistics
+
+
+class HyperLogLog:
+    """
+    HyperLogLog distinct counter (Flajolet et al.) with 2 ** precision registers,
+    its relative standard error is 1.04 / sqrt(2 ** precision).
+    """
+
+    def __init__(self, precision: int):
+        self.precision = precision
+        self.registers = np.zeros(2**precision, dtype="uint8")
+
+    @classmethod
+    def for_error(cls, error: float) -> "HyperLogLog":
+        """
+        The smallest counter whose relative standard error is at most error
+        """
+        precision = math.ceil(math.log2((1.04 / error) ** 2))
+        return cls(min(max(precision, 4), 16))
+
+    @property
+    def error(self) -> float:
+        return 1.04 / math.sqrt(self.registers.size)
+
+    @staticmethod
+    def hash(series: pd.Series) -> np.ndarray:
+        if pd.api.types.is_numeric_dtype(series) and not pd.api.types.is_bool_dtype(series):
+            # 1 and 1.0 are the same value whatever the dtype of the chunk
+            series = series.astype("float64")
+        return pd.util.hash_pandas_object(series, index=False).to_numpy()
+
+    def update(self, series: pd.Series):
+        hashes = self.hash(series.dropna())
+        if not hashes.size:
+            return
+        # the first bits select the register, the rank is the position of the first set bit of the next 32 bits
+        registers = (hashes >> np.uint64(64 - self.precision)).astype("int64")
+        bits = ((hashes >> np.uint64(32 - self.precision)) & np.uint64(0xFFFFFFFF)).astype("float64")
+        _, exponents = np.frexp(bits)
+        ranks = np.where(bits > 0, 33 - exponents, 33).astype("uint8")
+        np.maximum.at(self.registers, registers, ranks)
+
+    def estimate(self) -> float:
+        size = self.registers.size
+        alpha = 0.7213 / (1 + 1.079 / size)
+        estimate = alpha * size**2 / np.sum(np.exp2(-self.registers.astype("float64")))
+        zeros = int(np.count_nonzero(self.registers == 0))
+        if estimate <= 2.5 * size and zeros:
+            # linear counting is more accurate for the small cardinalities
+            estimate = size * math.log(size / zeros)
+        return float(estimate)
+
+
+class ReservoirSample:
+    """
+    Uniform sample of at most size values of a stream.
+
+        every value gets a random key and the values with the smallest keys are kept (bottom-k sampling),
+        which is a reservoir sample that can be folded a whole chunk at a time.
+    """
+
+    def __init__(self, size: int, seed: int = None):
+        self.size = size
+        self.values = np.empty(0, dtype="float64")
+        self.keys = np.empty(0, dtype="float64")
+        self.seen = 0
+        self.random = np.random.default_rng(seed)
+
+    def update(self, values: np.ndarray):
+        self.seen += values.size
+        self.values = np.concatenate([self.values, values])
+        self.keys = np.concatenate([self.keys, self.random.random(values.size)])
+        if self.values.size > self.size:
+            kept = np.argpartition(self.keys, self.size - 1)[: self.size]
+            self.values = self.values[kept]
+            self.keys = self.keys[kept]
+
+    @property
+    def exact(self) -> bool:
+        return self.seen <= self.size
+
+
+def sample_size(error: float, confidence: float) -> int:
+    """
+    The sample size whose empirical quantiles are within error in rank of the true ones with the confidence
+    (Dvoretzky-Kiefer-Wolfowitz inequality)
+    """
+    return math.ceil(math.log(2 / (1 - confidence)) / (2 * error**2))
+
+
+def min_value(values: List[any]):
+    """
+    The smallest of the values, by their text when they are not comparable (an object column of mixed types)
+    """
+    try:
+        return min(values)
+    except TypeError:
+        return min(values, key=str)
+
+
+class ApproximateColumn:
+    """
+    The approximate statistics of one column, the moments, min and max are exact
+    """
+
+    def __init__(self, error: float, confidence: float, top_k: int):
+        self.count = 0
+        self.mean = 0.0
+        self.m2 = 0.0
+        self.min = None
+        self.max = None
+        self.numeric = True
+        self.confidence = confidence
+        self.sample = ReservoirSample(sample_size(error, confidence))
+        self.distinct = HyperLogLog.for_error(error)
+        # a value more frequent than error * count is always kept
+        self.frequent = FrequentItems(max(math.ceil(1 / error), top_k))
+
+    def update(self, series: pd.Series):
+        series = series.dropna()
+        self.distinct.update(series)
+        if self.numeric and (not pd.api.types.is_numeric_dtype(series) or pd.api.types.is_bool_dtype(series)):
+            self.numeric = False
+        if self.numeric:
+            series = series.astype("float64")
+        counts = series.value_counts(sort=False)
+        self.frequent.update_counts(zip(counts.index.tolist(), counts.tolist()))
+        if not self.numeric:
+            self.count += len(series)
+            if len(counts):
+                # the mode of a column with no frequent value
+                self.min = min_value(counts.index.tolist() + ([] if self.min is None else [self.min]))
+            return
+
+        values = series.to_numpy()
+        values = values[np.isfinite(values)]
+        if not values.size:
+            return
+        count, mean, m2 = ColumnAccumulator.moments(values)
+        total = self.count + count
+        delta = mean - self.mean
+        self.mean += delta * count / total
+        self.m2 += m2 + delta**2 * self.count * count / total
+        self.count = total
+        self.min = float(values.min()) if self.min is None else min(self.min, float(values.min()))
+        self.max = float(values.max()) if self.max is None else max(self.max, float(values.max()))
+        self.sample.update(values)
+
+    @property
+    def rank_error(self) -> float:
+        if self.sample.exact:
+            return 0.0
+        return math.sqrt(math.log(2 / (1 - self.confidence)) / (2 * self.sample.size))
+
+    @property
+    def count_error(self) -> int:
+        """
+        The Misra-Gries bound, every reported count is at most this much lower than the true count
+        """
+        return int((self.count - sum(self.frequent.counts.values())) // (self.frequent.capacity + 1))
+
+
+class ApproximateStatistics:
+    """
+    Fold DataFrame chunks into the approximate statistics of every column.
+
+        the memory used only depends on the error: the quantiles are read from a uniform sample of
+        sample_size(error, confidence) values, the distinct counts from a HyperLogLog counter of relative
+        standard error at most error and the frequent values from a Misra-Gries summary of 1 / error counters.
+    """
+
+    def __init__(self, error: float = None, confidence: float = None, top_k: int = None):
+        self.error = error or Config.TABULAR_APPROXIMATE_ERROR
+        self.confidence = confidence or Config.TABULAR_APPROXIMATE_CONFIDENCE
+        self.top_k = top_k or Config.TABULAR_APPROXIMATE_TOP_K
+        self.columns: Dict[str, ApproximateColumn] = {}
+
+    def update(self, df: pd.DataFrame):
+        for column in df.columns:
+            accumulator = self.columns.get(column)
+            if accumulator is None:
+                accumulator = self.columns[column] = ApproximateColumn(self.error, self.confidence, self.top_k)
+            accumulator.update(df[column])
+
+    def result(self) -> Dict[str, Dict]:
+        """
+        The statistics of the columns, the approximate values come with their error bound:
+        rank_error for the quantiles, relative_error for the distinct counts and count_error for the frequent values
+        """
+        numeric = {column: accumulator for column, accumulator in self.columns.items() if accumulator.numeric}
+        numeric = {column: accumulator for column, accumulator in numeric.items() if accumulator.count}
+        quartiles = {
+            column: [float(value) for value in np.quantile(accumulator.sample.values, QUARTILES)]
+            for column, accumulator in numeric.items()
+        }
+
+        def top(accumulator):
+            items = sorted(accumulator.frequent.counts.items(), key=lambda item: (-item[1], str(item[0])))
+            error = accumulator.count_error
+            return [{"value": value, "count": count, "count_error": error} for value, count in items[: self.top_k]]
+
+        def mode(accumulator, values):
+            if values or accumulator.min is None:
+                return values[0] if values else None
+            # no value is frequent enough to be counted, the smallest one (its count is within the error)
+            return {"value": accumulator.min, "count": 0, "count_error": accumulator.count_error}
+
+        top_values = {column: top(accumulator) for column, accumulator in self.columns.items()}
+        return {
+            "count": {column: accumulator.count for column, accumulator in numeric.items()},
+            "mean": {column: accumulator.mean for column, accumulator in numeric.items()},
+            "std": {
+                column: float(np.sqrt(accumulator.m2 / (accumulator.count - 1))) if accumulator.count > 1 else None
+                for column, accumulator in numeric.items()
+            },
+            "min": {column: accumulator.min for column, accumulator in numeric.items()},
+            "max": {column: accumulator.max for column, accumulator in numeric.items()},
+            "median": {
+                column: {"value": values[1], "rank_error": numeric[column].rank_error}
+                for column, values in quartiles.items()
+            },
+            "mode": {column: mode(self.columns[column], values) for column, values in top_values.items()},
+            "quartiles": {
+                column: {
+                    quantile: {"value": value, "rank_error": numeric[column].rank_error}
+                    for quantile, value in zip(QUARTILES, values)
+                }
+                for column, values in quartiles.items()
+            },
+            "distinct": {
+                column: {"value": round(accumulator.distinct.estimate()), "relative_error": accumulator.distinct.error}
+                for column, accumulator in self.columns.items()
+            },
+            "top_k": top_values,
+        }
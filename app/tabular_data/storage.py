@@ -0,0 +1,1113 @@
+import json
+import math
+import os
+import re
+import shutil
+import time
+import uuid
+from decimal import Decimal
+from typing import Dict, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.dataset as ds
+import pyarrow.parquet as pq
+from sqlalchemy import (
+    JSON,
+    Integer,
+    Text,
+    and_,
+    bindparam,
+    cast,
+    column,
+    delete,
+    func,
+    insert,
+    literal,
+    or_,
+    select,
+    true,
+    tuple_,
+    update,
+    values,
+)
+
+from app.db import db, on_commit
+from app.tabular_data.headers import HeaderResolver
+from app.tabular_data.indexes import (
+    BOOLEAN,
+    NUMERIC,
+    RowIndexManager,
+    compile_row_filter,
+    is_postgresql,
+    json_type,
+    numeric_value,
+    text_value,
+    typed_value,
+)
+from app.tabular_data.ingestion import BulkRowLoader
+from app.tabular_data.models import TabularDataFile, TabularDataFileRow
+from config import Config
+
+"""
+    This is the storage.py file for the tabular_data blueprint.
+    it contains the storage backends of the tabular data files rows:
+    - RowTableStorage: the legacy backend, one tabular_data_file_rows record with a JSON row_data per row.
+    - ParquetStorage: column typed parquet files under the media folder, queried with pyarrow.dataset so the
+        filters and the header projection are pushed down to the row groups statistics.
+
+    every backend returns the rows as dicts with the TabularDataFileRowSchema fields.
+"""
+
+
+AGGREGATE_FUNCTIONS = ("count", "sum", "mean", "min", "max", "percentile")
+# the name of the part files of the parquet datasets, see ParquetChunkWriter
+PART_NAME = re.compile(r"part-\d{5,}\.parquet")
+# the aggregate functions that need a numeric header
+NUMERIC_AGGREGATE_FUNCTIONS = ("sum", "mean", "percentile")
+
+
+def pagination_dict(page: int, per_page: int, total: int) -> Dict[str, int]:
+    """
+    The pagination in the PaginationSchema layout
+    """
+    pages = math.ceil(total / per_page) if total else 0
+    return {
+        "page": page,
+        "per_page": per_page,
+        "total": total,
+        "pages": pages,
+        "prev_num": page - 1 if page > 1 else None,
+        "next_num": page + 1 if page < pages else None,
+    }
+
+
+class TabularStorage:
+    """
+    Base class of the tabular data file storage backends.
+
+        filters are a list of dicts with the header name, the operator and the value eg.
+        [{"header": "Salary", "operator": "gt", "value": 100}]
+    """
+
+    name = None
+    # whether the rows are written inside the database transaction
+    transactional = True
+
+    def __init__(self, tabular_data_file: TabularDataFile, header_resolver: HeaderResolver = None):
+        self.tabular_data_file = tabular_data_file
+        # shared with the request so the headers are only read once
+        self.header_resolver = header_resolver or HeaderResolver(tabular_data_file.id)
+
+    def writer(self, batch_size: int = None):
+        """
+        Return a writer with load(df, start_index) and report() used to ingest the rows
+        """
+        raise NotImplementedError
+
+    def query(
+        self,
+        headers: List[str],
+        filters: List[Dict],
+        filters_operator: str = "and",
+        order_by: str = None,
+        direction: str = "asc",
+        page: int = 1,
+        page_size: int = 10,
+        after: Dict = None,
+    ) -> Tuple[List[Dict], Optional[Dict]]:
+        """
+        Return one page of the filtered and ordered rows.
+
+            the rows are ordered by the header (NULLs last when ascending, first when descending) then by the index.
+            with after (the {"key", "index"} of the last row of the previous page) the page starts right after that
+            row instead of at the page offset, so every page costs the same as the first one.
+            returns the rows and the {"key", "index"} of the last row, None when there is no row after the page.
+        """
+        raise NotImplementedError
+
+    def count(self, filters: List[Dict], filters_operator: str = "and", approximate: bool = False) -> Tuple[int, bool]:
+        """
+        Count the rows matching the filters, returns the count and whether it is an estimate
+        """
+        raise NotImplementedError
+
+    def iter_frames(
+        self,
+        headers: List[str] = None,
+        chunksize: int = None,
+        filters: List[Dict] = None,
+        filters_operator: str = "and",
+        order_by: str = None,
+        direction: str = "asc",
+    ) -> Iterator[pd.DataFrame]:
+        """
+        Yield all the rows (or the rows matching the filters) as DataFrames of at most chunksize rows,
+        ordered like query (by index by default). the DataFrames are indexed by the row index.
+        """
+        raise NotImplementedError
+
+    def aggregate(
+        self,
+        group_by: List[str],
+        aggregates: List[Dict],
+        filters: List[Dict] = None,
+        filters_operator: str = "and",
+        limit: int = 1000,
+    ) -> Tuple[List[List], bool]:
+        """
+        Group the rows (or the rows matching the filters) by the group_by headers and aggregate every group.
+
+            aggregates are dicts with the function, the header (None to count the rows) and the percentile
+            (0 to 1) of the percentile function eg. [{"function": "mean", "header": "Salary"}].
+            returns one row per group, the group values then the aggregates, ordered by the group values
+            (NULLs last), and whether there were more than limit groups.
+            the fallback reads the projected columns of the rows into memory and aggregates them with pandas.
+        """
+        headers = list(dict.fromkeys([*group_by, *[item["header"] for item in aggregates if item.get("header")]]))
+        df = self.load_frame(headers, filters, filters_operator)
+        return aggregate_frame(df, group_by, aggregates, self.header_resolver.dtypes, limit)
+
+    def load_frame(self, headers: List[str] = None, filters: List[Dict] = None, filters_operator: str = "and"):
+        """
+        All the rows (or the rows matching the filters) of the headers (all of them by default) as one DataFrame
+        indexed by the row index
+        """
+        frames = list(self.iter_frames(headers, filters=filters, filters_operator=filters_operator))
+        if frames:
+            return pd.concat(frames) if len(frames) > 1 else frames[0]
+        return pd.DataFrame(columns=headers or self.header_resolver.names, index=pd.Index([], name="index"))
+
+    def upsert_rows(self, rows: List[Dict]) -> Tuple[List[Dict], List[Dict]]:
+        """
+        Update the rows with a known id and append the others, the row_data of an updated row replaces its row data,
+        returns the row data replaced and the row data written so the statistics can be updated.
+        """
+        raise NotImplementedError
+
+    def build_indexes(self):
+        """
+        Create the indexes used by the queries once the rows are written, nothing by default
+        """
+
+    def clear(self):
+        """
+        Remove all the stored rows
+        """
+        raise NotImplementedError
+
+    def row_from_values(self, index: int, row_data: Dict) -> Dict:
+        return {
+            "id": index,
+            "tabular_data_file_id": self.tabular_data_file.id,
+            "row_data": row_data,
+            "index": index,
+            "created_at": self.tabular_data_file.created_at,
+            "updated_at": self.tabular_data_file.updated_at,
+        }
+
+
+class RowTableStorage(TabularStorage):
+    """
+    The legacy storage, every row is a TabularDataFileRow with the cells in the row_data JSON column.
+    """
+
+    name = "rows"
+
+    @property
+    def dtypes(self) -> Dict[str, str]:
+        """
+        The dtype of every header, the filters and the ordering compile to the typed expression of the dtype
+        """
+        return self.header_resolver.dtypes
+
+    def filter_clause(self, filters: List[Dict], filters_operator: str = "and"):
+        operator = and_ if filters_operator == "and" else or_
+        return operator(
+            *[compile_row_filter(row_filter, self.dtypes.get(row_filter["header"])) for row_filter in filters]
+        )
+
+    def writer(self, batch_size: int = None):
+        return BulkRowLoader(self.tabular_data_file.id, batch_size=batch_size)
+
+    def filtered(self, statement, filters: List[Dict], filters_operator: str = "and"):
+        statement = statement.where(TabularDataFileRow.tabular_data_file_id == self.tabular_data_file.id)
+        if filters:
+            statement = statement.where(self.filter_clause(filters, filters_operator))
+        return statement
+
+    def query(
+        self,
+        headers,
+        filters,
+        filters_operator="and",
+        order_by=None,
+        direction="asc",
+        page=1,
+        page_size=10,
+        after=None,
+    ):
+        # the typed expression of the header then the row index, the key of the header index
+        key = typed_value(order_by, self.dtypes.get(order_by)) if order_by is not None else None
+        index = TabularDataFileRow.index
+        # one more row tells if there is a next page
+        statement = self.filtered(
+            select(TabularDataFileRow, key if key is not None else index), filters, filters_operator
+        )
+
+        if key is None:
+            if after is not None:
+                statement = statement.where(index > after["index"] if direction == "asc" else index < after["index"])
+            else:
+                statement = statement.offset((page - 1) * page_size)
+            results = db.session.execute(statement.order_by(getattr(index, direction)()).limit(page_size + 1)).all()
+        elif after is None:
+            statement = statement.order_by(self.key_ordering(key, direction), getattr(index, direction)())
+            results = db.session.execute(statement.offset((page - 1) * page_size).limit(page_size + 1)).all()
+        else:
+            results = self.query_after(statement, key, direction, page_size + 1, after)
+
+        rows = [row.to_dict() for row, _ in results[:page_size]]
+        if len(results) <= page_size:
+            return rows, None
+        row, key_value = results[page_size - 1]
+        return rows, {"key": key_value if key is not None else None, "index": row.index}
+
+    @staticmethod
+    def key_ordering(key, direction: str):
+        """
+        NULLs last when ascending and first when descending, the default of PostgreSQL so its indexes keep serving it
+        """
+        return key.asc().nulls_last() if direction == "asc" else key.desc().nulls_first()
+
+    @staticmethod
+    def query_after(statement, key, direction: str, page_size: int, after: Dict) -> List:
+        """
+        The keyset page after a row: the ordered rows are a run of the rows with a value and a run of the rows
+        without one (NULL), every run is read in the order of the header index from the position of the last row.
+        """
+        index = TabularDataFileRow.index
+        if direction == "asc":
+            runs = [
+                (key.isnot(None), lambda: tuple_(key, index) > tuple_(after["key"], after["index"])),
+                (key.is_(None), lambda: index > after["index"]),
+            ]
+        else:
+            runs = [
+                (key.is_(None), lambda: index < after["index"]),
+                (key.isnot(None), lambda: tuple_(key, index) < tuple_(after["key"], after["index"])),
+            ]
+        # skip the runs before the one of the last row
+        if (after["key"] is None) == (direction == "asc"):
+            runs = runs[1:]
+
+        results = []
+        for position, (run, bound) in enumerate(runs):
+            if len(results) >= page_size:
+                break
+            run_statement = statement.where(run)
+            if position == 0:
+                run_statement = run_statement.where(bound())
+            ordering = [getattr(expression, direction)() for expression in (key, index)]
+            results.extend(db.session.execute(run_statement.order_by(*ordering).limit(page_size - len(results))).all())
+        return results
+
+    def count(self, filters, filters_operator="and", approximate=False):
+        if approximate and db.session.get_bind().dialect.name == "postgresql":
+            # the row estimate of the planner for the rows themselves, it does not read them. the estimate of the
+            # plan of a count would be the one of a partial aggregate, per worker under a Gather
+            statement = self.filtered(select(TabularDataFileRow.id), filters, filters_operator)
+            sql = statement.compile(dialect=db.session.get_bind().dialect, compile_kwargs={"literal_binds": True})
+            plan = (
+                db.session.connection().exec_driver_sql("EXPLAIN (FORMAT JSON) " + str(sql).replace("%", "%%")).scalar()
+            )
+            return int(plan[0]["Plan"]["Plan Rows"]), True
+        statement = self.filtered(select(func.count()).select_from(TabularDataFileRow), filters, filters_operator)
+        return db.session.execute(statement).scalar(), False
+
+    def iter_frames(
+        self, headers=None, chunksize=None, filters=None, filters_operator="and", order_by=None, direction="asc"
+    ):
+        chunksize = chunksize or Config.TABULAR_INGESTION_CHUNK_SIZE
+        headers = self.header_resolver.names if headers is None else list(headers)
+        dtypes = [self.dtypes.get(header) for header in headers]
+        statement, positions = self.select_cells(headers, dtypes)
+        statement = self.filtered(statement, filters, filters_operator)
+        ordering = [getattr(TabularDataFileRow.index, direction)()]
+        if order_by is not None:
+            ordering.insert(0, self.key_ordering(typed_value(order_by, self.dtypes.get(order_by)), direction))
+        # a Core SELECT on the session connection, stream_results reads it with a server side cursor on PostgreSQL
+        result = db.session.connection().execute(
+            statement.order_by(*ordering).execution_options(stream_results=True, max_row_buffer=chunksize)
+        )
+        for partition in result.partitions(chunksize):
+            columns = list(zip(*partition))
+            yield pd.DataFrame(
+                {
+                    header: decode_column(columns[cell], dtype, columns[types] if types is not None else None)
+                    for header, dtype, (cell, types) in zip(headers, dtypes, positions)
+                },
+                columns=headers,
+                index=pd.Index(np.fromiter(columns[0], dtype="int64", count=len(partition)), name="index"),
+            )
+
+    @staticmethod
+    def select_cells(headers: List[str], dtypes: List[str]):
+        """
+        The SELECT of the row index and of the cells of the headers extracted from the JSON as scalars, so no
+        row_data dict is built per row. the cells of the text headers come with their JSON type to restore the
+        values that are not strings.
+        returns the statement and the position of the cell and of its JSON type (None when there is none) of
+        every header in the selected columns, the row index is the first one.
+        """
+        texts = [dtype not in (NUMERIC, BOOLEAN, None) for dtype in dtypes]
+        record = None
+        if is_postgresql() and headers:
+            # json_to_record parses the row_data once per row, row_data ->> 'header' parses it once per header
+            record = (
+                func.json_to_record(TabularDataFileRow.row_data)
+                .table_valued(*[column(header, JSON if text else Text) for header, text in zip(headers, texts)])
+                .render_derived(name="cells", with_types=True)
+            )
+
+        cells = []
+        positions = []
+        for header, text in zip(headers, texts):
+            if record is None:
+                cells.append(text_value(header))
+                if text:
+                    cells.append(json_type(header))
+            elif text:
+                cell = record.c[header]
+                cells.extend([cell.op("#>>", return_type=Text)(literal("{}")), func.json_typeof(cell, type_=Text)])
+            else:
+                cells.append(record.c[header])
+            positions.append((len(cells) - 1, len(cells)) if text else (len(cells), None))
+
+        statement = select(
+            TabularDataFileRow.index, *[cell.label(f"cell_{position}") for position, cell in enumerate(cells)]
+        )
+        if record is not None:
+            statement = statement.select_from(TabularDataFileRow).join(record, true())
+        return statement, positions
+
+    def aggregate(self, group_by, aggregates, filters=None, filters_operator="and", limit=1000):
+        if not is_postgresql() and any(item["function"] == "percentile" for item in aggregates):
+            # SQLite has no percentile aggregate
+            return super().aggregate(group_by, aggregates, filters, filters_operator, limit)
+        dtypes = [self.dtypes.get(header) for header in group_by]
+        keys = [typed_value(header, dtype) for header, dtype in zip(group_by, dtypes)]
+        statement = self.filtered(
+            select(*keys, *[self.aggregate_expression(item) for item in aggregates]).select_from(TabularDataFileRow),
+            filters,
+            filters_operator,
+        )
+        if keys:
+            statement = statement.group_by(*keys).order_by(*[key.asc().nulls_last() for key in keys])
+        # one more group tells if the result is truncated
+        results = db.session.execute(statement.limit(limit + 1)).all()
+        rows = [
+            [key_value(value, dtype) for value, dtype in zip(row[: len(keys)], dtypes)]
+            + [aggregate_value(value) for value in row[len(keys) :]]
+            for row in results[:limit]
+        ]
+        return rows, len(results) > limit
+
+    def aggregate_expression(self, aggregate: Dict):
+        """
+        The SQL aggregate of one aggregate dict, on the numeric cells of the header (its text cells for the
+        min and max of a text header)
+        """
+        function = aggregate["function"]
+        header = aggregate.get("header")
+        if function == "count":
+            return func.count() if header is None else func.count(text_value(header))
+        dtype = self.dtypes.get(header)
+        if function in ("min", "max") and dtype not in (NUMERIC, None):
+            return getattr(func, function)(text_value(header))
+        value = numeric_value(header)
+        if function == "percentile":
+            return func.percentile_cont(aggregate["percentile"]).within_group(value)
+        return {"sum": func.sum, "mean": func.avg, "min": func.min, "max": func.max}[function](value)
+
+    def upsert_rows(self, rows):
+        # the same number of statements whatever the number of rows: one to read the edited rows,
+        # one to update them and one to append the others
+        table = TabularDataFileRow.__table__
+        file_filter = table.c.tabular_data_file_id == self.tabular_data_file.id
+        edited = {row["id"]: row["row_data"] for row in rows if row.get("id") is not None}
+        replaced = {}
+        if edited:
+            replaced = dict(
+                db.session.execute(
+                    select(table.c.id, table.c.row_data).where(file_filter, table.c.id.in_(edited))
+                ).all()
+            )
+        appended = [row["row_data"] for row in rows if row.get("id") not in replaced]
+
+        if replaced:
+            self.update_rows({row_id: edited[row_id] for row_id in replaced})
+        if appended:
+            last_index = db.session.execute(select(func.max(table.c.index)).where(file_filter)).scalar()
+            start_index = -1 if last_index is None else last_index
+            now = db.session.execute(select(func.now())).scalar()
+            db.session.execute(
+                insert(table),
+                [
+                    {
+                        "tabular_data_file_id": self.tabular_data_file.id,
+                        "row_data": row_data,
+                        "index": start_index + offset,
+                        "created_at": now,
+                        "updated_at": now,
+                    }
+                    for offset, row_data in enumerate(appended, start=1)
+                ],
+            )
+        return list(replaced.values()), [edited[row_id] for row_id in replaced] + appended
+
+    def update_rows(self, row_data_by_id: Dict[int, Dict]):
+        """
+        Replace the row_data of the rows in one statement, an UPDATE ... FROM (VALUES ...) on PostgreSQL
+        """
+        table = TabularDataFileRow.__table__
+        file_filter = table.c.tabular_data_file_id == self.tabular_data_file.id
+        if db.session.get_bind().dialect.name == "postgresql":
+            edited_rows = values(column("id", Integer), column("row_data", JSON), name="edited_rows").data(
+                list(row_data_by_id.items())
+            )
+            db.session.execute(
+                update(table)
+                .where(file_filter, table.c.id == edited_rows.c.id)
+                .values(row_data=cast(edited_rows.c.row_data, JSON), updated_at=func.now())
+            )
+            return
+        # executemany, SQLite has no round trips to save
+        db.session.execute(
+            update(table)
+            .where(file_filter, table.c.id == bindparam("edited_id"))
+            .values(row_data=bindparam("edited_row_data"), updated_at=func.now()),
+            [{"edited_id": row_id, "edited_row_data": row_data} for row_id, row_data in row_data_by_id.items()],
+        )
+
+    def build_indexes(self):
+        RowIndexManager(self.tabular_data_file.id).create()
+
+    def clear(self):
+        db.session.execute(
+            delete(TabularDataFileRow).where(TabularDataFileRow.tabular_data_file_id == self.tabular_data_file.id)
+        )
+        RowIndexManager(self.tabular_data_file.id).drop()
+
+
+def frame_to_table(df: pd.DataFrame, schema: pa.Schema = None) -> pa.Table:
+    """
+    Convert a DataFrame chunk to an arrow table with the schema of the previous chunks (inferred when None).
+    a column without any value is stored as text, the columns the schema stores as text are converted to text.
+    """
+    if schema is None:
+        inferred = pa.Schema.from_pandas(df, preserve_index=False).remove_metadata()
+        schema = pa.schema(
+            [pa.field(field.name, pa.string()) if pa.types.is_null(field.type) else field for field in inferred]
+        )
+    try:
+        return pa.Table.from_pandas(df, schema=schema, preserve_index=False, safe=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError):
+        pass
+
+    df = df.copy()
+    for field in schema:
+        if pa.types.is_string(field.type) and not pd.api.types.is_string_dtype(df[field.name]):
+            df[field.name] = df[field.name].map(str, na_action="ignore").astype(object)
+    try:
+        return pa.Table.from_pandas(df, schema=schema, preserve_index=False, safe=True)
+    except (pa.ArrowInvalid, pa.ArrowTypeError) as e:
+        raise ValueError(f"The column types changed in the middle of the file: {e.args[0]}")
+
+
+def widen_schema(schema: pa.Schema, df: pd.DataFrame) -> pa.Schema:
+    """
+    The schema with the integer columns the DataFrame writes non integral numbers to widened to float64, the
+    numeric headers hold both
+    """
+    fields = []
+    for field in schema:
+        if pa.types.is_integer(field.type) and field.name in df and df[field.name].dtype.kind == "f":
+            values = df[field.name].dropna()
+            if (values != np.floor(values)).any():
+                field = pa.field(field.name, pa.float64(), nullable=field.nullable)
+        fields.append(field)
+    return pa.schema(fields)
+
+
+class ParquetChunkWriter:
+    """
+    Write DataFrame chunks as parquet files (one part file per chunk) with row group statistics.
+
+        the arrow schema is fixed by the first chunk, the next chunks are converted to it so every part of the
+        dataset has the same column types. the row index is stored in the INDEX_COLUMN column.
+    """
+
+    def __init__(self, directory: str, row_group_size: int = None):
+        self.directory = directory
+        self.row_group_size = row_group_size or Config.TABULAR_PARQUET_ROW_GROUP_SIZE
+        self.schema = None
+        self.parts = 0
+        self.rows_loaded = 0
+        self.seconds = 0.0
+        os.makedirs(directory, exist_ok=True)
+
+    def load(self, df: pd.DataFrame, start_index: int = 0) -> int:
+        started = time.perf_counter()
+        df = df.reset_index(drop=True)
+        df[ParquetStorage.INDEX_COLUMN] = pd.RangeIndex(start_index, start_index + len(df))
+        table = self.to_table(df)
+        path = os.path.join(self.directory, f"part-{self.parts:05d}.parquet")
+        # written under a hidden name (ignored by the dataset) and renamed, the queries running during an
+        # ingestion never read a part being written
+        temp_path = os.path.join(self.directory, f".part-{self.parts:05d}.parquet")
+        pq.write_table(table, temp_path, row_group_size=self.row_group_size, write_statistics=True)
+        os.replace(temp_path, path)
+        self.parts += 1
+        self.rows_loaded += len(df)
+        self.seconds += time.perf_counter() - started
+        return len(df)
+
+    def to_table(self, df: pd.DataFrame) -> pa.Table:
+        table = frame_to_table(df, self.schema)
+        self.schema = table.schema.remove_metadata()
+        return table
+
+    def report(self) -> Dict[str, any]:
+        rows_per_second = self.rows_loaded / self.seconds if self.seconds else 0.0
+        return {
+            "method": "parquet",
+            "row_group_size": self.row_group_size,
+            "rows": self.rows_loaded,
+            "seconds": round(self.seconds, 3),
+            "rows_per_second": round(rows_per_second, 1),
+        }
+
+
+class PartSwap:
+    """
+    Replace parts of a dataset by new ones with the commit of the transaction, the new parts are written under hidden
+    names (ignored by the dataset) next to them. right before the commit, while the row of the file is still locked,
+    every part is replaced by its new file in one rename, a hard link keeps the previous part until the transaction is
+    committed (removed) or rolled back (restored). a new part that did not replace one (the appended rows) is added.
+    """
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        # the path of every part, its new file
+        self.parts = {}
+        # the path of every replaced part, the hard link of its previous file
+        self.previous = {}
+        self.swapped = []
+
+    def new_path(self, name: str) -> str:
+        path = os.path.join(self.directory, name)
+        self.parts[path] = os.path.join(self.directory, f".{name}.{uuid.uuid4().hex}.new")
+        return self.parts[path]
+
+    def swap(self):
+        for path, new_path in self.parts.items():
+            if os.path.exists(path):
+                previous_path = os.path.join(self.directory, f".{os.path.basename(path)}.{uuid.uuid4().hex}.previous")
+                os.link(path, previous_path)
+                self.previous[path] = previous_path
+            os.replace(new_path, path)
+            self.swapped.append(path)
+
+    def commit(self):
+        for previous_path in self.previous.values():
+            remove_file(previous_path)
+        self.previous = {}
+
+    def rollback(self):
+        for path in reversed(self.swapped):
+            if path in self.previous:
+                os.replace(self.previous.pop(path), path)
+            else:
+                remove_file(path)
+        self.swapped = []
+        self.commit()
+        for new_path in self.parts.values():
+            remove_file(new_path)
+
+
+def remove_file(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+
+class ParquetStorage(TabularStorage):
+    """
+    The columnar storage, the rows are parquet files under MEDIA_FOLDER/tabular/<tabular_data_file_id>.
+    """
+
+    name = "parquet"
+    transactional = False
+    INDEX_COLUMN = "__index__"
+
+    @property
+    def directory(self) -> str:
+        return os.path.join(Config.MEDIA_FOLDER, "tabular", str(self.tabular_data_file.id))
+
+    def dataset(self) -> ds.Dataset:
+        return ds.dataset(self.directory, format="parquet")
+
+    def writer(self, batch_size: int = None):
+        return ParquetChunkWriter(self.directory)
+
+    def compile_filter(self, row_filter: Dict, schema: pa.Schema) -> ds.Expression:
+        """
+        Compile one row filter to a pyarrow dataset expression
+        """
+        field = pc.field(row_filter["header"])
+        field_type = schema.field(row_filter["header"]).type
+        value = row_filter["value"]
+        operator = row_filter["operator"]
+        if operator == "like":
+            if not pa.types.is_string(field_type):
+                field = field.cast(pa.string())
+            return pc.match_substring(field, str(value))
+        if operator in ("in", "notin"):
+            values = value if isinstance(value, list) else [value]
+            expression = field.isin(pa.array([self.coerce(item, field_type) for item in values], type=field_type))
+            return ~expression if operator == "notin" else expression
+
+        value = self.coerce(value, field_type)
+        return {
+            "eq": lambda: field == value,
+            "gt": lambda: field > value,
+            "lt": lambda: field < value,
+            "gte": lambda: field >= value,
+            "lte": lambda: field <= value,
+        }[operator]()
+
+    @staticmethod
+    def coerce(value, field_type: pa.DataType):
+        """
+        Convert a filter value to the type of the column it is compared with
+        """
+        try:
+            if pa.types.is_integer(field_type) or pa.types.is_floating(field_type):
+                return float(value)
+            if pa.types.is_boolean(field_type):
+                return str(value).lower() in ("1", "true", "yes")
+        except (TypeError, ValueError):
+            raise ValueError(f"Invalid value {value!r} for a numeric column.")
+        return value if pa.types.is_string(field_type) else str(value)
+
+    def filter_expression(self, dataset: ds.Dataset, filters: List[Dict], filters_operator: str = "and"):
+        """
+        Combine the compiled row filters, None when there is no filter
+        """
+        expression = None
+        for row_filter in filters or []:
+            item = self.compile_filter(row_filter, dataset.schema)
+            if expression is None:
+                expression = item
+            else:
+                expression = expression & item if filters_operator == "and" else expression | item
+        return expression
+
+    def after_expression(self, order_by: str, direction: str, after: Dict) -> ds.Expression:
+        """
+        The rows after the {"key", "index"} row in the (order_by, index) order, NULLs are last when ascending
+        """
+        index = pc.field(self.INDEX_COLUMN)
+        if order_by is None:
+            return index > after["index"] if direction == "asc" else index < after["index"]
+        field = pc.field(order_by)
+        key = after["key"]
+        if direction == "asc":
+            if key is None:
+                return field.is_null() & (index > after["index"])
+            return (field > key) | ((field == key) & (index > after["index"])) | field.is_null()
+        if key is None:
+            return (field.is_null() & (index < after["index"])) | field.is_valid()
+        return (field < key) | ((field == key) & (index < after["index"]))
+
+    def query(
+        self,
+        headers,
+        filters,
+        filters_operator="and",
+        order_by=None,
+        direction="asc",
+        page=1,
+        page_size=10,
+        after=None,
+    ):
+        dataset = self.dataset()
+        expression = self.filter_expression(dataset, filters, filters_operator)
+        offset = (page - 1) * page_size
+        if after is not None:
+            after_expression = self.after_expression(order_by, direction, after)
+            expression = after_expression if expression is None else expression & after_expression
+            offset = 0
+
+        # only the keys of the rows up to the end of the page are kept, then the columns of the page rows are fetched
+        sorted_keys = self.sorted_keys(dataset, expression, order_by, direction, limit=offset + page_size + 1)
+        page_keys = sorted_keys.slice(offset, page_size)
+        page_indices = page_keys[self.INDEX_COLUMN]
+
+        page_table = self.take_indices(dataset, headers, page_indices)
+        rows = [self.row_from_values(row.pop(self.INDEX_COLUMN), row) for row in page_table.to_pylist()]
+        if offset + page_size >= sorted_keys.num_rows:
+            return rows, None
+        last = page_keys.slice(page_keys.num_rows - 1).to_pylist()[0]
+        return rows, {"key": last.get(order_by), "index": last[self.INDEX_COLUMN]}
+
+    def sorted_keys(
+        self, dataset: ds.Dataset, expression, order_by: str, direction: str, limit: int = None
+    ) -> pa.Table:
+        """
+        The ordering key and the row index of the rows matching the expression (the first limit ones), sorted like
+        the rows table. the rows with a value and the rows without one (NULLs last when ascending) are sorted as two
+        runs, with a limit only the first rows of every run are selected instead of sorting all of them.
+        """
+        order = "ascending" if direction == "asc" else "descending"
+        key_columns = [self.INDEX_COLUMN] if not order_by else [order_by, self.INDEX_COLUMN]
+        keys = dataset.to_table(columns=key_columns, filter=expression)
+        if not order_by:
+            runs = [(keys, key_columns)]
+        else:
+            valid = pc.is_valid(keys[order_by])
+            runs = [(keys.filter(valid), key_columns), (keys.filter(pc.invert(valid)), [self.INDEX_COLUMN])]
+            if direction != "asc":
+                runs.reverse()
+
+        sorted_runs = []
+        for run, run_columns in runs:
+            sort_keys = [(column, order) for column in run_columns]
+            if limit is None:
+                sorted_runs.append(run.take(pc.sort_indices(run, sort_keys=sort_keys)))
+                continue
+            if limit <= 0:
+                break
+            if run.num_rows:
+                k = min(limit, run.num_rows)
+                sorted_runs.append(run.take(pc.select_k_unstable(run, k=k, sort_keys=sort_keys)))
+                limit -= k
+        return pa.concat_tables(sorted_runs) if sorted_runs else keys.slice(0, 0)
+
+    def take_indices(self, dataset: ds.Dataset, headers: List[str], indices: pa.Array) -> pa.Table:
+        """
+        The rows with the given indices in the order of the indices, with the INDEX_COLUMN
+        """
+        table = dataset.to_table(
+            columns=[*headers, self.INDEX_COLUMN], filter=pc.field(self.INDEX_COLUMN).isin(indices)
+        )
+        positions = pc.index_in(indices, value_set=table[self.INDEX_COLUMN])
+        return table.take(positions)
+
+    def count(self, filters, filters_operator="and", approximate=False):
+        # the unfiltered count is read from the parquet footers
+        dataset = self.dataset()
+        return dataset.count_rows(filter=self.filter_expression(dataset, filters, filters_operator)), False
+
+    def iter_frames(
+        self, headers=None, chunksize=None, filters=None, filters_operator="and", order_by=None, direction="asc"
+    ):
+        chunksize = chunksize or Config.TABULAR_INGESTION_CHUNK_SIZE
+        dataset = self.dataset()
+        columns = headers or [name for name in dataset.schema.names if name != self.INDEX_COLUMN]
+        expression = self.filter_expression(dataset, filters, filters_operator)
+        if order_by is None and direction == "asc":
+            # the part files are written in index order
+            for batch in dataset.to_batches(
+                columns=[*columns, self.INDEX_COLUMN], filter=expression, batch_size=chunksize
+            ):
+                if batch.num_rows:
+                    yield self.indexed_frame(batch)
+            return
+
+        # only the ordering key and the index are sorted in memory, the rows are read chunk by chunk
+        indices = self.sorted_keys(dataset, expression, order_by, direction)[self.INDEX_COLUMN]
+        for offset in range(0, len(indices), chunksize):
+            yield self.indexed_frame(self.take_indices(dataset, columns, indices.slice(offset, chunksize)))
+
+    def indexed_frame(self, table) -> pd.DataFrame:
+        df = table.to_pandas().set_index(self.INDEX_COLUMN)
+        df.index.name = "index"
+        return df
+
+    def aggregate(self, group_by, aggregates, filters=None, filters_operator="and", limit=1000):
+        dataset = self.dataset()
+        headers = list(dict.fromkeys([*group_by, *[item["header"] for item in aggregates if item.get("header")]]))
+        # only the projected columns of the matching rows are read
+        table = dataset.to_table(
+            columns=headers or [self.INDEX_COLUMN], filter=self.filter_expression(dataset, filters, filters_operator)
+        )
+        if not group_by or any(item["function"] == "percentile" for item in aggregates):
+            return aggregate_frame(table.to_pandas()[headers], group_by, aggregates, self.header_resolver.dtypes, limit)
+
+        specs = [
+            (
+                (None, "count_all")
+                if item["function"] == "count" and item.get("header") is None
+                else (item["header"], item["function"])
+            )
+            for item in aggregates
+        ]
+        # count_all counts the rows, it has no target column
+        result = table.group_by(group_by).aggregate(
+            [([] if header is None else header, function) for header, function in dict.fromkeys(specs)]
+        )
+        names = [*group_by, *[function if header is None else f"{header}_{function}" for header, function in specs]]
+        sort_keys = [(header, "ascending") for header in group_by]
+        # NULLs last
+        result = result.take(pc.sort_indices(result, sort_keys=sort_keys))
+        columns = [result.column(name).slice(0, limit).to_pylist() for name in names]
+        return [list(row) for row in zip(*columns)], result.num_rows > limit
+
+    def part_ranges(self, dataset: ds.Dataset) -> Dict[str, Tuple[int, int]]:
+        """
+        The first and the last row index of every part by path, from the statistics of the footers of the parts
+        (None for an empty part)
+        """
+        ranges = {}
+        for fragment in dataset.get_fragments():
+            metadata = fragment.metadata
+            position = metadata.schema.names.index(self.INDEX_COLUMN)
+            statistics = [
+                metadata.row_group(group).column(position).statistics for group in range(metadata.num_row_groups)
+            ]
+            statistics = [item for item in statistics if item is not None and item.has_min_max]
+            ranges[fragment.path] = (
+                (min(item.min for item in statistics), max(item.max for item in statistics)) if statistics else None
+            )
+        return ranges
+
+    def upsert_rows(self, rows):
+        # parquet files are immutable: only the parts holding the edited rows are rewritten and the appended rows are
+        # written as a new part, the new files replace the previous ones with the commit of the update
+        dataset = self.dataset()
+        schema = dataset.schema.remove_metadata()
+        headers = [name for name in schema.names if name != self.INDEX_COLUMN]
+        ranges = self.part_ranges(dataset)
+        edited_ids = {int(row["id"]) for row in rows if row.get("id") is not None}
+        edited_parts = {}
+        for path, index_range in ranges.items():
+            ids = [row_id for row_id in edited_ids if index_range and index_range[0] <= row_id <= index_range[1]]
+            if ids:
+                edited_parts[path] = pa.array(ids, pa.int64())
+        tables = {path: pq.read_table(path) for path in edited_parts}
+        replaced = {}
+        for path, table in tables.items():
+            for row in table.filter(pc.is_in(table[self.INDEX_COLUMN], value_set=edited_parts[path])).to_pylist():
+                replaced[row.pop(self.INDEX_COLUMN)] = row
+
+        last_index = max((index_range[1] for index_range in ranges.values() if index_range), default=-1)
+        written = {}
+        for row in rows:
+            # the row_data replaces the row like in the rows table, the headers it does not have are emptied
+            row_data = {header: row["row_data"].get(header) for header in headers}
+            if row.get("id") is not None and int(row["id"]) in replaced:
+                written[int(row["id"])] = row_data
+            else:
+                last_index += 1
+                written[last_index] = row_data
+
+        frame = pd.DataFrame.from_records(list(written.values()), columns=headers)
+        for field in schema:
+            if field.name in frame and (pa.types.is_integer(field.type) or pa.types.is_floating(field.type)):
+                # the cells of the numeric headers are numbers (see coerce_row_data), the empty ones NaN
+                frame[field.name] = pd.to_numeric(frame[field.name])
+        frame[self.INDEX_COLUMN] = np.fromiter(written, dtype="int64", count=len(written))
+        new_schema = widen_schema(schema, frame)
+        written_table = frame_to_table(frame, new_schema)
+
+        swap = PartSwap(self.directory)
+        row_group_size = Config.TABULAR_PARQUET_ROW_GROUP_SIZE
+        try:
+            # a widened column is widened in every part, the parts of a dataset have the same schema
+            for path in ranges if not new_schema.equals(schema) else edited_parts:
+                table = (tables[path] if path in tables else pq.read_table(path)).cast(new_schema)
+                if path in edited_parts:
+                    edited = pc.is_in(table[self.INDEX_COLUMN], value_set=edited_parts[path])
+                    table = pa.concat_tables(
+                        [
+                            table.filter(pc.invert(edited)),
+                            written_table.filter(
+                                pc.is_in(written_table[self.INDEX_COLUMN], value_set=edited_parts[path])
+                            ),
+                        ]
+                    ).sort_by(self.INDEX_COLUMN)
+                pq.write_table(
+                    table, swap.new_path(os.path.basename(path)), row_group_size=row_group_size, write_statistics=True
+                )
+            appended = written_table.filter(
+                pc.invert(pc.is_in(written_table[self.INDEX_COLUMN], value_set=pa.array(list(replaced), pa.int64())))
+            )
+            if appended.num_rows:
+                numbers = [int(name[5:-8]) for name in map(os.path.basename, ranges) if PART_NAME.fullmatch(name)]
+                name = f"part-{max(numbers, default=-1) + 1:05d}.parquet"
+                pq.write_table(appended, swap.new_path(name), row_group_size=row_group_size, write_statistics=True)
+        except Exception:
+            swap.rollback()
+            raise
+        on_commit(before_commit=swap.swap, after_commit=swap.commit, after_rollback=swap.rollback)
+        return list(replaced.values()), list(written.values())
+
+    def clear(self):
+        shutil.rmtree(self.directory, ignore_errors=True)
+
+
+def decode_column(values, dtype: str, types=None) -> np.ndarray:
+    """
+    The column array of the cells of a header extracted from the JSON, typed with the dtype of the header.
+
+        the numbers are parsed in one vectorized pass, a numeric header whose cells are not all numbers
+        (edited cells) keeps the other cells as they are in an object column.
+        the cells of the text headers come with their JSON types (see json_type), only the cells that are not
+        strings (or numbers SQLite already extracted as numbers) are decoded one by one.
+    """
+    cells = np.empty(len(values), dtype=object)
+    cells[:] = values
+    if dtype == BOOLEAN:
+        missing = pd.isna(cells)
+        # 1 == True, SQLite extracts the JSON booleans as 1 and 0
+        booleans = ((cells == True) | (cells == "true")).astype(bool)  # noqa: E712
+        if not missing.any():
+            return booleans
+        return np.where(missing, None, booleans).astype(object)
+    if dtype not in (NUMERIC, None):
+        if types is not None:
+            types = np.asarray(types, dtype=object)
+            for position in np.flatnonzero((types == "number") | (types == "boolean")):
+                # PostgreSQL extracts them as their JSON text
+                cells[position] = json.loads(cells[position])
+            for position in np.flatnonzero((types == "true") | (types == "false")):
+                cells[position] = types[position] == "true"
+        return cells
+    numbers = parse_numbers(cells, errors="coerce")
+    not_numbers = pd.isna(numbers) & ~pd.isna(cells)
+    if not not_numbers.any():
+        return numbers
+    # the numbers are parsed again without the other cells, so the integers are not widened to floats
+    cells[~not_numbers] = parse_numbers(cells[~not_numbers]).astype(object)
+    return cells
+
+
+def parse_numbers(cells: np.ndarray, errors: str = "raise") -> np.ndarray:
+    """
+    Parse an object array of numbers (or of their text) to an int64 or float64 array.
+    the decimals are parsed with float(), the fast parser of to_numeric can round the 17 digits the numbers
+    are written with to the next float.
+    """
+    numbers = pd.to_numeric(cells, errors=errors)
+    if numbers.dtype.kind == "f":
+        parsed = ~np.isnan(numbers)
+        numbers[parsed] = cells[parsed].astype("float64")
+    return numbers
+
+
+def key_value(value, dtype: str):
+    """
+    A group value read from the rows table as the JSON value of the header dtype
+    """
+    if value is None:
+        return None
+    if dtype == BOOLEAN:
+        # PostgreSQL reads the JSON booleans as 'true' and 'false', SQLite as 1 and 0
+        return value == "true" if isinstance(value, str) else bool(value)
+    if isinstance(value, Decimal) and value == value.to_integral_value():
+        return int(value)
+    return aggregate_value(value)
+
+
+def aggregate_value(value):
+    """
+    An aggregate as a JSON value, the numeric aggregates are returned as Decimal by the database
+    """
+    return float(value) if isinstance(value, Decimal) else value
+
+
+def aggregate_frame(
+    df: pd.DataFrame, group_by: List[str], aggregates: List[Dict], dtypes: Dict[str, str], limit: int
+) -> Tuple[List[List], bool]:
+    """
+    Aggregate an in-memory DataFrame like TabularStorage.aggregate, the cells of the numeric headers are
+    converted to numbers (NaN when they are not) and the other cells compared as text.
+    """
+    df = df.copy()
+    for header in df.columns:
+        if dtypes.get(header) in (NUMERIC, None):
+            df[header] = pd.to_numeric(df[header], errors="coerce")
+        elif not pd.api.types.is_bool_dtype(df[header]):
+            df[header] = df[header].map(str, na_action="ignore")
+
+    target = df.groupby(group_by, dropna=False, sort=True) if group_by else df
+    results = []
+    for item in aggregates:
+        function = item["function"]
+        header = item.get("header")
+        if function == "count":
+            result = (target.size() if group_by else len(df)) if header is None else target[header].count()
+        elif function == "percentile":
+            result = target[header].quantile(item["percentile"])
+        elif function == "sum":
+            # the sum of a group without any number is NULL like in SQL
+            result = target[header].sum(min_count=1)
+        else:
+            result = getattr(target[header], function)()
+        results.append(result)
+
+    if not group_by:
+        rows = [[None if pd.isna(value) else value for value in results]]
+    else:
+        frame = pd.concat(results, axis=1).reset_index()
+        frame = frame.astype(object).where(frame.notna(), None)
+        rows = frame.values.tolist()
+    rows = [[value.item() if isinstance(value, np.generic) else value for value in row] for row in rows]
+    return rows[:limit], len(rows) > limit
+
+
+STORAGE_BACKENDS = {RowTableStorage.name: RowTableStorage, ParquetStorage.name: ParquetStorage}
+
+
+def get_storage(
+    tabular_data_file: TabularDataFile, backend: str = None, header_resolver: HeaderResolver = None
+) -> TabularStorage:
+    """
+    Return the storage backend of the tabular data file
+    """
+    backend = backend or tabular_data_file.storage_backend or RowTableStorage.name
+    return STORAGE_BACKENDS[backend](tabular_data_file, header_resolver=header_resolver)
+
+
+def convert_storage(tabular_data_file: TabularDataFile, backend: str) -> Dict[str, any]:
+    """
+    Move the rows of the tabular data file to another storage backend and commit.
+
+        the rows table is cleared inside the transaction, the parquet files only once the transaction is committed,
+        so a failed conversion leaves the file on its original backend.
+    """
+    source = get_storage(tabular_data_file)
+    target = get_storage(tabular_data_file, backend)
+    headers = [header.header for header in sorted(tabular_data_file.headers, key=lambda header: header.index)]
+    try:
+        writer = target.writer()
+        for frame in source.iter_frames(headers):
+            writer.load(frame, start_index=writer.rows_loaded)
+        target.build_indexes()
+        if source.transactional:
+            source.clear()
+        tabular_data_file.storage_backend = backend
+        db.session.commit()
+    except Exception:
+        db.session.rollback()
+        if not target.transactional:
+            target.clear()
+        raise
+    if not source.transactional:
+        source.clear()
+    return writer.report()
@@ -0,0 +1,74 @@
+import base64
+from decimal import Decimal
+
+import pytest
+
+from app.tabular_data.indexes import NUMERIC
+from app.tabular_data.service import TabularDataService
+
+
+@pytest.mark.parametrize(
+    "order_by, direction, key, dtype",
+    [
+        (None, "asc", None, None),
+        ("name", "desc", "Smith, John", None),
+        ("name", "asc", None, None),
+        ("score", "asc", Decimal("12345678901234567890.000000001"), NUMERIC),
+        ("score", "desc", 0.1, NUMERIC),
+    ],
+)
+def test_cursor_round_trip(order_by, direction, key, dtype):
+    cursor = TabularDataService.encode_cursor(order_by, direction, {"key": key, "index": 41})
+
+    position = TabularDataService.decode_cursor(cursor, order_by, direction, dtype)
+
+    assert position == {"key": key, "index": 41}
+    assert type(position["key"]) is type(key)
+
+
+def test_cursor_of_another_ordering():
+    cursor = TabularDataService.encode_cursor("name", "asc", {"key": "a", "index": 0})
+
+    with pytest.raises(ValueError, match="another rows_order_by"):
+        TabularDataService.decode_cursor(cursor, "name", "desc")
+    with pytest.raises(ValueError, match="another rows_order_by"):
+        TabularDataService.decode_cursor(cursor, None, "asc")
+
+
+@pytest.mark.parametrize(
+    "payload",
+    [
+        b"not json",
+        b"\xff\xfe",
+        b"[1, 2]",
+        b'{"order_by": "score", "direction": "asc", "key": null}',
+        b'{"order_by": "score", "direction": "asc", "key": null, "index": "first"}',
+        b'{"order_by": "score", "direction": "asc", "key": "1,5", "index": 0}',
+        b'{"order_by": "name", "direction": "asc", "key": "a", "index": "first"}',
+    ],
+)
+def test_invalid_cursor(payload):
+    cursor = base64.urlsafe_b64encode(payload).decode()
+
+    with pytest.raises(ValueError, match="Invalid cursor"):
+        TabularDataService.decode_cursor(cursor, "score", "asc", NUMERIC)
+
+
+def test_invalid_cursor_request(client, upload):
+    tabular_data_file_id = upload("name,age\na,6\nb,5\nc,4\nd,3\ne,2\nf,1\n").json["id"]
+    url = f"/tabular/files/{tabular_data_file_id}"
+
+    response = client.post(url, json={"page_size": 5, "rows_order_by": "age"})
+    cursor = response.json["pagination"]["next_cursor"]
+    assert [row["row_data"]["name"] for row in response.json["rows"]] == ["f", "e", "d", "c", "b"]
+
+    response = client.post(url, json={"page_size": 5, "rows_order_by": "age", "cursor": cursor})
+    assert [row["row_data"]["name"] for row in response.json["rows"]] == ["a"]
+    assert response.json["pagination"]["next_cursor"] is None
+
+    response = client.post(url, json={"page_size": 5, "rows_order_by": "-age", "cursor": cursor})
+    assert response.status_code == 400
+    assert response.json["message"] == "The cursor was returned for another rows_order_by."
+    response = client.post(url, json={"page_size": 5, "cursor": "garbage"})
+    assert response.status_code == 400
+    assert response.json["message"] == "Invalid cursor."
@@ -0,0 +1,135 @@
+import os
+import socket
+import subprocess
+from datetime import datetime, timedelta
+
+import pytest
+from sqlalchemy import update
+
+from app.db import db
+from app.tabular_data import jobs
+from app.tabular_data.models import TabularDataFile, TabularIngestionJob
+from app.tabular_data.service import TabularDataService
+from config import Config
+
+CSV = "name,age\na,1\nb,2\nc,3\n"
+
+
+def create_job(status=TabularIngestionJob.QUEUED, worker=None, updated_seconds_ago=0) -> int:
+    """
+    A job of a new uploaded file, updated_seconds_ago sets its last update in the past
+    """
+    os.makedirs("uploads", exist_ok=True)
+    job = TabularIngestionJob(name="data.csv", storage_backend="rows", status=status, worker=worker)
+    db.session.add(job)
+    db.session.flush()
+    job.path = os.path.join("uploads", f"job-{job.id}.csv")
+    with open(job.path, "w") as file:
+        file.write(CSV)
+    db.session.commit()
+    if updated_seconds_ago:
+        db.session.execute(
+            update(TabularIngestionJob)
+            .where(TabularIngestionJob.id == job.id)
+            .values(updated_at=datetime.now() - timedelta(seconds=updated_seconds_ago))
+        )
+        db.session.commit()
+    return job.id
+
+
+def get_job(job_id: int) -> TabularIngestionJob:
+    db.session.expire_all()
+    return db.session.get(TabularIngestionJob, job_id)
+
+
+@pytest.fixture
+def dead_worker() -> str:
+    """
+    The worker_id of a process that is gone
+    """
+    process = subprocess.Popen(["true"])
+    process.wait()
+    return f"{socket.gethostname()}:{process.pid}"
+
+
+@pytest.fixture
+def submitted(monkeypatch):
+    """
+    The ids of the jobs submitted to the process pool, which is not started
+    """
+    job_ids = []
+    monkeypatch.setattr(jobs.ProcessPoolJobQueue, "submit", lambda queue, job_id: job_ids.append(job_id))
+    return job_ids
+
+
+def test_run_ingestion_job(client):
+    job_id = create_job()
+    path = get_job(job_id).path
+
+    assert jobs.run_ingestion_job(job_id) == TabularIngestionJob.COMPLETED
+
+    job = get_job(job_id)
+    assert (job.rows_done, job.rows_total, job.path, job.worker) == (3, 3, None, jobs.worker_id())
+    tabular_data_file = db.session.get(TabularDataFile, job.tabular_data_file_id)
+    assert tabular_data_file.path == path and tabular_data_file.row_count == 3
+    response = client.post(f"/tabular/files/{tabular_data_file.id}", json={"page_size": 5})
+    assert [row["row_data"]["name"] for row in response.json["rows"]] == ["a", "b", "c"]
+    # a job submitted twice is only run once
+    assert jobs.run_ingestion_job(job_id) == TabularIngestionJob.COMPLETED
+    assert TabularDataFile.query.count() == 1
+
+
+def test_failed_ingestion_job(app, monkeypatch):
+    job_id = create_job()
+    path = get_job(job_id).path
+
+    def fail(self, *args, **kwargs):
+        raise ValueError("The file is broken.")
+
+    monkeypatch.setattr(TabularDataService, "iter_chunks", fail)
+    assert jobs.run_ingestion_job(job_id) == TabularIngestionJob.FAILED
+
+    job = get_job(job_id)
+    assert (job.error, job.tabular_data_file_id, job.path) == ("The file is broken.", None, None)
+    # the partly ingested file and the upload are removed
+    assert TabularDataFile.query.count() == 0
+    assert not os.path.exists(path)
+
+
+def test_recover_stale_jobs(app, dead_worker, submitted):
+    alive_worker = jobs.worker_id()
+    stale = Config.TABULAR_JOBS_STALE_SECONDS * 2
+    job_ids = {
+        "queued in a dead worker": create_job(worker=dead_worker),
+        "running in a dead worker": create_job(TabularIngestionJob.RUNNING, dead_worker),
+        "queued in a live worker": create_job(worker=alive_worker),
+        "running in a live worker": create_job(TabularIngestionJob.RUNNING, alive_worker, updated_seconds_ago=stale),
+        "running on another host": create_job(TabularIngestionJob.RUNNING, "other-host:1"),
+        "stale on another host": create_job(TabularIngestionJob.RUNNING, "other-host:1", updated_seconds_ago=stale),
+        "never submitted": create_job(updated_seconds_ago=stale),
+    }
+    # the partly ingested file of the job running in the dead worker
+    running = get_job(job_ids["running in a dead worker"])
+    tabular_data_file = TabularDataService.create_tabular_data_file(running.name, running.path, None)
+    db.session.add(tabular_data_file)
+    db.session.flush()
+    running.tabular_data_file_id = tabular_data_file.id
+    db.session.commit()
+
+    assert jobs.ProcessPoolJobQueue().recover() == (2, 1)
+    # the recovered jobs are claimed by this worker, they are not recovered twice
+    assert jobs.ProcessPoolJobQueue().recover() == (0, 0)
+
+    statuses = {name: get_job(job_id).status for name, job_id in job_ids.items()}
+    assert statuses == {
+        "queued in a dead worker": TabularIngestionJob.QUEUED,
+        "running in a dead worker": TabularIngestionJob.FAILED,
+        "queued in a live worker": TabularIngestionJob.QUEUED,
+        "running in a live worker": TabularIngestionJob.RUNNING,
+        "running on another host": TabularIngestionJob.RUNNING,
+        "stale on another host": TabularIngestionJob.FAILED,
+        "never submitted": TabularIngestionJob.QUEUED,
+    }
+    assert submitted == [job_ids["queued in a dead worker"]]
+    assert TabularDataFile.query.count() == 0
+    assert get_job(job_ids["running in a dead worker"]).error == "The ingestion was interrupted, upload the file again."
@@ -0,0 +1,169 @@
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from app.tabular_data.statistics import QUARTILES, ColumnAccumulator, FrequentItems, KLLSketch, StatisticsAccumulator
+
+
+def assert_exact(accumulator: ColumnAccumulator, values: np.ndarray):
+    """
+    The statistics of the accumulator are the pandas ones of the values
+    """
+    series = pd.Series(values)
+    assert accumulator.exact
+    assert accumulator.count == series.count()
+    assert accumulator.mean == pytest.approx(series.mean())
+    assert accumulator.std == pytest.approx(series.std())
+    assert (accumulator.min, accumulator.max) == (series.min(), series.max())
+    assert accumulator.quantiles(QUARTILES) == pytest.approx(series.quantile(QUARTILES).tolist())
+    assert accumulator.mode() == series.mode().iloc[0]
+
+
+def rank_error(values: np.ndarray, estimates, q) -> np.ndarray:
+    """
+    How far in rank (0 to 1) the estimated quantiles are from the quantiles q of the values
+    """
+    ranks = np.searchsorted(np.sort(values), estimates, side="left") / values.size
+    return np.abs(ranks - np.asarray(q))
+
+
+def test_add_in_chunks():
+    values = np.random.default_rng(0).integers(0, 20, 300).astype("float64")
+    accumulator = ColumnAccumulator(sketch_size=1024, frequent_items=8)
+    for chunk in np.array_split(values, 7):
+        accumulator.update(chunk)
+
+    assert_exact(accumulator, values)
+
+
+def test_remove():
+    values = np.random.default_rng(1).integers(0, 20, 300).astype("float64")
+    accumulator = ColumnAccumulator(sketch_size=1024, frequent_items=8)
+    accumulator.update(values)
+
+    accumulator.remove(values[:120])
+    accumulator.remove(values[250:])
+
+    assert_exact(accumulator, values[120:250])
+    # Misra-Gries has decremented its counters, the mode is still read from the exact sketches
+    assert len(accumulator.frequent.counts) <= 8
+
+
+def test_remove_every_value():
+    accumulator = ColumnAccumulator(sketch_size=8, frequent_items=4)
+    accumulator.update(np.arange(100, dtype="float64"))
+    assert not accumulator.exact
+
+    accumulator.remove(np.arange(100, dtype="float64"))
+    assert accumulator.count == 0 and accumulator.mode() is None
+    accumulator.update(np.array([3.0, 1.0, 3.0]))
+    assert_exact(accumulator, np.array([3.0, 1.0, 3.0]))
+
+
+def test_remove_from_compacted_sketch():
+    rng = np.random.default_rng(2)
+    values = np.concatenate([rng.normal(size=5000), np.full(1000, 0.5)])
+    rng.shuffle(values)
+    accumulator = ColumnAccumulator(sketch_size=128, frequent_items=32)
+    for chunk in np.array_split(values, 10):
+        accumulator.update(chunk)
+    accumulator.remove(values[:2000])
+    remaining = values[2000:]
+
+    assert not accumulator.exact
+    # the moments stay exact, the quantiles are within the rank error of the sketches
+    assert accumulator.count == remaining.size
+    assert accumulator.mean == pytest.approx(remaining.mean())
+    assert accumulator.std == pytest.approx(remaining.std(ddof=1))
+    assert rank_error(remaining, accumulator.quantiles(QUARTILES), QUARTILES).max() < 0.05
+    # the heavy hitter outlives the decrements and the removals
+    assert accumulator.mode() == 0.5
+
+
+def test_kll_merge():
+    rng = np.random.default_rng(3)
+    left, right = rng.normal(size=300), rng.normal(5, size=200)
+    small = KLLSketch(1024)
+    small.update(left)
+    other = KLLSketch(1024)
+    other.update(right)
+    small.merge(other)
+    assert small.exact
+    assert np.array_equal(np.sort(small.values()), np.sort(np.concatenate([left, right])))
+
+    left, right = rng.normal(size=20000), rng.normal(5, size=10000)
+    merged, other = KLLSketch(200), KLLSketch(200)
+    merged.update(left)
+    other.update(right)
+    merged.merge(other)
+    values, ranks = merged.weighted_items()
+    estimates = values[np.searchsorted(ranks, [q * ranks[-1] for q in QUARTILES])]
+    assert not merged.exact and merged.count == 30000
+    assert rank_error(np.concatenate([left, right]), estimates, QUARTILES).max() < 0.03
+
+
+def test_frequent_items_merge():
+    rng = np.random.default_rng(4)
+    left, right = rng.integers(0, 10, 500).astype("float64"), rng.integers(5, 15, 500).astype("float64")
+    merged, other = FrequentItems(16), FrequentItems(16)
+    merged.update(left)
+    other.update(right)
+    merged.merge(other)
+    counts = pd.Series(np.concatenate([left, right])).value_counts()
+    assert merged.counts == counts.to_dict()
+    assert merged.mode() == counts[counts == counts.max()].index.min()
+
+    # more distinct values than counters: every count is at most n / (capacity + 1) lower than the true one
+    left = np.concatenate([rng.integers(0, 1000, 4000), np.full(800, 7)]).astype("float64")
+    right = np.concatenate([rng.integers(0, 1000, 4000), np.full(600, 7)]).astype("float64")
+    merged, other = FrequentItems(16), FrequentItems(16)
+    merged.update(left)
+    other.update(right)
+    merged.merge(other)
+    counts = pd.Series(np.concatenate([left, right])).value_counts()
+    bound = (left.size + right.size) / 17
+    assert len(merged.counts) <= 16
+    assert all(0 <= counts[value] - count <= bound for value, count in merged.counts.items())
+    assert merged.mode() == 7
+
+
+def test_statistics_round_trip():
+    rng = np.random.default_rng(5)
+    df = pd.DataFrame(
+        {
+            "age": rng.integers(18, 80, 400),
+            "salary": rng.normal(50000, 10000, 400).round(2),
+            "name": [f"name {index}" for index in range(400)],
+        }
+    )
+    df.loc[::17, "salary"] = np.nan
+    statistics = StatisticsAccumulator()
+    for chunk in np.array_split(df, 4):
+        statistics.update(chunk)
+
+    # the sketches are stored as JSON between the edits
+    statistics = StatisticsAccumulator.from_dict(json.loads(json.dumps(statistics.to_dict())))
+    statistics.remove(df.iloc[:100])
+    statistics.update(df.iloc[:50], coerce=True)
+    expected = pd.concat([df.iloc[100:], df.iloc[:50]]).select_dtypes(include=["number"])
+
+    result = statistics.result()
+    assert set(result["mean"]) == {"age", "salary"}
+    assert result["approximate"] == {"age": False, "salary": False}
+    assert result["count"] == expected.count().to_dict()
+    for name in ["mean", "std", "min", "max", "median"]:
+        assert result[name] == pytest.approx(getattr(expected, name)().to_dict())
+    assert result["mode"] == expected.mode().iloc[0].to_dict()
+    for column in expected.columns:
+        quartiles = expected[column].quantile(QUARTILES).tolist()
+        assert list(result["quartiles"][column].values()) == pytest.approx(quartiles)
+
+
+def test_statistics_approximate_flag():
+    statistics = StatisticsAccumulator(sketch_size=16)
+    statistics.update(pd.DataFrame({"small": np.arange(10.0), "large": np.arange(10.0)}))
+    statistics.update(pd.DataFrame({"large": np.arange(100.0)}))
+
+    assert statistics.result()["approximate"] == {"small": False, "large": True}
@@ -0,0 +1,182 @@
+import os
+
+import pyarrow as pa
+import pytest
+
+from app.db import db
+from app.tabular_data.models import TabularDataFile
+from app.tabular_data.storage import get_storage
+from config import Config
+
+
+def list_rows(client, tabular_data_file_id, **body):
+    response = client.post(f"/tabular/files/{tabular_data_file_id}", json={"page_size": 100, **body})
+    assert response.status_code == 200, response.json
+    return response.json["rows"]
+
+
+def edit_rows(client, tabular_data_file_id, rows):
+    return client.put(f"/tabular/files/{tabular_data_file_id}", json={"rows": rows})
+
+
+@pytest.mark.parametrize("storage", ["rows", "parquet"])
+def test_edit_integer_column_with_decimal(client, upload, storage):
+    tabular_data_file_id = upload("name,age\na,1\nb,2\nc,3\n", storage=storage).json["id"]
+    row = list_rows(client, tabular_data_file_id)[1]
+
+    response = edit_rows(client, tabular_data_file_id, [{"id": row["id"], "row_data": {"name": "b", "age": 8.5}}])
+
+    assert response.status_code == 200, response.json
+    assert [row["row_data"]["age"] for row in list_rows(client, tabular_data_file_id)] == [1, 8.5, 3]
+
+
+@pytest.fixture
+def parquet_file(upload, monkeypatch):
+    """
+    A parquet file of 6 rows in 3 parts
+    """
+    monkeypatch.setattr(Config, "TABULAR_STREAMING_THRESHOLD", 0)
+    monkeypatch.setattr(Config, "TABULAR_INGESTION_CHUNK_SIZE", 2)
+    response = upload("name,age\na,1\nb,2\nc,3\nd,4\ne,5\nf,6\n", storage="parquet")
+    assert response.status_code == 200, response.json
+    return db.session.get(TabularDataFile, response.json["id"])
+
+
+def part_files(directory):
+    return {name: os.stat(os.path.join(directory, name)).st_ino for name in sorted(os.listdir(directory))}
+
+
+def stored_rows(storage):
+    return [tuple(row.values()) for row in storage.dataset().to_table().sort_by(storage.INDEX_COLUMN).to_pylist()]
+
+
+@pytest.mark.filterwarnings("error::FutureWarning")
+def test_parquet_edit_rewrites_only_the_edited_part(parquet_file):
+    storage = get_storage(parquet_file)
+    parts = part_files(storage.directory)
+    assert list(parts) == ["part-00000.parquet", "part-00001.parquet", "part-00002.parquet"]
+
+    replaced, written = storage.upsert_rows(
+        [{"id": 3, "row_data": {"name": "D", "age": 40}}, {"row_data": {"name": "g"}}]
+    )
+    db.session.commit()
+
+    assert replaced == [{"name": "d", "age": 4}]
+    assert written == [{"name": "D", "age": 40}, {"name": "g", "age": None}]
+    assert stored_rows(storage) == [
+        ("a", 1, 0),
+        ("b", 2, 1),
+        ("c", 3, 2),
+        ("D", 40, 3),
+        ("e", 5, 4),
+        ("f", 6, 5),
+        ("g", None, 6),
+    ]
+    new_parts = part_files(storage.directory)
+    assert list(new_parts) == [*parts, "part-00003.parquet"]
+    assert [new_parts[name] == parts[name] for name in parts] == [True, False, True]
+
+
+def test_parquet_edit_widens_every_part(parquet_file):
+    storage = get_storage(parquet_file)
+
+    storage.upsert_rows([{"id": 0, "row_data": {"name": "a", "age": 1.5}}])
+    db.session.commit()
+
+    assert storage.dataset().schema.field("age").type == pa.float64()
+    assert [row[1] for row in stored_rows(storage)] == [1.5, 2, 3, 4, 5, 6]
+
+
+def test_parquet_edit_rolled_back(parquet_file):
+    storage = get_storage(parquet_file)
+    parts = part_files(storage.directory)
+    rows = stored_rows(storage)
+
+    storage.upsert_rows([{"id": 0, "row_data": {"name": "A", "age": 10}}, {"row_data": {"name": "g", "age": 7}}])
+    db.session.rollback()
+
+    assert part_files(storage.directory) == parts
+    assert stored_rows(storage) == rows
+
+
+@pytest.mark.parametrize("storage", ["rows", "parquet"])
+def test_edit_and_append_rows(client, upload, storage):
+    tabular_data_file_id = upload("name,age\na,1\nb,2\nc,3\n", storage=storage).json["id"]
+    row = list_rows(client, tabular_data_file_id)[0]
+
+    response = edit_rows(
+        client,
+        tabular_data_file_id,
+        [{"id": row["id"], "row_data": {"name": "A", "age": 10}}, {"row_data": {"name": "d", "age": "4"}}],
+    )
+
+    assert response.status_code == 200, response.json
+    assert [row["row_data"] for row in list_rows(client, tabular_data_file_id)] == [
+        {"name": "A", "age": 10},
+        {"name": "b", "age": 2},
+        {"name": "c", "age": 3},
+        {"name": "d", "age": 4},
+    ]
+    assert response.json["statistics"]["mean"]["age"] == pytest.approx(4.75)
+
+
+def test_parquet_delete_rolled_back(parquet_file):
+    directory = get_storage(parquet_file).directory
+    parts = part_files(directory)
+
+    db.session.delete(parquet_file)
+    db.session.flush()
+    db.session.rollback()
+
+    assert part_files(directory) == parts
+
+    db.session.delete(parquet_file)
+    db.session.commit()
+
+    assert not os.path.exists(directory)
+
+
+SCORES = [3, None, 1, 3, None, 2, None, 1, 5, None, 2, 4]
+
+
+def expected_order(descending):
+    scored = sorted((score, index) for index, score in enumerate(SCORES) if score is not None)
+    empty = [index for index, score in enumerate(SCORES) if score is None]
+    if descending:
+        return empty[::-1] + [index for _, index in scored[::-1]]
+    return [index for _, index in scored] + empty
+
+
+@pytest.mark.filterwarnings("error::FutureWarning")
+@pytest.mark.parametrize("storage", ["rows", "parquet"])
+@pytest.mark.parametrize("rows_order_by", ["score", "-score"])
+def test_cursor_pages_across_null_run(client, upload, storage, rows_order_by):
+    csv = "name,score\n" + "".join(f"n{index},{'' if score is None else score}\n" for index, score in enumerate(SCORES))
+    tabular_data_file_id = upload(csv, storage=storage).json["id"]
+    body = {"rows_order_by": rows_order_by, "page_size": 5}
+
+    names, cursor = [], None
+    while True:
+        response = client.post(
+            f"/tabular/files/{tabular_data_file_id}", json={**body, **({"cursor": cursor} if cursor else {})}
+        )
+        assert response.status_code == 200, response.json
+        names.extend(row["row_data"]["name"] for row in response.json["rows"])
+        cursor = response.json["pagination"]["next_cursor"]
+        if cursor is None:
+            break
+    offset_names = [
+        row["row_data"]["name"]
+        for page in (1, 2, 3)
+        for row in client.post(f"/tabular/files/{tabular_data_file_id}", json={**body, "page": page}).json["rows"]
+    ]
+
+    descending = rows_order_by.startswith("-")
+    frames = get_storage(db.session.get(TabularDataFile, tabular_data_file_id)).iter_frames(
+        ["name"], chunksize=5, order_by="score", direction="desc" if descending else "asc"
+    )
+
+    expected = [f"n{index}" for index in expected_order(descending)]
+    assert names == expected
+    assert offset_names == expected
+    assert [index for frame in frames for index in frame.index] == expected_order(descending)
@@ -0,0 +1,145 @@
+import json
+import logging
+import sqlite3
+
+import pytest
+
+from app import cache
+from app.cache import MISSING, TieredCache
+
+
+class Clock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = Clock()
+    monkeypatch.setattr(cache.time, "time", clock)
+    return clock
+
+
+def size(value) -> int:
+    return len(json.dumps(value))
+
+
+def disk_keys(tiered_cache: TieredCache):
+    with sqlite3.connect(tiered_cache.path) as connection:
+        return {row[0] for row in connection.execute("SELECT key FROM entries")}
+
+
+def test_memory_tier_evicts_least_recently_used():
+    memory_cache = TieredCache("test", max_bytes=3 * size("value a"))
+    for name in "abc":
+        memory_cache.set(name, f"value {name}")
+    assert memory_cache.get("a") == "value a"
+
+    memory_cache.set("d", "value d")
+
+    assert [memory_cache.get(name, MISSING) for name in "abcd"] == ["value a", MISSING, "value c", "value d"]
+    assert memory_cache.stats()["memory_bytes"] == 3 * size("value a")
+    # a value over the budget is not cached
+    memory_cache.set("large", "x" * 100)
+    assert memory_cache.get("large") is None and memory_cache.get("a") == "value a"
+
+
+def test_keys_and_none_values():
+    memory_cache = TieredCache("test", max_bytes=1000)
+    memory_cache.set({"file": 1, "filters": [{"header": "age"}]}, [1, 2])
+    assert memory_cache.get({"filters": [{"header": "age"}], "file": 1}) == [1, 2]
+
+    calls = []
+    for _ in range(2):
+        assert memory_cache.get_or_set("empty", lambda: calls.append(1)) is None
+    # the None result is cached, not computed again
+    assert calls == [1]
+    assert memory_cache.get("empty", MISSING) is None
+
+
+def test_disk_tier_shared_by_workers(tmp_path):
+    first = TieredCache("test", max_bytes=1000, disk_max_bytes=1000, directory=str(tmp_path))
+    second = TieredCache("test", max_bytes=1000, disk_max_bytes=1000, directory=str(tmp_path))
+
+    first.set("key", {"mean": 1.5}, tag=7)
+
+    assert second.get("key") == {"mean": 1.5}
+    assert second.get("key") == {"mean": 1.5}
+    assert second.get("other") is None
+    stats = second.stats()
+    assert (stats["disk_hits"], stats["memory_hits"], stats["misses"], stats["hit_rate"]) == (1, 1, 1, 0.6667)
+
+
+def test_invalidate_tag(tmp_path):
+    first = TieredCache("test", max_bytes=1000, disk_max_bytes=1000, directory=str(tmp_path))
+    second = TieredCache("test", max_bytes=1000, disk_max_bytes=1000, directory=str(tmp_path))
+    first.set("a", 1, tag=1)
+    first.set("b", 2, tag=2)
+
+    first.invalidate(1)
+
+    assert [first.get(name) for name in "ab"] == [None, 2]
+    assert [second.get(name) for name in "ab"] == [None, 2]
+
+
+def test_disk_tier_evicts_least_recently_used(tmp_path, clock):
+    disk_cache = TieredCache("test", max_bytes=1000, disk_max_bytes=3 * size("value a"), directory=str(tmp_path))
+    for name in "abc":
+        disk_cache.set(name, f"value {name}")
+        clock.now += TieredCache.ACCESS_INTERVAL + 1
+    # read by another worker, from the disk tier
+    reader = TieredCache("test", max_bytes=1000, disk_max_bytes=1000, directory=str(tmp_path))
+    assert reader.get("a") == "value a"
+    clock.now += TieredCache.ACCESS_INTERVAL + 1
+
+    disk_cache.set("d", "value d")
+
+    assert disk_keys(disk_cache) == {disk_cache.make_key(name) for name in "acd"}
+
+
+def test_disk_access_recorded_once_per_interval(tmp_path, clock):
+    disk_cache = TieredCache("test", max_bytes=1000, disk_max_bytes=1000, directory=str(tmp_path))
+    disk_cache.set("key", 1)
+    key = disk_cache.make_key("key")
+
+    def accessed_at():
+        with sqlite3.connect(disk_cache.path) as connection:
+            return connection.execute("SELECT accessed_at FROM entries WHERE key = ?", (key,)).fetchone()[0]
+
+    reader = TieredCache("test", max_bytes=1000, disk_max_bytes=1000, directory=str(tmp_path))
+    clock.now += 1
+    reader.get("key")
+    assert accessed_at() == 1000.0
+    clock.now += TieredCache.ACCESS_INTERVAL
+    TieredCache("test", max_bytes=1000, disk_max_bytes=1000, directory=str(tmp_path)).get("key")
+    assert accessed_at() == clock.now
+
+
+def test_ttl(tmp_path, clock):
+    ttl_cache = TieredCache("test", max_bytes=1000, disk_max_bytes=1000, directory=str(tmp_path), ttl=10)
+    ttl_cache.set("key", 1)
+    clock.now += 9
+    assert ttl_cache.get("key") == 1
+
+    clock.now += 1
+    assert ttl_cache.get("key") is None
+    assert TieredCache("test", max_bytes=1000, disk_max_bytes=1000, directory=str(tmp_path)).get("key") is None
+    # the expired entries are removed from the disk tier by the next set
+    ttl_cache.set("other", 2)
+    assert disk_keys(ttl_cache) == {ttl_cache.make_key("other")}
+
+
+def test_disk_tier_failure_is_a_miss(tmp_path, caplog):
+    # the directory of the disk tier is a file
+    (tmp_path / "cache").write_text("")
+    broken = TieredCache("test", max_bytes=1000, disk_max_bytes=1000, directory=str(tmp_path / "cache"))
+
+    with caplog.at_level(logging.WARNING, logger="app.cache"):
+        broken.set("key", 1)
+        assert broken.get("key") == 1
+        assert broken.get("other") is None
+
+    assert "The test cache disk tier failed" in caplog.text
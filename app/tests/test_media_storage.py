@@ -0,0 +1,101 @@
+import io
+import os
+from datetime import datetime, timedelta
+
+from app.db import db
+from app.media_storage import MediaBlob, media_store
+from app.tabular_data.models import TabularDataFile
+from config import Config
+
+CSV = "name,age\na,1\nb,2\nc,3\n"
+
+
+def blob_of(path: str) -> MediaBlob:
+    db.session.expire_all()
+    return MediaBlob.query.filter_by(path=path).first()
+
+
+def artifacts_folder(blob: MediaBlob) -> str:
+    return os.path.join(Config.MEDIA_ARTIFACTS_FOLDER, blob.hexdigest)
+
+
+def test_same_content_stored_once(client, upload):
+    first = upload(CSV, name="first.csv").json
+    second = upload(CSV, name="second.csv").json
+
+    assert first["path"] == second["path"]
+    blob = blob_of(first["path"])
+    path, artifacts = blob.path, artifacts_folder(blob)
+    assert MediaBlob.query.count() == 1
+    assert blob.ref_count == 2
+    assert os.path.exists(path) and os.path.isdir(artifacts)
+
+    assert client.delete(f"/tabular/files/{first['id']}").status_code == 204
+    assert blob_of(path).ref_count == 1
+    assert os.path.exists(path)
+
+    # the blob and its artifacts are removed with the last record
+    assert client.delete(f"/tabular/files/{second['id']}").status_code == 204
+    assert blob_of(path) is None
+    assert not os.path.exists(path) and not os.path.exists(artifacts)
+
+
+def test_unreadable_upload_is_discarded(upload):
+    response = upload("name,age\na,1\nb,2,3,4\n")
+
+    assert response.status_code == 400
+    assert MediaBlob.query.count() == 0
+    assert os.listdir(Config.MEDIA_DIR) == []
+
+
+def test_delete_rolled_back(upload):
+    path = upload(CSV).json["path"]
+    tabular_data_file = TabularDataFile.query.filter_by(path=path).first()
+
+    db.session.delete(tabular_data_file)
+    db.session.flush()
+    db.session.rollback()
+
+    assert blob_of(path).ref_count == 1
+    assert os.path.exists(path)
+
+
+def test_path_change_moves_the_reference(upload):
+    first = upload(CSV).json
+    other = upload("name\nz\n").json
+    tabular_data_file = db.session.get(TabularDataFile, first["id"])
+
+    tabular_data_file.path = other["path"]
+    db.session.commit()
+
+    assert blob_of(first["path"]) is None and not os.path.exists(first["path"])
+    assert blob_of(other["path"]).ref_count == 2
+
+
+def test_unused_upload_reference_released(app):
+    # a blob saved by a request that never created its record
+    with app.app_context():
+        blob = media_store.save(io.BytesIO(CSV.encode()), "csv")
+        path = blob.path
+        assert blob.ref_count == 1
+
+    assert blob_of(path) is None
+    assert not os.path.exists(path)
+
+
+def test_collect_garbage(app):
+    os.makedirs(Config.MEDIA_DIR, exist_ok=True)
+    paths = [os.path.join(Config.MEDIA_DIR, name) for name in ["old.csv", "recent.csv"]]
+    for path in paths:
+        with open(path, "w") as file:
+            file.write(CSV)
+    # blobs whose upload failed before their record was created
+    old = datetime.now() - timedelta(seconds=Config.MEDIA_ORPHAN_GRACE_SECONDS + 60)
+    db.session.add(MediaBlob(digest="sha256:old", path=paths[0], ref_count=0, created_at=old))
+    db.session.add(MediaBlob(digest="sha256:recent", path=paths[1], ref_count=0))
+    db.session.commit()
+
+    # the recent blob may be about to be referenced
+    assert media_store.collect_garbage() == 1
+    assert blob_of(paths[0]) is None and not os.path.exists(paths[0])
+    assert blob_of(paths[1]) is not None and os.path.exists(paths[1])
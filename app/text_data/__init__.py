@@ -1,7 +1,12 @@
 from flask import Blueprint
 
+text_blueprint = Blueprint("text", __name__)
+
+from app.text_data import commands  # noqa: F401 registers the flask text cli commands
 from app.text_data.resources import (
     TextAnalysisResource,
+    TextBatchAnalysisResource,
+    TextCacheResource,
     TextCategorizeResource,
     TextSearchResource,
     TextSimilarityResource,
@@ -9,11 +14,13 @@ from app.text_data.resources import (
     TextWordCloudResource,
 )
 
-text_blueprint = Blueprint("text", __name__)
-
 text_blueprint.add_url_rule("/analysis", view_func=TextAnalysisResource.as_view("text_analysis_resource"))
+text_blueprint.add_url_rule(
+    "/analysis/batch", view_func=TextBatchAnalysisResource.as_view("text_batch_analysis_resource")
+)
 text_blueprint.add_url_rule("/categorize", view_func=TextCategorizeResource.as_view("text_categorize_resource"))
 text_blueprint.add_url_rule("/similarity", view_func=TextSimilarityResource.as_view("text_similarity_resource"))
 text_blueprint.add_url_rule("/visualize", view_func=TextVisualizeResource.as_view("text_visualize_resource"))
 text_blueprint.add_url_rule("/search", view_func=TextSearchResource.as_view("text_search_resource"))
+text_blueprint.add_url_rule("/cache", view_func=TextCacheResource.as_view("text_cache_resource"))
 text_blueprint.add_url_rule("/wordcloud", view_func=TextWordCloudResource.as_view("text_wordcloud_resource"))
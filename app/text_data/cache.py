@@ -0,0 +1,63 @@
+import hashlib
+import unicodedata
+from typing import Callable, Tuple
+
+from app.cache import MISSING, TieredCache
+from app.text_data.registry import PIPELINES
+from config import Config
+
+"""
+    This is the cache.py file for the text_data blueprint.
+    it contains the cache of the results of the text endpoints, keyed by the endpoint, the hash of the normalized
+    text, the parameters of the request and the version of the models. the same document submitted again is
+    answered from the cache instead of running the models again, by any worker of the host (see TieredCache).
+"""
+
+# results of the text endpoints, they expire after TEXT_RESULT_CACHE_TTL seconds
+result_cache = TieredCache(
+    "text_results",
+    max_bytes=Config.TEXT_RESULT_CACHE_MAX_BYTES,
+    disk_max_bytes=Config.TEXT_RESULT_CACHE_DISK_MAX_BYTES,
+    directory=Config.CACHE_FOLDER,
+    ttl=Config.TEXT_RESULT_CACHE_TTL,
+)
+
+# a change of the models or of the settings of their stages is a new version, the previous results are not reused
+MODEL_VERSION = TieredCache.make_key(
+    {
+        "pipelines": PIPELINES,
+        "ner": [Config.TEXT_NER_MAX_TOKENS, Config.TEXT_NER_STRIDE, Config.TEXT_NER_AGGREGATION],
+        "summary": [Config.TEXT_SUMMARY_SEGMENT_TOKENS, Config.TEXT_SUMMARY_MAX_SEGMENTS],
+        "version": Config.TEXT_RESULT_CACHE_VERSION,
+    }
+)
+
+
+def normalize_text(text: str) -> str:
+    """
+    The text the results are computed from, the same characters in another unicode form are the same text
+    """
+    return unicodedata.normalize("NFC", text)
+
+
+def result_key(endpoint: str, text: str, params: dict) -> dict:
+    return {
+        "endpoint": endpoint,
+        "text": hashlib.sha256(text.encode()).hexdigest(),
+        "params": params,
+        "model": MODEL_VERSION,
+    }
+
+
+def cached_result(endpoint: str, text: str, params: dict, compute: Callable[[], any]) -> Tuple[any, bool]:
+    """
+    Return the cached result of the endpoint for the (normalized) text and the params, computing and caching it
+    on a miss. returns the result and whether it was a hit.
+    """
+    key = result_key(endpoint, text, params)
+    result = result_cache.get(key, MISSING)
+    if result is not MISSING:
+        return result, True
+    result = compute()
+    result_cache.set(key, result)
+    return result, False
@@ -0,0 +1,21 @@
+import click
+
+from app.text_data import text_blueprint
+from app.text_data.registry import registry
+
+
+@text_blueprint.cli.command("warm-up")
+@click.option(
+    "--model", "names", type=click.Choice(list(registry.loaders)), multiple=True, help="Only load these models."
+)
+def warm_up_command(names):
+    """
+    Load (and download to TEXT_MODELS_CACHE_DIR unless TEXT_MODELS_OFFLINE is set) the text models
+    """
+    for name in names or registry.loaders:
+        try:
+            seconds = registry.warm_up([name])[name]
+        except Exception as e:
+            click.echo(f"{name}: failed, {e}", err=True)
+            continue
+        click.echo(f"{name}: loaded in {seconds}s")
@@ -0,0 +1,331 @@
+import argparse
+import json
+import logging
+import os
+import queue
+import socket
+import subprocess
+import sys
+import threading
+import time
+from concurrent.futures import Future
+from multiprocessing.connection import Client, Listener
+from typing import Dict, List
+
+from app.text_data.registry import PIPELINES, registry
+from config import Config
+
+"""
+    This is the model_server.py file for the text_data blueprint.
+    it contains the inference server of the transformers pipelines, so the models are loaded once per host
+    instead of once per web worker:
+    - ModelServer: a process listening on a Unix socket, loading every pipeline once and batching the inputs of
+        the concurrent requests of all the workers into the same forward passes.
+    - ModelClient: the thin client the TextService calls the pipelines through, one connection per thread.
+    - LocalModels: the pipelines loaded in the process itself, used when no TEXT_MODEL_SERVER_SOCKET is set
+        (eg. `python run.py` or `flask` commands).
+    - ModelServerProcess: runs the server as a separate program and restarts it when it exits.
+    the server is started by the on_starting hook of gunicorn (see gunicorn_config.py), before the workers.
+"""
+
+logger = logging.getLogger(__name__)
+
+
+def run_batch(model, inputs: List[any], **kwargs) -> List[any]:
+    """
+    Run the pipeline over a list of inputs in batches of TEXT_MODEL_BATCH_SIZE, one result per input
+    """
+    return list(model(inputs, batch_size=min(len(inputs), Config.TEXT_MODEL_BATCH_SIZE), **kwargs))
+
+
+class LocalModels:
+    """
+    The pipelines of the model registry, loaded in this process on their first use.
+    """
+
+    @staticmethod
+    def run(name: str, inputs: List[any], **kwargs) -> List[any]:
+        if not inputs:
+            return []
+        return run_batch(registry.get(name), inputs, **kwargs)
+
+
+class ModelBatcher(threading.Thread):
+    """
+    Run the queued inputs of one pipeline together.
+
+        the first queued request is held up to TEXT_MODEL_SERVER_BATCH_WAIT_MS for the requests arriving meanwhile,
+        the inputs of the requests with the same arguments are run as one batch. a batch that fails is run again
+        request by request.
+    """
+
+    def __init__(self, name: str, model):
+        super().__init__(name=f"model-batcher-{name}", daemon=True)
+        self.model = model
+        self.requests = queue.Queue()
+        self.max_inputs = Config.TEXT_MODEL_SERVER_MAX_BATCH
+        self.wait = Config.TEXT_MODEL_SERVER_BATCH_WAIT_MS / 1000
+
+    def submit(self, inputs: List[any], kwargs: Dict[str, any]) -> Future:
+        future = Future()
+        self.requests.put((inputs, kwargs, future))
+        return future
+
+    def run(self):
+        while True:
+            pending = [self.requests.get()]
+            size = len(pending[0][0])
+            deadline = time.monotonic() + self.wait
+            while size < self.max_inputs:
+                try:
+                    pending.append(self.requests.get(timeout=max(deadline - time.monotonic(), 0)))
+                except queue.Empty:
+                    break
+                size += len(pending[-1][0])
+
+            groups = {}
+            for request in pending:
+                groups.setdefault(json.dumps(request[1], sort_keys=True), []).append(request)
+            for group in groups.values():
+                self.run_group(group)
+
+    def run_group(self, group):
+        inputs = [value for request in group for value in request[0]]
+        try:
+            results = run_batch(self.model, inputs, **group[0][1])
+        except Exception as e:
+            if len(group) == 1:
+                group[0][2].set_exception(e)
+                return
+            # the inputs of one request can fail the whole batch, every request is run again on its own so the
+            # failure is only the one of the requests causing it
+            for request in group:
+                self.run_group([request])
+            return
+        offset = 0
+        for request_inputs, _, future in group:
+            future.set_result(results[offset : offset + len(request_inputs)])
+            offset += len(request_inputs)
+
+
+class ModelServer:
+    """
+    Serve the pipelines to the clients connected to the Unix socket, one thread per connection.
+    """
+
+    def __init__(self, socket_path: str, authkey: bytes):
+        if not authkey:
+            # multiprocessing.connection does not authenticate the clients without a key, any local user could send
+            # the pickled requests
+            raise ValueError("The text model server needs a TEXT_MODEL_SERVER_AUTHKEY (or a SECRET_KEY).")
+        self.socket_path = socket_path
+        self.authkey = authkey
+        self.batchers = {}
+        self._lock = threading.Lock()
+
+    def batcher(self, name: str) -> ModelBatcher:
+        batcher = self.batchers.get(name)
+        if batcher is not None:
+            return batcher
+        if name not in PIPELINES:
+            raise ValueError(f"Unknown model {name!r}.")
+        # loaded outside of the lock (the registry loads every model under its own lock), so the models load
+        # concurrently and the requests of the loaded models are not held by the ones still loading
+        model = registry.get(name)
+        with self._lock:
+            if name not in self.batchers:
+                self.batchers[name] = ModelBatcher(name, model)
+                self.batchers[name].start()
+            return self.batchers[name]
+
+    def serve_forever(self):
+        if os.path.exists(self.socket_path):
+            if socket_in_use(self.socket_path):
+                raise RuntimeError(f"The socket {self.socket_path} is in use by another text model server.")
+            # the socket of a previous server that exited
+            os.remove(self.socket_path)
+        # the socket is created accessible to this user only, it is never open to the others
+        umask = os.umask(0o077)
+        try:
+            listener = Listener(self.socket_path, family="AF_UNIX", authkey=self.authkey)
+        finally:
+            os.umask(umask)
+        with listener:
+            for name in PIPELINES:
+                # loaded in the background, the first requests wait for their model
+                threading.Thread(target=self.batcher, args=(name,), daemon=True).start()
+            logger.info("The text model server is listening on %s", self.socket_path)
+            while True:
+                try:
+                    connection = listener.accept()
+                except Exception as e:
+                    # a client that failed the authentication
+                    logger.warning("Refused a text model server connection: %s", e)
+                    continue
+                threading.Thread(target=self.handle, args=(connection,), daemon=True).start()
+
+    def handle(self, connection):
+        with connection:
+            while True:
+                try:
+                    name, inputs, kwargs = connection.recv()
+                except (EOFError, OSError):
+                    return
+                try:
+                    connection.send(("ok", self.batcher(name).submit(inputs, kwargs).result()))
+                except Exception as e:
+                    connection.send(("error", f"{type(e).__name__}: {e}"))
+
+
+class ModelClient:
+    """
+    Call the pipelines of the model server, the connections are kept per thread and reopened after a failure.
+    """
+
+    def __init__(self, socket_path: str, authkey: bytes):
+        self.socket_path = socket_path
+        self.authkey = authkey
+        self._local = threading.local()
+
+    def connect(self):
+        deadline = time.monotonic() + Config.TEXT_MODEL_SERVER_CONNECT_TIMEOUT
+        while True:
+            try:
+                return Client(self.socket_path, family="AF_UNIX", authkey=self.authkey)
+            except (FileNotFoundError, ConnectionRefusedError):
+                # the server is still starting
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"The text model server is not reachable on {self.socket_path}.")
+                time.sleep(0.1)
+
+    def run(self, name: str, inputs: List[any], **kwargs) -> List[any]:
+        if not inputs:
+            return []
+        connection = getattr(self._local, "connection", None)
+        if connection is None:
+            connection = self._local.connection = self.connect()
+        try:
+            connection.send((name, inputs, kwargs))
+            if not connection.poll(Config.TEXT_MODEL_SERVER_TIMEOUT):
+                raise TimeoutError(f"The text model server did not answer in {Config.TEXT_MODEL_SERVER_TIMEOUT}s.")
+            status, result = connection.recv()
+        except BaseException:
+            # the answer of an interrupted call must not be read by the next one
+            self._local.connection = None
+            connection.close()
+            raise
+        if status != "ok":
+            raise RuntimeError(result)
+        return result
+
+
+def model_server_authkey() -> bytes:
+    return (Config.TEXT_MODEL_SERVER_AUTHKEY or Config.SECRET_KEY or "").encode()
+
+
+def socket_in_use(socket_path: str) -> bool:
+    """
+    Whether a server accepts connections on the Unix socket
+    """
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+        try:
+            client.connect(socket_path)
+        except OSError:
+            return False
+    return True
+
+
+def serve(socket_path: str, authkey: bytes):
+    logging.basicConfig(level=logging.INFO)
+    ModelServer(socket_path, authkey).serve_forever()
+
+
+class ModelServerProcess:
+    """
+    The model server run in a new python program (see main), supervised by a thread of the process that
+    started it (the gunicorn arbiter) and restarted whenever it exits.
+
+        it is not a multiprocessing child: the workers forked from the arbiter would inherit it as their own child
+        and terminate it when they exit (reload, max_requests recycling, graceful restart).
+        the key of the server is passed in the TEXT_MODEL_SERVER_AUTHKEY environment variable.
+    """
+
+    def __init__(self, socket_path: str = None, check_interval: float = 1.0):
+        self.socket_path = socket_path or Config.TEXT_MODEL_SERVER_SOCKET
+        self.check_interval = check_interval
+        self.process = None
+        self._stopping = threading.Event()
+        self._supervisor = None
+        # the supervisor does not restart the server while it is being stopped
+        self._lock = threading.Lock()
+
+    @property
+    def pid(self) -> int:
+        return self.process.pid if self.process is not None else None
+
+    def spawn(self):
+        self.process = subprocess.Popen(
+            [sys.executable, "-c", "from app.text_data.model_server import main; main()", "--socket", self.socket_path],
+            env={**os.environ, "TEXT_MODEL_SERVER_AUTHKEY": model_server_authkey().decode()},
+        )
+
+    def start(self):
+        self.spawn()
+        self._supervisor = threading.Thread(target=self.supervise, name="text-model-server-supervisor", daemon=True)
+        self._supervisor.start()
+        return self
+
+    def supervise(self):
+        while not self._stopping.wait(self.check_interval):
+            with self._lock:
+                returncode = self.process.poll()
+                if returncode is not None and not self._stopping.is_set():
+                    logger.warning("The text model server exited (%s), restarting it", returncode)
+                    self.spawn()
+
+    def stop(self, timeout: float = 10):
+        with self._lock:
+            self._stopping.set()
+        if self.process is None or self.process.poll() is not None:
+            return
+        self.process.terminate()
+        try:
+            self.process.wait(timeout)
+        except subprocess.TimeoutExpired:
+            self.process.kill()
+            self.process.wait()
+        # the server terminated by the signal does not remove its socket
+        if os.path.exists(self.socket_path) and not socket_in_use(self.socket_path):
+            os.remove(self.socket_path)
+
+
+def main(argv: List[str] = None):
+    parser = argparse.ArgumentParser(description="Serve the text models on a Unix socket.")
+    parser.add_argument(
+        "--socket", default=Config.TEXT_MODEL_SERVER_SOCKET, required=not Config.TEXT_MODEL_SERVER_SOCKET
+    )
+    serve(parser.parse_args(argv).socket, model_server_authkey())
+
+
+def start_model_server(socket_path: str = None) -> ModelServerProcess:
+    """
+    Start the supervised model server, returns its ModelServerProcess
+    """
+    return ModelServerProcess(socket_path).start()
+
+
+_models = None
+
+
+def get_models():
+    """
+    The pipelines of the process: the client of the model server when TEXT_MODEL_SERVER_SOCKET is set,
+    the pipelines loaded in the process otherwise
+    """
+    global _models
+    if _models is None:
+        if Config.TEXT_MODEL_SERVER_SOCKET:
+            _models = ModelClient(Config.TEXT_MODEL_SERVER_SOCKET, model_server_authkey())
+        else:
+            _models = LocalModels()
+    return _models
@@ -0,0 +1,109 @@
+from typing import List, Tuple
+
+from app.text_data.model_server import get_models
+from app.text_data.registry import registry
+from config import Config
+
+"""
+    This is the ner.py file for the text_data blueprint.
+    it contains the EntityRecognizer of the named entities of a text of any length: the text is split on token
+    boundaries into windows of up to the max sequence length of the model, overlapping by TEXT_NER_STRIDE tokens,
+    and all the windows are run as padded batches through the entity_recognizer pipeline in one call.
+    the sub-word tokens are merged into entities by the aggregation strategy of the pipeline, and the entities
+    found twice in the overlap of two windows are kept once, from the window they are the most central in.
+"""
+
+
+class EntityRecognizer:
+    """
+    Find the named entities of a text, their offsets are the ones of the original text.
+    """
+
+    def __init__(self, max_tokens: int = None, stride: int = None, aggregation_strategy: str = None):
+        self.max_tokens = max_tokens or Config.TEXT_NER_MAX_TOKENS
+        self.stride = Config.TEXT_NER_STRIDE if stride is None else stride
+        self.aggregation_strategy = aggregation_strategy or Config.TEXT_NER_AGGREGATION
+
+    @property
+    def tokenizer(self):
+        return registry.get("entity_recognizer_tokenizer")
+
+    def window_size(self) -> int:
+        """
+        The number of tokens of a window, without the special tokens the pipeline adds
+        """
+        max_length = min(self.max_tokens, self.tokenizer.model_max_length)
+        return max_length - self.tokenizer.num_special_tokens_to_add()
+
+    def windows(self, text: str) -> List[Tuple[int, int]]:
+        """
+        The (start, end) character spans of the windows of the text, a window never ends in the middle of a word
+        """
+        encoding = self.tokenizer(text, add_special_tokens=False, return_offsets_mapping=True)
+        offsets = encoding["offset_mapping"]
+        word_ids = encoding.word_ids()
+        size = self.window_size()
+        spans = []
+        start = 0
+        while start < len(offsets):
+            end = min(start + size, len(offsets))
+            # the tokens of a word stay in the same window, unless the word alone is longer than a window
+            while start + 1 < end < len(offsets) and word_ids[end] == word_ids[end - 1]:
+                end -= 1
+            spans.append((offsets[start][0], offsets[end - 1][1]))
+            if end == len(offsets):
+                break
+            next_start = max(end - self.stride, start + 1)
+            while start + 1 < next_start and word_ids[next_start] == word_ids[next_start - 1]:
+                next_start -= 1
+            start = next_start
+        return spans
+
+    def recognize(self, text: str) -> List[dict]:
+        return self.recognize_many([text])[0]
+
+    def recognize_many(self, texts: List[str]) -> List[List[dict]]:
+        """
+        The entities of every text, the windows of all the texts are run in the same batches
+        """
+        spans = [self.windows(text) for text in texts]
+        results = iter(
+            get_models().run(
+                "entity_recognizer",
+                [text[start:end] for text, text_spans in zip(texts, spans) for start, end in text_spans],
+                aggregation_strategy=self.aggregation_strategy,
+            )
+        )
+        return [
+            self.merge(text, text_spans, [next(results) for _ in text_spans]) for text, text_spans in zip(texts, spans)
+        ]
+
+    @staticmethod
+    def merge(text: str, spans: List[Tuple[int, int]], results: List[List[dict]]) -> List[dict]:
+        """
+        The entities of the windows of the text, with the offsets of the text
+        """
+        entities = []
+        for index, ((start, end), result) in enumerate(zip(spans, results)):
+            # the entities of an overlap belong to the window they are the most central in: the one before the
+            # middle of the overlap, or the one after it
+            lower = (spans[index - 1][1] + start) / 2 if index > 0 else 0
+            upper = (end + spans[index + 1][0]) / 2 if index + 1 < len(spans) else len(text)
+            for entity in result:
+                entity_start, entity_end = start + entity["start"], start + entity["end"]
+                if not lower <= entity_start < upper:
+                    continue
+                entities.append(
+                    {
+                        # the label of an aggregated entity is its entity_group
+                        "entity": entity.get("entity_group", entity.get("entity")),
+                        "score": float(entity["score"]),
+                        "start": entity_start,
+                        "end": entity_end,
+                        "word": text[entity_start:entity_end],
+                    }
+                )
+        return entities
+
+
+entity_recognizer = EntityRecognizer()
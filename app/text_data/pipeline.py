@@ -0,0 +1,158 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Dict, Iterator, List
+
+from app.cache import MISSING
+from app.text_data.cache import result_cache, result_key
+from app.text_data.model_server import get_models
+from app.text_data.ner import entity_recognizer
+from app.text_data.service import TextService
+from app.text_data.summarization import summarizer
+from config import Config
+
+"""
+    This is the pipeline.py file for the text_data blueprint.
+    it contains the TextAnalysis run by the text analysis endpoint: the text is tokenized once (words, sentences,
+    paragraphs, terms, see the artifacts of TextService) and every stage consumes these shared artifacts.
+    the model stages (sentiment, entities, summary) and the keywords are independent, they run concurrently in
+    a thread pool shared by the requests of the process.
+    the BatchTextAnalysis of the batch endpoint runs every model stage over the texts of many documents at once.
+"""
+
+# the stages run concurrently, by name of the field of the analysis
+MODEL_STAGES = {
+    "sentiment": TextService.analyze_sentiment_transformers,
+    "entities": TextService.get_named_entities,
+    "keywords": TextService.get_keywords,
+    "summary": TextService.summarize_text,
+}
+# the counters, computed from the shared artifacts while the model stages run
+COUNTER_STAGES = {
+    "word_count": TextService.get_word_count,
+    "character_count": TextService.get_character_count,
+    "sentence_count": TextService.get_sentence_count,
+    "paragraph_count": TextService.get_paragraph_count,
+}
+# the stages over many texts, one result per text, the models run the texts of all the documents in batches
+BATCH_STAGES = {
+    "sentiment": lambda text_services: [
+        [result]
+        for result in get_models().run(
+            "sentiment_analyzer", [service.text for service in text_services], truncation=True
+        )
+    ],
+    "entities": lambda text_services: entity_recognizer.recognize_many([service.text for service in text_services]),
+    "keywords": lambda text_services: [service.get_keywords() for service in text_services],
+    "summary": lambda text_services: summarizer.summarize_many(
+        [service.text for service in text_services], [service.sentences for service in text_services]
+    ),
+}
+# every field of an analysis, in the order of the response
+ANALYSES = ("sentiment", "entities", "keywords", "summary", *COUNTER_STAGES)
+
+_executor = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=Config.TEXT_ANALYSIS_WORKERS, thread_name_prefix="text-analysis")
+    return _executor
+
+
+class TextAnalysis:
+    """
+    Analyse a text in one pass, the seconds every stage took are kept in timings.
+    """
+
+    def __init__(self, text_service: TextService):
+        self.text_service = text_service
+        self.timings: Dict[str, float] = {}
+
+    def timed(self, stage: str, function: Callable[[TextService], any]):
+        started = time.perf_counter()
+        try:
+            return function(self.text_service)
+        finally:
+            self.timings[stage] = round(time.perf_counter() - started, 4)
+
+    def tokenize(self):
+        """
+        Compute the shared artifacts before the stages read them concurrently
+        """
+        for artifact in ("words", "sentences", "paragraphs", "terms"):
+            getattr(self.text_service, artifact)
+
+    def run(self) -> dict:
+        started = time.perf_counter()
+        self.timed("tokenize", lambda text_service: self.tokenize())
+        futures = {
+            stage: get_executor().submit(self.timed, stage, function) for stage, function in MODEL_STAGES.items()
+        }
+        analysis = {"text": self.text_service.text}
+        for stage, function in COUNTER_STAGES.items():
+            analysis[stage] = self.timed(stage, function)
+        for stage, future in futures.items():
+            analysis[stage] = future.result()
+        self.timings["total"] = round(time.perf_counter() - started, 4)
+        return analysis
+
+
+class BatchTextAnalysis:
+    """
+    Analyse many texts, streaming the analysis of every document once it is done.
+
+        the documents are analysed TEXT_BATCH_CHUNK_DOCUMENTS at a time, the stages of a chunk run concurrently
+        and each model stage runs over all the texts of the chunk. the documents whose analysis is cached (see
+        the analysis endpoint) are answered first.
+    """
+
+    def __init__(self, texts: List[str], analyses: List[str] = None, chunk_size: int = None):
+        self.texts = texts
+        self.analyses = [analysis for analysis in ANALYSES if analysis in (analyses or ANALYSES)]
+        self.chunk_size = chunk_size or Config.TEXT_BATCH_CHUNK_DOCUMENTS
+
+    def analyse(self, text_services: List[TextService]) -> List[dict]:
+        futures = {
+            stage: get_executor().submit(BATCH_STAGES[stage], text_services)
+            for stage in self.analyses
+            if stage in BATCH_STAGES
+        }
+        analyses = [{"text": service.text} for service in text_services]
+        for stage, function in COUNTER_STAGES.items():
+            if stage in self.analyses:
+                for analysis, service in zip(analyses, text_services):
+                    analysis[stage] = function(service)
+        for stage, future in futures.items():
+            for analysis, result in zip(analyses, future.result()):
+                analysis[stage] = result
+        return analyses
+
+    def stream(self) -> Iterator[dict]:
+        """
+        Yield {"index": <index of the document>, <analyses>} per document, or {"index", "error"} for the
+        documents of a chunk that failed
+        """
+        # a complete analysis is the one cached by the analysis endpoint
+        complete = len(self.analyses) == len(ANALYSES)
+        for start in range(0, len(self.texts), self.chunk_size):
+            pending = []
+            for index in range(start, min(start + self.chunk_size, len(self.texts))):
+                cached = result_cache.get(result_key("analysis", self.texts[index], {}), MISSING)
+                if cached is MISSING:
+                    pending.append(index)
+                else:
+                    yield {"index": index, **{analysis: cached[analysis] for analysis in self.analyses}}
+            if not pending:
+                continue
+
+            try:
+                analyses = self.analyse([TextService(self.texts[index]) for index in pending])
+            except Exception as e:
+                for index in pending:
+                    yield {"index": index, "error": str(e)}
+                continue
+            for index, analysis in zip(pending, analyses):
+                if complete:
+                    result_cache.set(result_key("analysis", self.texts[index], {}), analysis)
+                yield {"index": index, **{name: analysis[name] for name in self.analyses}}
@@ -0,0 +1,150 @@
+import logging
+import os
+import threading
+import time
+from typing import Callable, Dict, Iterable
+
+from config import Config
+
+"""
+    This is the registry.py file for the text_data blueprint.
+    it contains the ModelRegistry of the models and resources of the text analysis: the transformers pipelines
+    (and their tokenizers), the VADER lexicon and the punkt sentence tokenizer. each one is loaded on its first
+    use (or by an explicit warm up, see `flask text warm-up`) from the local cache directory TEXT_MODELS_CACHE_DIR,
+    importing the app neither loads nor downloads anything.
+"""
+
+logger = logging.getLogger(__name__)
+
+# the transformers pipelines, by name
+PIPELINES = {
+    "summarizer": {
+        "task": "summarization",
+        "model": "facebook/bart-base",
+        "tokenizer": "facebook/bart-base",
+        "framework": "pt",
+    },
+    "entity_recognizer": {
+        "task": "ner",
+        "model": "dbmdz/bert-large-cased-finetuned-conll03-english",
+        "tokenizer": "dbmdz/bert-large-cased-finetuned-conll03-english",
+    },
+    "sentiment_analyzer": {
+        "task": "sentiment-analysis",
+        "model": "distilbert-base-uncased",
+        "tokenizer": "distilbert-base-uncased",
+    },
+}
+
+
+class ModelRegistry:
+    """
+    Load the registered models on their first use, once per process.
+
+        a model is loaded under its own lock, so the first requests of different models load them concurrently
+        and the concurrent first requests of the same model wait for one load.
+    """
+
+    def __init__(self):
+        self.loaders: Dict[str, Callable[[], any]] = {}
+        self.models = {}
+        self.load_seconds = {}
+        self._locks = {}
+        self._lock = threading.Lock()
+
+    def register(self, name: str, loader: Callable[[], any]):
+        self.loaders[name] = loader
+
+    def get(self, name: str):
+        model = self.models.get(name)
+        if model is not None:
+            return model
+        if name not in self.loaders:
+            raise ValueError(f"Unknown model {name!r}.")
+        with self._lock:
+            lock = self._locks.setdefault(name, threading.Lock())
+        with lock:
+            if name not in self.models:
+                started = time.perf_counter()
+                self.models[name] = self.loaders[name]()
+                self.load_seconds[name] = round(time.perf_counter() - started, 3)
+                logger.info("Loaded the text model %s in %ss", name, self.load_seconds[name])
+        return self.models[name]
+
+    def is_loaded(self, name: str) -> bool:
+        return name in self.models
+
+    def warm_up(self, names: Iterable[str] = None) -> Dict[str, float]:
+        """
+        Load the models (all of them by default), returns the seconds each one took to load
+        """
+        names = list(names or self.loaders)
+        for name in names:
+            self.get(name)
+        return {name: self.load_seconds.get(name, 0.0) for name in names}
+
+
+def hub_kwargs() -> dict:
+    # the models, their configs and their tokenizers are all read from the cache directory
+    kwargs = {"cache_dir": os.path.join(Config.TEXT_MODELS_CACHE_DIR, "huggingface")}
+    if Config.TEXT_MODELS_OFFLINE:
+        kwargs["local_files_only"] = True
+    return kwargs
+
+
+def load_pipeline(name: str):
+    # transformers (and torch) are only imported by the processes using the pipelines
+    from transformers import pipeline
+
+    return pipeline(**PIPELINES[name], model_kwargs=hub_kwargs())
+
+
+def load_tokenizer(name: str):
+    """
+    The (fast) tokenizer of the pipeline alone, the web workers split the texts with it without loading the model
+    """
+    from transformers import AutoTokenizer
+
+    return AutoTokenizer.from_pretrained(PIPELINES[name]["tokenizer"], use_fast=True, **hub_kwargs())
+
+
+def nltk_resource(path: str, package: str):
+    """
+    Find the NLTK resource in the cache directory, downloading its package there unless TEXT_MODELS_OFFLINE is set
+    """
+    import nltk
+
+    data_dir = os.path.join(Config.TEXT_MODELS_CACHE_DIR, "nltk_data")
+    if data_dir not in nltk.data.path:
+        nltk.data.path.insert(0, data_dir)
+    try:
+        return nltk.data.find(path)
+    except LookupError:
+        if Config.TEXT_MODELS_OFFLINE:
+            raise LookupError(
+                f"The NLTK resource {package!r} is not in {data_dir}, run `flask text warm-up` with network access."
+            )
+    nltk.download(package, download_dir=data_dir, quiet=True)
+    return nltk.data.find(path)
+
+
+def load_vader():
+    nltk_resource("sentiment/vader_lexicon.zip", "vader_lexicon")
+    from nltk.sentiment.vader import SentimentIntensityAnalyzer
+
+    return SentimentIntensityAnalyzer()
+
+
+def load_sentence_tokenizer():
+    nltk_resource("tokenizers/punkt_tab/english/", "punkt_tab")
+    from nltk import sent_tokenize
+
+    return sent_tokenize
+
+
+registry = ModelRegistry()
+for pipeline_name in PIPELINES:
+    registry.register(pipeline_name, lambda name=pipeline_name: load_pipeline(name))
+    registry.register(f"{pipeline_name}_tokenizer", lambda name=pipeline_name: load_tokenizer(name))
+registry.register("vader", load_vader)
+registry.register("sentence_tokenizer", load_sentence_tokenizer)
@@ -1,10 +1,18 @@
-from flask import request, send_file
-from flask_restful import Resource, reqparse
+import base64
+import io
+import json
+import os
+
+from flask import Response, request, send_file, stream_with_context
+from flask_restful import Resource, inputs, reqparse
 from marshmallow import ValidationError
 from werkzeug.exceptions import BadRequest
 
+from app.text_data.cache import cached_result, normalize_text, result_cache
+from app.text_data.pipeline import BatchTextAnalysis, TextAnalysis
 from app.text_data.schemas import (
     TextAnalysisResponseSchema,
+    TextBatchAnalysisRequestSchema,
     TextCategorizeRequestSchema,
     TextSimilarityRequestSchema,
     TextVisualizeRequestSchema,
@@ -17,20 +25,42 @@ class TextAnalysisResource(Resource):
     def post(self):
         parser = reqparse.RequestParser()
         parser.add_argument("text", type=str, required=True, help="Text is required")
+        parser.add_argument(
+            "debug", type=inputs.boolean, location="args", default=False, help="Report the seconds of every stage."
+        )
         try:
             args = parser.parse_args()
         except BadRequest as e:
             return e.data, e.code
         except Exception as e:
             return {"message": str(e)}, 400
-        text = args["text"]
+        text = normalize_text(args["text"])
         if len(text) < 50:
             return {"message": "Text must be at least 50 characters long"}, 400
-        text_service = TextService(text)
-        response = TextAnalysisResponseSchema().dump(text_service)
+        text_analysis = TextAnalysis(TextService(text))
+        analysis, hit = cached_result("analysis", text, {}, text_analysis.run)
+        if args["debug"]:
+            # the stages did not run for a cached analysis
+            analysis["debug"] = {"cache": "hit" if hit else "miss", "timings": text_analysis.timings}
+        response = TextAnalysisResponseSchema().dump(analysis)
         return response
 
 
+class TextBatchAnalysisResource(Resource):
+
+    def post(self):
+        try:
+            body = TextBatchAnalysisRequestSchema().load(request.get_json())
+        except ValidationError as e:
+            return e.messages, 400
+        except Exception as e:
+            return {"message": str(e)}, 400
+        batch_analysis = BatchTextAnalysis([normalize_text(text) for text in body["documents"]], body["analyses"])
+        # one JSON line per document, in the order they are done (see the index of every line)
+        lines = (json.dumps(analysis, default=float) + "\n" for analysis in batch_analysis.stream())
+        return Response(stream_with_context(lines), mimetype="application/x-ndjson")
+
+
 class TextVisualizeResource(Resource):
 
     def post(self):
@@ -59,11 +89,15 @@ class TextWordCloudResource(Resource):
             return e.data, e.code
         except Exception as e:
             return {"message": str(e)}, 400
-        text = args["text"]
+        text = normalize_text(args["text"])
         if len(text) < 50:
             return {"message": "Text must be at least 50 characters long"}, 400
         text_service = TextService(text)
-        return send_file(text_service.generate_word_cloud(), download_name="word_cloud.png", as_attachment=True)
+        # the image is cached base64 encoded
+        image, _ = cached_result(
+            "wordcloud", text, {}, lambda: base64.b64encode(text_service.generate_word_cloud().getvalue()).decode()
+        )
+        return send_file(io.BytesIO(base64.b64decode(image)), download_name="word_cloud.png", as_attachment=True)
 
 
 class TextSearchResource(Resource):
@@ -79,14 +113,15 @@ class TextSearchResource(Resource):
         except Exception as e:
             return {"message": str(e)}, 400
 
-        text = args["text"]
+        text = normalize_text(args["text"])
         query = args["query"]
         if len(text) < 50:
             return {"message": "Text must be at least 50 characters long"}, 400
         if len(query) < 3:
             return {"message": "Query must be at least 3 characters long"}, 400
         text_service = TextService(text)
-        return text_service.search_text(query)
+        results, _ = cached_result("search", text, {"query": query}, lambda: text_service.search_text(query))
+        return results
 
 
 class TextSimilarityResource(Resource):
@@ -98,10 +133,10 @@ class TextSimilarityResource(Resource):
             return e.data, e.code
         except Exception as e:
             return {"message": str(e)}, 400
-        text = body["text"]
-        texts = body["texts"]
+        text = normalize_text(body["text"])
+        texts = [normalize_text(other) for other in body["texts"]]
         text_service = TextService(text)
-        result = text_service.get_similarity(texts)
+        result, _ = cached_result("similarity", text, {"texts": texts}, lambda: text_service.get_similarity(texts))
         return {"similarity": result}
 
 
@@ -114,5 +149,19 @@ class TextCategorizeResource(Resource):
             return e.messages, 400
         except Exception as e:
             return {"message": str(e)}, 400
-        text_service = TextService(body["text"])
-        return text_service.categorize_text(body["categories"])
+        text = normalize_text(body["text"])
+        text_service = TextService(text)
+        scores, _ = cached_result(
+            "categorize",
+            text,
+            {"categories": body["categories"]},
+            lambda: text_service.categorize_text(body["categories"]),
+        )
+        return scores
+
+
+class TextCacheResource(Resource):
+
+    def get(self):
+        # the counters are the ones of the worker answering
+        return {**result_cache.stats(), "pid": os.getpid()}
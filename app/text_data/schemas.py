@@ -1,19 +1,25 @@
 from marshmallow import Schema, fields, validate
 
-from app.text_data.service import TextService
+from app.text_data.pipeline import ANALYSES
+from config import Config
 
 
 class TextAnalysisResponseSchema(Schema):
-
-    text = fields.Method("get_text")
-    sentiment = fields.Method("get_sentiment")
-    entities = fields.Method("get_entities")
-    keywords = fields.Method("get_keywords")
-    summary = fields.Method("get_summary")
-    word_count = fields.Method("get_word_count")
-    character_count = fields.Method("get_character_count")
-    sentence_count = fields.Method("get_sentence_count")
-    paragraph_count = fields.Method("get_paragraph_count")
+    """
+    The analysis of a text, computed in one pass by TextAnalysis
+    """
+
+    text = fields.Str()
+    sentiment = fields.Raw()
+    entities = fields.Raw()
+    keywords = fields.List(fields.Str())
+    summary = fields.Str()
+    word_count = fields.Int()
+    character_count = fields.Int()
+    sentence_count = fields.Int()
+    paragraph_count = fields.Int()
+    # the seconds every stage took, only with ?debug=true
+    debug = fields.Dict()
 
     class Meta:
         fields = (
@@ -26,35 +32,9 @@ class TextAnalysisResponseSchema(Schema):
             "character_count",
             "sentence_count",
             "paragraph_count",
+            "debug",
         )
 
-    def get_text(self, obj: TextService):
-        return obj.text
-
-    def get_sentiment(self, obj: TextService):
-        return obj.analyze_sentiment_transformers()
-
-    def get_entities(self, obj: TextService):
-        return obj.get_named_entities()
-
-    def get_keywords(self, obj: TextService):
-        return obj.get_keywords()
-
-    def get_summary(self, obj: TextService):
-        return obj.summarize_text()
-
-    def get_word_count(self, obj: TextService):
-        return obj.get_word_count()
-
-    def get_character_count(self, obj: TextService):
-        return obj.get_character_count()
-
-    def get_sentence_count(self, obj: TextService):
-        return obj.get_sentence_count()
-
-    def get_paragraph_count(self, obj: TextService):
-        return obj.get_paragraph_count()
-
 
 # category will be Dict[str, List[str]] where key is the category name and value is a list of texts
 
@@ -84,3 +64,20 @@ TextVisualizeRequestSchema = Schema.from_dict(
 )
 
 TextSimilarityRequestSchema = TextVisualizeRequestSchema
+
+TextBatchAnalysisRequestSchema = Schema.from_dict(
+    {
+        "documents": fields.List(
+            fields.Str(validate=validate.Length(min=50)),
+            required=True,
+            description="Texts to analyse",
+            validate=validate.Length(min=1, max=Config.TEXT_BATCH_MAX_DOCUMENTS),
+        ),
+        "analyses": fields.List(
+            fields.Str(validate=validate.OneOf(ANALYSES)),
+            load_default=lambda: list(ANALYSES),
+            description="Analyses of every document, all of them by default",
+            validate=validate.Length(min=1),
+        ),
+    }
+)
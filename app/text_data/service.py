@@ -1,39 +1,23 @@
 import re
+from functools import cached_property
 from io import BytesIO
 from typing import Dict, List
 
-import nltk
 import numpy as np
-from matplotlib import pyplot as plt
-from nltk.sentiment.vader import SentimentIntensityAnalyzer
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.manifold import TSNE
-from sklearn.metrics.pairwise import cosine_similarity
-from transformers import pipeline
-from wordcloud import WordCloud
-
-# Initialize NLTK resources
-nltk.download("vader_lexicon")
-nltk.download("punkt")
-nltk.download("punkt_tab")
-
-# Initialize transformers for summarization, named entity recognition, and sentiment analysis
-summarizer = pipeline(
-    "summarization", model="facebook/bart-base", tokenizer="facebook/bart-base", framework="pt"
-)  # replace with "facebook/bart-base" for better results
-entity_recognizer = pipeline(
-    "ner",
-    model="dbmdz/bert-large-cased-finetuned-conll03-english",
-    tokenizer="dbmdz/bert-large-cased-finetuned-conll03-english",
-)
-sentiment_analyzer = pipeline(
-    "sentiment-analysis", model="distilbert-base-uncased", tokenizer="distilbert-base-uncased"
-)
-
-# Initialize sentiment analyzer
-sia = SentimentIntensityAnalyzer()
-
-# Initialize TF-IDF Vectorizer
+
+from app.text_data.model_server import get_models
+from app.text_data.ner import entity_recognizer
+from app.text_data.registry import registry
+from app.text_data.summarization import summarizer
+
+# the NLTK resources (vader, sentence_tokenizer) are loaded by the registry on their first use, and sklearn,
+# matplotlib and wordcloud are imported by the methods using them, so importing the service stays fast.
+# the transformers pipelines (summarizer, entity_recognizer, sentiment_analyzer) are loaded once per host by the
+# model server, or in this process on their first use when there is no model server
+models = get_models()
+
+# the terms of the TF-IDF vectorizers (their default token pattern)
+TERM_PATTERN = re.compile(r"(?u)\b\w\w+\b")
 
 
 class TextService:
@@ -44,40 +28,62 @@ class TextService:
         assert isinstance(text, str), "Text must be a string"
         self.text = text
 
+    # the artifacts of the text shared by the analyses, each one is computed once (see TextAnalysis)
+
+    @cached_property
+    def words(self) -> List[str]:
+        return self.text.split()
+
+    @cached_property
+    def sentences(self) -> List[str]:
+        return registry.get("sentence_tokenizer")(self.text)
+
+    @cached_property
+    def paragraphs(self) -> List[str]:
+        return self.text.split("\n")
+
+    @cached_property
+    def normalized_text(self) -> str:
+        return self.text.lower()
+
+    @cached_property
+    def terms(self) -> List[str]:
+        """
+        The lowercased terms of the text without the english stop words, as the TF-IDF vectorizers tokenize it
+        """
+        from sklearn.feature_extraction.text import ENGLISH_STOP_WORDS
+
+        return [term for term in TERM_PATTERN.findall(self.normalized_text) if term not in ENGLISH_STOP_WORDS]
+
     def get_word_count(self):
-        return len(self.text.split())
+        return len(self.words)
 
     def get_character_count(self):
         return len(self.text)
 
     def get_sentence_count(self):
-        return len(nltk.sent_tokenize(self.text))
+        return len(self.sentences)
 
     def get_paragraph_count(self):
-        return len(self.text.split("\n"))
+        return len(self.paragraphs)
 
     def summarize_text(self, max_length: int = 100, min_length: int = 50):
-        length = self.get_word_count()
-        if length < 200:
-            length_penalty = 1.5
-        elif length < 500:
-            length_penalty = 1.2
-        else:
-            length_penalty = 1.0
-
-        return summarizer(self.text, max_length=max_length, min_length=min_length, length_penalty=length_penalty)[0][
-            "summary_text"
-        ]
+        # the texts longer than the input window of the model are summarized by map-reduce (see Summarizer)
+        return summarizer.summarize(self.text, self.sentences, max_length=max_length, min_length=min_length)
 
     def analyze_sentiment(self):
-        return sia.polarity_scores(self.text)
+        return registry.get("vader").polarity_scores(self.text)
 
     def analyze_sentiment_transformers(self):
-        return sentiment_analyzer(self.text)
+        # the texts longer than the input window of the model are truncated to it
+        return models.run("sentiment_analyzer", [self.text], truncation=True)
 
     def get_keywords(self, n_keywords: int = 10) -> List[str]:
-        vectorizer = TfidfVectorizer(stop_words="english", max_features=n_keywords)
-        matrix = vectorizer.fit_transform([self.text])
+        from sklearn.feature_extraction.text import TfidfVectorizer
+
+        # the text is already tokenized
+        vectorizer = TfidfVectorizer(analyzer=lambda terms: terms, max_features=n_keywords)
+        matrix = vectorizer.fit_transform([self.terms])
         feature_names = vectorizer.get_feature_names_out()
         scores = np.array(matrix.sum(axis=0)).flatten()
         keywords_scores = list(zip(feature_names, scores))
@@ -87,6 +93,9 @@ class TextService:
     def generate_word_cloud(
         self, n_words: int = 100, max_font_size: int = 100, width: int = 800, height: int = 400
     ) -> bytes:
+        from matplotlib import pyplot as plt
+        from wordcloud import WordCloud
+
         wordcloud = WordCloud(
             width=width, height=height, max_words=n_words, max_font_size=max_font_size, background_color="white"
         ).generate(self.text)
@@ -99,30 +108,16 @@ class TextService:
         return img_io
 
     def get_named_entities(self):
-        chunk_size = 256
-        chunks = [self.text[i : i + chunk_size] for i in range(0, self.get_character_count(), chunk_size)]
-
-        entities = []
-        for chunk in chunks:
-            result = entity_recognizer(chunk)
-            entities.extend(result)
-
-        return [
-            {
-                "entity": entity["entity"],
-                "score": float(entity["score"]),
-                "index": entity["index"],
-                "start": entity["start"],
-                "end": entity["end"],
-                "word": entity["word"],
-            }
-            for entity in entities
-        ]
+        # the text is split on token boundaries and its windows are run as batches (see EntityRecognizer)
+        return entity_recognizer.recognize(self.text)
 
     def visualize_tsne(
         self,
         texts: List[str],
     ):
+        from matplotlib import pyplot as plt
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.manifold import TSNE
 
         # Create matrix
         vectorizer = TfidfVectorizer(stop_words="english")
@@ -153,6 +148,7 @@ class TextService:
         return img_io
 
     def get_similarity(self, texts: List[str]) -> List[float]:
+        from sklearn.feature_extraction.text import TfidfVectorizer
 
         vectorizer = TfidfVectorizer(stop_words="english")
         similarity_scores = []
@@ -163,7 +159,10 @@ class TextService:
         return similarity_scores
 
     def search_text(self, query: str) -> List[dict]:
-        sentences = nltk.sent_tokenize(self.text)
+        from sklearn.feature_extraction.text import TfidfVectorizer
+        from sklearn.metrics.pairwise import cosine_similarity
+
+        sentences = self.sentences
         vectorizer = TfidfVectorizer(stop_words="english")
         matrix = vectorizer.fit_transform(sentences)
         query_vector = vectorizer.transform([query])
@@ -188,7 +187,7 @@ class TextService:
         category_scores = {category: 0 for category in categories}
 
         # Normalize the text
-        text = self.text.lower()
+        text = self.normalized_text
 
         # Calculate scores for each category based on keyword matches
         for category, keywords in categories.items():
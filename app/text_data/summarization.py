@@ -0,0 +1,189 @@
+from concurrent.futures import ThreadPoolExecutor
+from typing import List, Tuple
+
+from app.text_data.model_server import get_models
+from app.text_data.registry import registry
+from config import Config
+
+"""
+    This is the summarization.py file for the text_data blueprint.
+    it contains the Summarizer of the texts longer than the input window of the summarizer model (map-reduce):
+    - map: the text is split on sentence boundaries into segments of up to TEXT_SUMMARY_SEGMENT_TOKENS tokens,
+        the segments are summarized in batches, the batches run concurrently in a worker pool.
+    - reduce: the partial summaries are joined and summarized again, as one text when they fit in a segment and
+        by the same map-reduce otherwise.
+    a request summarizes TEXT_SUMMARY_MAX_SEGMENTS segments at most, the segments of a longer text are sampled
+    evenly over it, so the latency of a summary is bounded whatever the length of the text.
+"""
+
+# the levels of reduce of a summary, the summaries of the last one are truncated to a segment
+MAX_LEVELS = 3
+
+_executor = None
+
+
+def get_executor() -> ThreadPoolExecutor:
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=Config.TEXT_SUMMARY_WORKERS, thread_name_prefix="text-summary")
+    return _executor
+
+
+def length_penalty(word_count: int) -> float:
+    # the shorter texts are pushed to shorter summaries
+    if word_count < 200:
+        return 1.5
+    if word_count < 500:
+        return 1.2
+    return 1.0
+
+
+def sentence_spans(text: str, sentences: List[str]) -> List[Tuple[int, int]]:
+    """
+    The (start, end) character spans of the sentences in the text
+    """
+    spans = []
+    position = 0
+    for sentence in sentences:
+        start = text.find(sentence, position)
+        if start < 0:
+            continue
+        spans.append((start, start + len(sentence)))
+        position = start + len(sentence)
+    return spans or [(0, len(text))]
+
+
+class Summarizer:
+    """
+    Summarize a text of any length with the summarizer pipeline.
+    """
+
+    def __init__(self, segment_tokens: int = None, max_segments: int = None):
+        self.segment_tokens = segment_tokens or Config.TEXT_SUMMARY_SEGMENT_TOKENS
+        self.max_segments = max_segments or Config.TEXT_SUMMARY_MAX_SEGMENTS
+
+    @property
+    def tokenizer(self):
+        return registry.get("summarizer_tokenizer")
+
+    def segment_size(self) -> int:
+        """
+        The number of tokens of a segment, without the special tokens the pipeline adds
+        """
+        max_length = min(self.segment_tokens, self.tokenizer.model_max_length)
+        return max_length - self.tokenizer.num_special_tokens_to_add()
+
+    def segments(self, text: str, sentences: List[str]) -> List[str]:
+        """
+        Split the text into segments of whole sentences of up to segment_size tokens, a sentence longer than a
+        segment is cut on token boundaries. an empty list when the whole text fits in one segment.
+        """
+        size = self.segment_size()
+        if len(self.tokenizer(text, add_special_tokens=False)["input_ids"]) <= size:
+            return []
+        spans = sentence_spans(text, sentences)
+        # the sentences are tokenized in one batch with the whitespace before them, as they are in a segment
+        starts = [0] + [end for _, end in spans[:-1]]
+        encodings = self.tokenizer(
+            [text[start:end] for start, (_, end) in zip(starts, spans)],
+            add_special_tokens=False,
+            return_offsets_mapping=True,
+        )
+
+        segments = []
+        current, current_tokens = None, 0
+        for start, (_, end), offsets in zip(starts, spans, encodings["offset_mapping"]):
+            if current is not None and current_tokens + len(offsets) > size:
+                segments.append(current)
+                current, current_tokens = None, 0
+            if len(offsets) > size:
+                for piece in range(0, len(offsets), size):
+                    piece_offsets = offsets[piece : piece + size]
+                    segments.append((start + piece_offsets[0][0], start + piece_offsets[-1][1]))
+                continue
+            current = (start if current is None else current[0], end)
+            current_tokens += len(offsets)
+        if current is not None:
+            segments.append(current)
+
+        if len(segments) > self.max_segments:
+            # the compute cap of a request, the segments kept are spread over the whole text
+            segments = [segments[index * len(segments) // self.max_segments] for index in range(self.max_segments)]
+        return [text[start:end].strip() for start, end in segments]
+
+    @staticmethod
+    def run(inputs: List[str], **kwargs) -> List[str]:
+        results = get_models().run("summarizer", inputs, truncation=True, **kwargs)
+        return [result["summary_text"] for result in results]
+
+    def summarize_segments(self, segments: List[str], max_length: int, min_length: int) -> List[str]:
+        """
+        Summarize the segments in batches of TEXT_MODEL_BATCH_SIZE, the batches run concurrently
+        """
+        batch_size = Config.TEXT_MODEL_BATCH_SIZE
+        futures = [
+            get_executor().submit(
+                self.run,
+                segments[start : start + batch_size],
+                max_length=max_length,
+                min_length=min_length,
+                length_penalty=1.0,
+            )
+            for start in range(0, len(segments), batch_size)
+        ]
+        return [summary for future in futures for summary in future.result()]
+
+    def summarize(
+        self, text: str, sentences: List[str], max_length: int = 100, min_length: int = 50, level: int = 1
+    ) -> str:
+        segments = self.segments(text, sentences) if level <= MAX_LEVELS else []
+        if not segments:
+            return self.run(
+                [text], max_length=max_length, min_length=min_length, length_penalty=length_penalty(len(text.split()))
+            )[0]
+
+        return self.reduce(segments, max_length, min_length, level)
+
+    def reduce(self, segments: List[str], max_length: int, min_length: int, level: int = 1) -> str:
+        """
+        Summarize the segments of a text, then the summary of their summaries
+        """
+        summaries = " ".join(self.summarize_segments(segments, max_length, min_length))
+        return self.summarize(
+            summaries, registry.get("sentence_tokenizer")(summaries), max_length, min_length, level + 1
+        )
+
+    def summarize_many(
+        self, texts: List[str], sentences: List[List[str]], max_length: int = 100, min_length: int = 50
+    ) -> List[str]:
+        """
+        The summaries of the texts, the texts fitting in one segment are summarized in the same batches and the
+        longer ones by map-reduce
+        """
+        summaries = [None] * len(texts)
+        short = {}
+        long = []
+        for index, (text, text_sentences) in enumerate(zip(texts, sentences)):
+            segments = self.segments(text, text_sentences)
+            if segments:
+                long.append((index, segments))
+            else:
+                # the texts of the same length penalty are run together
+                short.setdefault(length_penalty(len(text.split())), []).append(index)
+
+        for penalty, indexes in short.items():
+            results = self.run(
+                [texts[index] for index in indexes],
+                max_length=max_length,
+                min_length=min_length,
+                length_penalty=penalty,
+            )
+            for index, summary in zip(indexes, results):
+                summaries[index] = summary
+        for index, segments in long:
+            # the segments of a long text run concurrently already
+            summaries[index] = self.reduce(segments, max_length, min_length)
+        return summaries
+
+
+summarizer = Summarizer()
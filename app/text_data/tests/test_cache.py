@@ -0,0 +1,43 @@
+import pytest
+
+from app.cache import TieredCache
+from app.text_data import cache
+from app.text_data.cache import cached_result, normalize_text
+
+
+@pytest.fixture(autouse=True)
+def result_cache(monkeypatch):
+    result_cache = TieredCache("text_results", max_bytes=10000)
+    monkeypatch.setattr(cache, "result_cache", result_cache)
+    return result_cache
+
+
+def test_cached_result():
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return {"sentiment": "POSITIVE"}
+
+    assert cached_result("analysis", "A good day.", {}, compute) == ({"sentiment": "POSITIVE"}, False)
+    assert cached_result("analysis", "A good day.", {}, compute) == ({"sentiment": "POSITIVE"}, True)
+    assert calls == [1]
+    # another endpoint, other params or another text are other results
+    cached_result("search", "A good day.", {}, compute)
+    cached_result("search", "A good day.", {"query": "day"}, compute)
+    cached_result("analysis", "A good day!", {}, compute)
+    assert calls == [1, 1, 1, 1]
+
+
+def test_normalized_text_shares_the_result():
+    composed, decomposed = "caf\u00e9", "cafe\u0301"
+    cached_result("analysis", normalize_text(composed), {}, lambda: "first")
+
+    assert cached_result("analysis", normalize_text(decomposed), {}, lambda: "second") == ("first", True)
+
+
+def test_new_model_version(monkeypatch):
+    cached_result("analysis", "A good day.", {}, lambda: "old model")
+    monkeypatch.setattr(cache, "MODEL_VERSION", "another version")
+
+    assert cached_result("analysis", "A good day.", {}, lambda: "new model") == ("new model", False)
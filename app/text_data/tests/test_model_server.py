@@ -0,0 +1,93 @@
+import os
+import stat
+import tempfile
+import threading
+from concurrent.futures import Future
+from multiprocessing import AuthenticationError
+from multiprocessing.connection import Client
+
+import pytest
+
+from app.text_data import model_server
+from app.text_data.model_server import ModelBatcher, ModelClient, ModelServer
+
+AUTHKEY = b"test-key"
+
+
+class FakeRegistry:
+    """
+    Upper cases the inputs, counts the pipeline calls
+    """
+
+    def __init__(self):
+        self.calls = []
+
+    def get(self, name):
+        def model(inputs, batch_size, **kwargs):
+            self.calls.append(list(inputs))
+            return [value.upper() for value in inputs]
+
+        return model
+
+
+@pytest.fixture
+def registry(monkeypatch):
+    registry = FakeRegistry()
+    monkeypatch.setattr(model_server, "registry", registry)
+    monkeypatch.setattr(model_server, "PIPELINES", {"upper": {}})
+    return registry
+
+
+@pytest.fixture
+def socket_path(registry):
+    socket_path = os.path.join(tempfile.mkdtemp(), "models.sock")
+    threading.Thread(target=ModelServer(socket_path, AUTHKEY).serve_forever, daemon=True).start()
+    return socket_path
+
+
+def test_server_refuses_empty_key():
+    with pytest.raises(ValueError):
+        ModelServer(os.path.join(tempfile.mkdtemp(), "models.sock"), b"")
+
+
+def test_client_runs_pipeline(socket_path):
+    client = ModelClient(socket_path, AUTHKEY)
+
+    assert client.run("upper", ["a", "b"]) == ["A", "B"]
+    assert client.run("upper", []) == []
+    with pytest.raises(RuntimeError, match="Unknown model"):
+        client.run("missing", ["a"])
+    # the connection is still usable after an error
+    assert client.run("upper", ["c"]) == ["C"]
+
+
+def test_socket_is_private(socket_path):
+    ModelClient(socket_path, AUTHKEY).run("upper", ["a"])
+
+    assert stat.S_IMODE(os.stat(socket_path).st_mode) & 0o077 == 0
+
+
+def test_client_with_another_key_refused(socket_path):
+    ModelClient(socket_path, AUTHKEY).run("upper", ["a"])
+
+    with pytest.raises(AuthenticationError):
+        Client(socket_path, family="AF_UNIX", authkey=b"another-key")
+
+
+def test_failed_batch_fails_only_its_request():
+    calls = []
+
+    def model(inputs, batch_size, **kwargs):
+        calls.append(list(inputs))
+        if "too long" in inputs:
+            raise ValueError("The input is too long.")
+        return [value.upper() for value in inputs]
+
+    group = [(["a"], {}, Future()), (["too long"], {}, Future()), (["b", "c"], {}, Future())]
+    ModelBatcher("upper", model).run_group(group)
+
+    assert group[0][2].result() == ["A"]
+    with pytest.raises(ValueError):
+        group[1][2].result()
+    assert group[2][2].result() == ["B", "C"]
+    assert calls == [["a", "too long", "b", "c"], ["a"], ["too long"], ["b", "c"]]
@@ -0,0 +1,161 @@
+import io
+import os
+import tempfile
+from typing import Optional
+
+from flask import Request
+from werkzeug.datastructures import FileStorage
+from werkzeug.exceptions import HTTPException
+
+from app.media_storage import MediaBlob, media_store
+from config import Config
+
+"""
+    This is the uploads.py file of the app.
+    it contains the streaming of the uploaded files to the media storage:
+    - UploadRequest: the request class of the app, the files of the multipart bodies are written by the parser
+        straight to an UploadFile instead of a spooled temporary file (read again to be saved).
+    - UploadFile: writes the chunks of one uploaded file to MEDIA_DIR while hashing it, sniffing its format from
+        its first bytes and enforcing the size limit of its type, so a rejected upload stops at the failing chunk.
+    - save_upload: stores an uploaded file as a media blob, the file hashed by the parser is moved, not copied.
+"""
+
+# the kinds of the uploaded files by extension, every kind has its own size limit
+UPLOAD_KINDS = {
+    "png": "image",
+    "jpg": "image",
+    "jpeg": "image",
+    "gif": "image",
+    "csv": "tabular",
+    "xls": "tabular",
+    "xlsx": "tabular",
+}
+# the leading bytes of the binary formats
+SIGNATURES = {
+    "png": (b"\x89PNG\r\n\x1a\n",),
+    "jpg": (b"\xff\xd8\xff",),
+    "jpeg": (b"\xff\xd8\xff",),
+    "gif": (b"GIF87a", b"GIF89a"),
+    "xls": (b"\xd0\xcf\x11\xe0\xa1\xb1\x1a\xe1",),
+    "xlsx": (b"PK\x03\x04",),
+}
+# the extensions of the same format
+FORMAT_ALIASES = {"jpeg": "jpg"}
+SNIFF_SIZE = 8
+
+
+def upload_size_limit(kind: str) -> int:
+    return {"image": Config.MEDIA_MAX_IMAGE_SIZE, "tabular": Config.MEDIA_MAX_TABULAR_SIZE}[kind]
+
+
+class UploadRejected(HTTPException):
+    """
+    An uploaded file refused while it was being received
+    """
+
+
+class UploadTooLarge(UploadRejected):
+    code = 413
+
+
+class UploadFormatMismatch(UploadRejected):
+    code = 415
+
+
+def sniff_format(head: bytes) -> Optional[str]:
+    """
+    The extension of the binary format of the leading bytes, 'csv' for text and None when it is not known
+    """
+    for extension, signatures in SIGNATURES.items():
+        if head.startswith(signatures):
+            return extension
+    if b"\x00" not in head:
+        return "csv"
+    return None
+
+
+class UploadFile(io.FileIO):
+    """
+    Writable file of one uploaded file, hashed and checked chunk by chunk as the multipart parser writes it.
+
+        the file is created in MEDIA_DIR so save_upload moves it to its blob, it is removed when the request is
+        closed unless it was stored.
+    """
+
+    def __init__(self, filename: str, extension: str, max_size: int):
+        os.makedirs(Config.MEDIA_DIR, exist_ok=True)
+        fd, path = tempfile.mkstemp(dir=Config.MEDIA_DIR, prefix=".upload-")
+        os.close(fd)
+        super().__init__(path, "w+b")
+        self.path = path
+        self.filename = filename
+        self.extension = extension
+        self.max_size = max_size
+        self.hasher = media_store.hasher()
+        self.byte_size = 0
+        self.head = b""
+        self.format = None
+        self.stored = False
+
+    def write(self, data) -> int:
+        self.byte_size += len(data)
+        if self.byte_size > self.max_size:
+            self.reject(
+                UploadTooLarge(f"{self.filename} is larger than the {self.max_size} bytes allowed for its type.")
+            )
+        if self.format is None and len(self.head) < SNIFF_SIZE:
+            self.head += bytes(data[: SNIFF_SIZE - len(self.head)])
+            if len(self.head) == SNIFF_SIZE:
+                self.check_format()
+        self.hasher.update(data)
+        return super().write(data)
+
+    def check_format(self):
+        self.format = sniff_format(self.head)
+        if FORMAT_ALIASES.get(self.format, self.format) != FORMAT_ALIASES.get(self.extension, self.extension):
+            self.reject(UploadFormatMismatch(f"The content of {self.filename} is not a {self.extension} file."))
+
+    def reject(self, error: UploadRejected):
+        # the parser stops at the error, the file is not handed to the request so it is removed here
+        self.close()
+        raise error
+
+    def finish(self):
+        """
+        Check the format of a file shorter than the sniffed bytes, once it was written completely
+        """
+        if self.format is None:
+            self.check_format()
+
+    def close(self):
+        super().close()
+        if not self.stored and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class UploadRequest(Request):
+    """
+    Request writing the uploaded files of the known kinds to UploadFile streams, the other files are spooled
+    as usual. the whole body is limited by MAX_CONTENT_LENGTH before it is read.
+    """
+
+    def _get_file_stream(self, total_content_length, content_type, filename=None, content_length=None):
+        extension = filename.rsplit(".", 1)[1].lower() if filename and "." in filename else None
+        if extension not in UPLOAD_KINDS:
+            return super()._get_file_stream(total_content_length, content_type, filename, content_length)
+        return UploadFile(filename, extension, upload_size_limit(UPLOAD_KINDS[extension]))
+
+
+def save_upload(file: FileStorage) -> MediaBlob:
+    """
+    Store the uploaded file as a media blob (see MediaStore.save)
+    """
+    extension = file.filename.rsplit(".", 1)[1].lower()
+    stream = file.stream
+    if not isinstance(stream, UploadFile) or stream.closed:
+        # a file that was not streamed by UploadRequest is copied
+        return media_store.save(stream, extension)
+    stream.finish()
+    stream.flush()
+    stream.stored = True
+    return media_store.store_file(stream.path, stream.hasher.hexdigest(), stream.byte_size, extension)
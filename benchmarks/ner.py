@@ -0,0 +1,80 @@
+import argparse
+import json
+import os
+import random
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+"""
+    This is the ner.py benchmark of the app.
+    it compares the throughput of the named entity recognition of a generated document of --chars characters:
+    - per_chunk: the former way, one call of the entity_recognizer pipeline per 256 characters chunk.
+    - batched: the EntityRecognizer, token boundary windows run as padded batches in one call.
+    the pipeline is loaded in this process (the model server is not used) and warmed up before the timings.
+
+    python benchmarks/ner.py [--chars 10000] [--runs 3]
+"""
+
+WORDS = (
+    "the board of directors met in the headquarters on monday to discuss the results of the quarter and the "
+    "new strategy for the markets of the region"
+).split()
+ENTITIES = ["Alice Johnson", "Microsoft", "New York", "the United Nations", "Barack Obama", "Cairo", "Siemens AG"]
+
+
+def make_document(chars: int) -> str:
+    random.seed(0)
+    sentences = []
+    while sum(len(sentence) + 1 for sentence in sentences) < chars:
+        words = random.choices(WORDS, k=random.randint(8, 20))
+        words.insert(random.randint(0, len(words)), random.choice(ENTITIES))
+        sentences.append(" ".join(words).capitalize() + ".")
+    return " ".join(sentences)[:chars]
+
+
+def best_seconds(function, runs: int) -> float:
+    seconds = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        function()
+        seconds.append(time.perf_counter() - started)
+    return min(seconds)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the named entity recognition of a long document.")
+    parser.add_argument("--chars", type=int, default=10000)
+    parser.add_argument("--runs", type=int, default=3)
+    args = parser.parse_args()
+
+    os.environ["TEXT_MODEL_SERVER_SOCKET"] = ""
+    from app.text_data.ner import EntityRecognizer
+    from app.text_data.registry import registry
+
+    text = make_document(args.chars)
+    model = registry.get("entity_recognizer")
+    recognizer = EntityRecognizer()
+    recognizer.recognize(text[:1000])
+
+    per_chunk = best_seconds(lambda: [model(text[i : i + 256]) for i in range(0, len(text), 256)], args.runs)
+    batched = best_seconds(lambda: recognizer.recognize(text), args.runs)
+    print(
+        json.dumps(
+            {
+                "chars": len(text),
+                "windows": len(recognizer.windows(text)),
+                "per_chunk_seconds": round(per_chunk, 3),
+                "batched_seconds": round(batched, 3),
+                "per_chunk_chars_per_second": round(len(text) / per_chunk),
+                "batched_chars_per_second": round(len(text) / batched),
+                "speedup": round(per_chunk / batched, 2),
+            },
+            indent=2,
+        )
+    )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,61 @@
+import argparse
+import json
+import os
+import statistics
+import subprocess
+import sys
+
+"""
+    This is the startup.py benchmark of the app.
+    it times `create_app()` (its imports included) in fresh interpreters, the way `flask db upgrade`, masks.py and
+    every gunicorn worker start it, and checks no text model library was imported by it (they are loaded on their
+    first use, see app/text_data/registry.py).
+
+    python benchmarks/startup.py [--runs 5] [--max-seconds 1]
+    exits with 1 when the median startup is slower than --max-seconds or a model library was imported.
+"""
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+# the libraries that must not be imported by create_app
+MODEL_LIBRARIES = ("nltk", "sklearn", "matplotlib", "wordcloud", "transformers", "torch")
+
+STARTUP = f"""
+import json, sys, time
+started = time.perf_counter()
+from app import create_app
+create_app()
+seconds = time.perf_counter() - started
+print(json.dumps({{"seconds": seconds, "imported": [name for name in {MODEL_LIBRARIES!r} if name in sys.modules]}}))
+"""
+
+
+def measure_startup() -> dict:
+    output = subprocess.run(
+        [sys.executable, "-c", STARTUP], cwd=ROOT, capture_output=True, text=True, check=True
+    ).stdout
+    return json.loads(output.strip().splitlines()[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Time the startup of the app.")
+    parser.add_argument("--runs", type=int, default=5)
+    parser.add_argument("--max-seconds", type=float, default=1.0)
+    args = parser.parse_args()
+
+    runs = [measure_startup() for _ in range(args.runs)]
+    seconds = [run["seconds"] for run in runs]
+    imported = sorted({name for run in runs for name in run["imported"]})
+    report = {
+        "runs": args.runs,
+        "median_seconds": round(statistics.median(seconds), 3),
+        "min_seconds": round(min(seconds), 3),
+        "max_seconds": round(max(seconds), 3),
+        "model_libraries_imported": imported,
+    }
+    print(json.dumps(report, indent=2))
+    if report["median_seconds"] > args.max_seconds or imported:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
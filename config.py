@@ -15,6 +15,104 @@ class Config:
     MEDIA_FOLDER = os.path.join(os.getcwd(), os.environ.get("MEDIA_FOLDER", "uploads"))
     MEDIA_URL = "/uploads"
     MEDIA_DIR = "uploads"
+    # the uploads are stored once per content, named by this hash ('sha256' or 'blake3', needs the blake3 package)
+    MEDIA_HASH_ALGORITHM = os.environ.get("MEDIA_HASH_ALGORITHM", "sha256")
+    # size (bytes) of the chunks the uploads are hashed and written to disk by
+    MEDIA_CHUNK_SIZE = int(os.environ.get("MEDIA_CHUNK_SIZE", 1024 * 1024))
+    # size limits (bytes) of the uploaded images and tabular files, checked while they are received
+    MEDIA_MAX_IMAGE_SIZE = int(os.environ.get("MEDIA_MAX_IMAGE_SIZE", 50 * 1024 * 1024))
+    MEDIA_MAX_TABULAR_SIZE = int(os.environ.get("MEDIA_MAX_TABULAR_SIZE", 2 * 1024 * 1024 * 1024))
+    # limit (bytes) of a whole request body, refused from its Content-Length before it is read
+    MAX_CONTENT_LENGTH = int(os.environ["MAX_CONTENT_LENGTH"]) if os.environ.get("MAX_CONTENT_LENGTH") else None
+    # the files derived from the stored contents (eg. the parsed columns of a tabular upload), not served
+    MEDIA_ARTIFACTS_FOLDER = os.environ.get("MEDIA_ARTIFACTS_FOLDER", os.path.join(os.getcwd(), ".media_artifacts"))
+    # `flask uploads gc` keeps the unreferenced blobs younger than this, their upload may still be running
+    MEDIA_ORPHAN_GRACE_SECONDS = int(os.environ.get("MEDIA_ORPHAN_GRACE_SECONDS", 3600))
+    # number of rows sent to the database per COPY / executemany batch when ingesting tabular files
+    TABULAR_INGESTION_BATCH_SIZE = int(os.environ.get("TABULAR_INGESTION_BATCH_SIZE", 10000))
+    # uploads bigger than this (bytes) are read, written and summarized in chunks of TABULAR_INGESTION_CHUNK_SIZE rows
+    TABULAR_STREAMING_THRESHOLD = int(os.environ.get("TABULAR_STREAMING_THRESHOLD", 50 * 1024 * 1024))
+    TABULAR_INGESTION_CHUNK_SIZE = int(os.environ.get("TABULAR_INGESTION_CHUNK_SIZE", 50000))
+    # per column sketches of the stored statistics: the KLL quantile sketch is exact up to this many values
+    TABULAR_STATISTICS_SKETCH_SIZE = int(os.environ.get("TABULAR_STATISTICS_SKETCH_SIZE", 1024))
+    # number of counters of the heavy hitters sketch used for the mode
+    TABULAR_STATISTICS_FREQUENT_ITEMS = int(os.environ.get("TABULAR_STATISTICS_FREQUENT_ITEMS", 256))
+    # the approximate statistics mode: the rank error of the quantiles (and the relative error of the distinct counts)
+    # and the confidence of the bound, the number of frequent values returned per column
+    TABULAR_APPROXIMATE_ERROR = float(os.environ.get("TABULAR_APPROXIMATE_ERROR", 0.01))
+    TABULAR_APPROXIMATE_CONFIDENCE = float(os.environ.get("TABULAR_APPROXIMATE_CONFIDENCE", 0.95))
+    TABULAR_APPROXIMATE_TOP_K = int(os.environ.get("TABULAR_APPROXIMATE_TOP_K", 10))
+    # the outlier summaries: |z| above the threshold is an outlier, the top-k extremes and the first row indices of
+    # the outliers are kept per column
+    TABULAR_OUTLIER_Z_THRESHOLD = float(os.environ.get("TABULAR_OUTLIER_Z_THRESHOLD", 3.0))
+    TABULAR_OUTLIER_TOP_K = int(os.environ.get("TABULAR_OUTLIER_TOP_K", 10))
+    TABULAR_OUTLIER_MAX_INDICES = int(os.environ.get("TABULAR_OUTLIER_MAX_INDICES", 1000))
+    # default storage backend of new tabular data files, 'rows' (JSON row table) or 'parquet'
+    TABULAR_STORAGE_BACKEND = os.environ.get("TABULAR_STORAGE_BACKEND", "rows")
+    TABULAR_PARQUET_ROW_GROUP_SIZE = int(os.environ.get("TABULAR_PARQUET_ROW_GROUP_SIZE", 100000))
+    # results cache shared by the workers of the host, an empty CACHE_FOLDER keeps the cache in process only
+    CACHE_FOLDER = os.environ.get("CACHE_FOLDER", os.path.join(os.getcwd(), ".cache"))
+    # memory budget (bytes) of the in-process tier and disk budget of the shared tier of the tabular views cache
+    TABULAR_VIEW_CACHE_MAX_BYTES = int(os.environ.get("TABULAR_VIEW_CACHE_MAX_BYTES", 16 * 1024 * 1024))
+    TABULAR_VIEW_CACHE_DISK_MAX_BYTES = int(os.environ.get("TABULAR_VIEW_CACHE_DISK_MAX_BYTES", 256 * 1024 * 1024))
+    # uploads bigger than this (bytes) are ingested by a background job, the upload request returns the job
+    TABULAR_BACKGROUND_THRESHOLD = int(os.environ.get("TABULAR_BACKGROUND_THRESHOLD", 50 * 1024 * 1024))
+    # 'process' (a local process pool, no broker needed) or 'rq' (a Redis queue consumed by `rq worker`)
+    TABULAR_JOBS_BACKEND = os.environ.get("TABULAR_JOBS_BACKEND", "process")
+    # number of processes of the local pool, per web worker
+    TABULAR_JOBS_WORKERS = int(os.environ.get("TABULAR_JOBS_WORKERS", 2))
+    # the app factory the job processes and the rq workers create their app context with
+    TABULAR_JOBS_APP_FACTORY = os.environ.get("TABULAR_JOBS_APP_FACTORY", "app:create_app")
+    TABULAR_JOBS_QUEUE = os.environ.get("TABULAR_JOBS_QUEUE", "tabular_ingestion")
+    # the jobs of the process pool of another host not updated for this many seconds were lost with their process,
+    # they are recovered when a web worker starts (see recover_stale_jobs)
+    TABULAR_JOBS_STALE_SECONDS = int(os.environ.get("TABULAR_JOBS_STALE_SECONDS", 900))
+    REDIS_URL = os.environ.get("REDIS_URL", "redis://localhost:6379/0")
+    # the Unix socket of the text model server shared by the web workers (started by gunicorn, see
+    # gunicorn_config.py), empty loads the transformers pipelines in every process instead
+    TEXT_MODEL_SERVER_SOCKET = os.environ.get("TEXT_MODEL_SERVER_SOCKET", "")
+    # the key the clients authenticate to the model server with, SECRET_KEY when not set, the server refuses to start
+    # without a key
+    TEXT_MODEL_SERVER_AUTHKEY = os.environ.get("TEXT_MODEL_SERVER_AUTHKEY")
+    # the inputs of the concurrent requests are batched: up to this many inputs, waiting up to this many ms
+    TEXT_MODEL_SERVER_MAX_BATCH = int(os.environ.get("TEXT_MODEL_SERVER_MAX_BATCH", 32))
+    TEXT_MODEL_SERVER_BATCH_WAIT_MS = float(os.environ.get("TEXT_MODEL_SERVER_BATCH_WAIT_MS", 10))
+    # seconds a worker waits for the server to accept its connection (it may still be starting) and to answer
+    TEXT_MODEL_SERVER_CONNECT_TIMEOUT = float(os.environ.get("TEXT_MODEL_SERVER_CONNECT_TIMEOUT", 30))
+    TEXT_MODEL_SERVER_TIMEOUT = float(os.environ.get("TEXT_MODEL_SERVER_TIMEOUT", 110))
+    # the batch size of the forward passes of the pipelines
+    TEXT_MODEL_BATCH_SIZE = int(os.environ.get("TEXT_MODEL_BATCH_SIZE", 8))
+    # threads of the text analysis stages (sentiment, entities, keywords, summary) run concurrently, per process
+    TEXT_ANALYSIS_WORKERS = int(os.environ.get("TEXT_ANALYSIS_WORKERS", 4))
+    # the windows of the named entity recognition: up to this many tokens (the max sequence length of the model
+    # at most), overlapping by this many tokens so the entities at their boundaries are seen whole
+    TEXT_NER_MAX_TOKENS = int(os.environ.get("TEXT_NER_MAX_TOKENS", 512))
+    TEXT_NER_STRIDE = int(os.environ.get("TEXT_NER_STRIDE", 64))
+    # how the entity_recognizer merges the sub-word tokens into entities: simple, first, average or max
+    TEXT_NER_AGGREGATION = os.environ.get("TEXT_NER_AGGREGATION", "simple")
+    # the batch text analysis: documents per request, and documents analysed (and streamed) together
+    TEXT_BATCH_MAX_DOCUMENTS = int(os.environ.get("TEXT_BATCH_MAX_DOCUMENTS", 1000))
+    TEXT_BATCH_CHUNK_DOCUMENTS = int(os.environ.get("TEXT_BATCH_CHUNK_DOCUMENTS", 32))
+    # the segments the long texts are summarized by: up to this many tokens (the input window of the model at
+    # most), at most this many segments per summary, summarized in batches by this many threads per process
+    TEXT_SUMMARY_SEGMENT_TOKENS = int(os.environ.get("TEXT_SUMMARY_SEGMENT_TOKENS", 1024))
+    TEXT_SUMMARY_MAX_SEGMENTS = int(os.environ.get("TEXT_SUMMARY_MAX_SEGMENTS", 32))
+    TEXT_SUMMARY_WORKERS = int(os.environ.get("TEXT_SUMMARY_WORKERS", 2))
+    # results cache of the text endpoints: memory budget (bytes) of the in-process tier, disk budget of the shared
+    # tier (in CACHE_FOLDER) and seconds before a result expires. a new version drops the previous results
+    TEXT_RESULT_CACHE_MAX_BYTES = int(os.environ.get("TEXT_RESULT_CACHE_MAX_BYTES", 32 * 1024 * 1024))
+    TEXT_RESULT_CACHE_DISK_MAX_BYTES = int(os.environ.get("TEXT_RESULT_CACHE_DISK_MAX_BYTES", 512 * 1024 * 1024))
+    TEXT_RESULT_CACHE_TTL = float(os.environ.get("TEXT_RESULT_CACHE_TTL", 24 * 60 * 60))
+    TEXT_RESULT_CACHE_VERSION = os.environ.get("TEXT_RESULT_CACHE_VERSION", "1")
+    # the local cache of the text models: the transformers pipelines ('huggingface') and the NLTK data ('nltk_data'),
+    # they are loaded from it on their first use (see app/text_data/registry.py)
+    TEXT_MODELS_CACHE_DIR = os.environ.get("TEXT_MODELS_CACHE_DIR", os.path.join(os.getcwd(), ".text_models"))
+    # only load the text models already in the cache, the missing ones fail instead of being downloaded
+    TEXT_MODELS_OFFLINE = os.environ.get("TEXT_MODELS_OFFLINE", "false").lower() in ("1", "true", "yes")
+    # the text models every gunicorn worker loads once it is started instead of on the first request using them
+    TEXT_MODELS_WARM_UP = os.environ.get(
+        "TEXT_MODELS_WARM_UP", "vader,sentence_tokenizer,entity_recognizer_tokenizer"
+    ).split(",")
     CORS_ALLOW_HEADERS = [
         "Content-Type",
         "Content-Length",
@@ -1,4 +1,54 @@
+import os
+import secrets
+import tempfile
+
 bind = "0.0.0.0:8000"
 workers = 4
 timeout = 120
 loglevel = "info"
+
+# the transformers pipelines are loaded once, by a model server the workers share (see app/text_data/model_server.py)
+# every gunicorn master has its own server, on a socket named after its pid unless one is configured (the socket of
+# the master that re-executed this one on USR2 is inherited in the environment, it is not reused)
+socket_prefix = os.path.join(tempfile.gettempdir(), "corporatica-text-models-")
+if os.environ.get("TEXT_MODEL_SERVER_SOCKET", socket_prefix).startswith(socket_prefix):
+    os.environ["TEXT_MODEL_SERVER_SOCKET"] = f"{socket_prefix}{os.getpid()}.sock"
+# the workers inherit the key of the server
+os.environ.setdefault("TEXT_MODEL_SERVER_AUTHKEY", secrets.token_hex(32))
+
+
+def on_starting(server):
+    from app.text_data.model_server import start_model_server
+
+    # supervised by a thread of the arbiter, restarted when it exits
+    server.text_model_server = start_model_server()
+    server.log.info("Started the text model server (pid %s)", server.text_model_server.pid)
+
+
+def on_exit(server):
+    model_server = getattr(server, "text_model_server", None)
+    if model_server is not None:
+        model_server.stop()
+
+
+def post_worker_init(worker):
+    # the ingestion jobs lost with a previous worker (see recover_stale_jobs)
+    from app.tabular_data.jobs import recover_stale_jobs
+
+    with worker.wsgi.app_context():
+        try:
+            failed, submitted = recover_stale_jobs()
+            if failed or submitted:
+                worker.log.info("Recovered the ingestion jobs: %s failed, %s submitted again", failed, submitted)
+        except Exception as e:
+            worker.log.warning("Could not recover the ingestion jobs: %s", e)
+
+    # the text models of TEXT_MODELS_WARM_UP are loaded before the worker accepts requests, not by the first request
+    from app.text_data.registry import registry
+    from config import Config
+
+    for name in filter(None, Config.TEXT_MODELS_WARM_UP):
+        try:
+            registry.warm_up([name])
+        except Exception as e:
+            worker.log.warning("Could not warm up the text model %s: %s", name, e)